@@ -1,10 +1,27 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import render
 from .models import Carteira, Transacao
+from .services import TIPOS_CREDITO, creditar_em_lote
+
+
+class CreditoLoteForm(forms.Form):
+    """Formulário intermediário da action de crédito em lote"""
+    categoria = forms.ChoiceField(choices=Transacao.CATEGORIA_CHOICES, label='Categoria')
+    tipo = forms.ChoiceField(
+        choices=[c for c in Transacao.TIPO_CHOICES if c[0] in TIPOS_CREDITO],
+        initial='BONUS',
+        label='Tipo'
+    )
+    valor = forms.DecimalField(max_digits=15, decimal_places=2, min_value=0.01, label='Valor')
+    descricao = forms.CharField(max_length=255, required=False, label='Descrição')
 
 
 @admin.register(Carteira)
 class CarteiraAdmin(admin.ModelAdmin):
+    actions = ['creditar_em_lote']
     list_display = ['usuario', 'pontos', 'fundos', 'atualizado_em']
+    list_select_related = ['usuario']
     list_filter = ['criado_em', 'atualizado_em']
     search_fields = ['usuario__username', 'usuario__email']
     readonly_fields = ['criado_em', 'atualizado_em']
@@ -21,10 +38,42 @@ class CarteiraAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description='Creditar bônus/prêmio nas carteiras selecionadas')
+    def creditar_em_lote(self, request, queryset):
+        form = CreditoLoteForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            dados = form.cleaned_data
+            creditos = (
+                (usuario_id, dados['categoria'], dados['valor'], dados['tipo'], dados['descricao'])
+                for usuario_id in queryset.values_list('usuario_id', flat=True).iterator()
+            )
+            resultado = creditar_em_lote(creditos)
+            self.message_user(
+                request,
+                f'{resultado.creditados}/{resultado.total} créditos aplicados '
+                f'({resultado.duracao:.2f}s, {resultado.por_segundo:.0f} créditos/s).',
+                messages.SUCCESS,
+            )
+            for chunk, linha, erro in resultado.falhas:
+                self.message_user(request, f'Chunk {chunk}: {erro}', messages.ERROR)
+            return None
+
+        return render(request, 'admin/app_cartela/carteira/creditar_lote.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Crédito em lote',
+            'opts': self.model._meta,
+            'form': form,
+            'total': queryset.count(),
+            'select_across': request.POST.get('select_across') == '1',
+            'selecionados': request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+
 
 @admin.register(Transacao)
 class TransacaoAdmin(admin.ModelAdmin):
     list_display = ['carteira', 'tipo', 'categoria', 'valor', 'criado_em']
+    list_select_related = ['carteira__usuario']
     list_filter = ['tipo', 'categoria', 'criado_em']
     search_fields = ['carteira__usuario__username', 'descricao']
     readonly_fields = ['criado_em']
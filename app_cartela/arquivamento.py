@@ -0,0 +1,93 @@
+"""
+Arquivamento de linhas antigas em tabelas de arquivo.
+
+As tabelas quentes (Transacao, CartelaInstance e filhas) guardam só o período
+recente; o resto vai para tabelas com as mesmas colunas e ids
+(TransacaoArquivada, betting.*Archive). Cada lote é um INSERT ... SELECT no
+arquivo seguido do DELETE na tabela quente, na mesma transação, com pausa
+opcional entre lotes para não competir com o tráfego.
+
+Optamos por tabelas de arquivo em vez de partições nativas do Postgres: o
+mesmo código roda no SQLite de desenvolvimento e não exige reescrever as
+tabelas existentes. A leitura junta as duas (ver paginar_por_cursor e
+exportacao).
+"""
+import time
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Transacao, TransacaoArquivada
+
+
+ResultadoArquivamento = namedtuple('ResultadoArquivamento', ['movidas', 'lotes', 'duracao'])
+
+
+def data_de_corte(idade_dias=None):
+    if idade_dias is None:
+        idade_dias = settings.ARQUIVAMENTO_IDADE_DIAS
+    return timezone.now() - timedelta(days=idade_dias)
+
+
+def mover_linhas(origem, destino, coluna, valores):
+    """
+    Copia para `destino` as linhas de `origem` com `coluna` em `valores` e as
+    apaga de `origem`. As duas tabelas devem ter as mesmas colunas.
+    Deve rodar dentro de uma transação. Retorna quantas linhas foram movidas.
+    """
+    if not valores:
+        return 0
+    qn = connection.ops.quote_name
+    colunas = ', '.join(qn(f.column) for f in origem._meta.concrete_fields)
+    tabela_origem = qn(origem._meta.db_table)
+    marcadores = ', '.join(['%s'] * len(valores))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(destino._meta.db_table)} ({colunas}) '
+            f'SELECT {colunas} FROM {tabela_origem} WHERE {qn(coluna)} IN ({marcadores})',
+            list(valores),
+        )
+        cursor.execute(
+            f'DELETE FROM {tabela_origem} WHERE {qn(coluna)} IN ({marcadores})',
+            list(valores),
+        )
+        return cursor.rowcount
+
+
+def arquivar_em_lotes(selecionar_lote, mover_lote, batch_size=5000, pausa=0.0):
+    """
+    Laço genérico: `selecionar_lote(n)` devolve até n ids; `mover_lote(ids)`
+    move o lote (dentro da transação aberta aqui) e devolve quantas linhas
+    principais foram movidas.
+    """
+    inicio = time.monotonic()
+    movidas = 0
+    lotes = 0
+    while True:
+        with transaction.atomic():
+            ids = selecionar_lote(batch_size)
+            if not ids:
+                break
+            movidas += mover_lote(ids)
+        lotes += 1
+        if pausa:
+            time.sleep(pausa)
+    return ResultadoArquivamento(movidas=movidas, lotes=lotes, duracao=time.monotonic() - inicio)
+
+
+def arquivar_transacoes(idade_dias=None, batch_size=5000, pausa=0.0):
+    """Move para TransacaoArquivada as transações criadas antes do corte"""
+    corte = data_de_corte(idade_dias)
+
+    def selecionar_lote(n):
+        return list(
+            Transacao.objects.filter(criado_em__lt=corte)
+            .order_by('id')
+            .values_list('id', flat=True)[:n]
+        )
+
+    def mover_lote(ids):
+        return mover_linhas(Transacao, TransacaoArquivada, 'id', ids)
+
+    return arquivar_em_lotes(selecionar_lote, mover_lote, batch_size, pausa)
@@ -0,0 +1,191 @@
+"""
+Conciliação das carteiras com o extrato (Transacao + TransacaoArquivada).
+
+O saldo de cada carteira deve ser a soma dos valores das suas transações em
+cada categoria. Em vez de somar o histórico inteiro a cada auditoria, cada
+carteira conferida ganha um CheckpointCarteira (soma até a última transação).
+A verificação seguinte só soma as transações com id maior que o do checkpoint.
+Os ids crescem na ordem em que as movimentações da mesma carteira acontecem,
+porque o UPDATE do saldo trava a linha antes do INSERT da transação.
+
+As carteiras são divididas em faixas de id, processadas em paralelo, uma
+conexão por thread. Por faixa são feitas: uma leitura das carteiras com o
+checkpoint, um agregado agrupado por carteira em cada tabela do extrato e um
+upsert dos checkpoints das carteiras que conferiram. Divergências são
+conferidas de novo com a carteira travada, para descartar movimentações
+concorrentes entre as leituras. Só então são reportadas.
+"""
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.db import connections, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Carteira, CheckpointCarteira, Transacao, TransacaoArquivada
+
+
+ZERO = Decimal('0.00')
+
+# Carteiras suspeitas travadas por vez na segunda conferência
+LOTE_RECONFERENCIA = 100
+
+Divergencia = namedtuple('Divergencia', ['carteira_id', 'categoria', 'esperado', 'atual'])
+
+ResultadoConciliacao = namedtuple(
+    'ResultadoConciliacao',
+    ['carteiras', 'transacoes', 'divergencias', 'checkpoints', 'duracao'],
+)
+
+
+def _deltas(modelo, filtro_carteiras, completo):
+    """Soma por carteira das transações posteriores ao checkpoint (ou todas)"""
+    qs = modelo.objects.filter(**{f'carteira__{k}': v for k, v in filtro_carteiras.items()})
+    if not completo:
+        # alias() mantém o LEFT JOIN: carteiras sem checkpoint somam tudo
+        qs = qs.alias(
+            desde=Coalesce(F('carteira__checkpoint__ultima_transacao_id'), 0),
+        ).filter(id__gt=F('desde'))
+    linhas = (
+        qs.values('carteira_id')
+        .annotate(
+            pontos=Sum('valor', filter=Q(categoria='PONTOS')),
+            fundos=Sum('valor', filter=Q(categoria='FUNDOS')),
+            ultimo=Max('id'),
+            quantidade=Count('id'),
+        )
+        .order_by()
+    )
+    return {linha['carteira_id']: linha for linha in linhas}
+
+
+def _conferir(filtro_carteiras, completo=False, travar=False, gravar=True):
+    """
+    Confere as carteiras do filtro. Retorna (carteiras, transações somadas,
+    divergências, checkpoints gravados).
+    """
+    carteiras = Carteira.objects.filter(**filtro_carteiras).order_by()
+    if travar:
+        carteiras = carteiras.select_for_update(of=('self',))
+    carteiras = list(carteiras.values(
+        'id', 'pontos', 'fundos',
+        'checkpoint__ultima_transacao_id', 'checkpoint__soma_pontos',
+        'checkpoint__soma_fundos', 'checkpoint__total_transacoes',
+    ))
+    if not carteiras:
+        return 0, 0, [], 0
+
+    deltas = [_deltas(modelo, filtro_carteiras, completo) for modelo in (TransacaoArquivada, Transacao)]
+    agora = timezone.now()
+    divergencias = []
+    checkpoints = []
+    somadas = 0
+    for carteira in carteiras:
+        usar_checkpoint = not completo and carteira['checkpoint__ultima_transacao_id'] is not None
+        ultimo = carteira['checkpoint__ultima_transacao_id'] if usar_checkpoint else 0
+        soma = {
+            'PONTOS': carteira['checkpoint__soma_pontos'] if usar_checkpoint else ZERO,
+            'FUNDOS': carteira['checkpoint__soma_fundos'] if usar_checkpoint else ZERO,
+        }
+        quantidade = carteira['checkpoint__total_transacoes'] if usar_checkpoint else 0
+        for delta in deltas:
+            linha = delta.get(carteira['id'])
+            if linha is None:
+                continue
+            # SQLite soma DecimalField em ponto flutuante: volta aos centavos
+            soma['PONTOS'] += (linha['pontos'] or ZERO).quantize(ZERO)
+            soma['FUNDOS'] += (linha['fundos'] or ZERO).quantize(ZERO)
+            ultimo = max(ultimo, linha['ultimo'])
+            quantidade += linha['quantidade']
+            somadas += linha['quantidade']
+
+        divergentes = [
+            Divergencia(carteira['id'], categoria, soma[categoria], carteira[campo])
+            for categoria, campo in (('PONTOS', 'pontos'), ('FUNDOS', 'fundos'))
+            if soma[categoria] != carteira[campo]
+        ]
+        if divergentes:
+            divergencias.extend(divergentes)
+        else:
+            checkpoints.append(CheckpointCarteira(
+                carteira_id=carteira['id'],
+                ultima_transacao_id=ultimo,
+                soma_pontos=soma['PONTOS'],
+                soma_fundos=soma['FUNDOS'],
+                total_transacoes=quantidade,
+                atualizado_em=agora,
+            ))
+
+    if gravar and checkpoints:
+        CheckpointCarteira.objects.bulk_create(
+            checkpoints,
+            update_conflicts=True,
+            unique_fields=['carteira'],
+            update_fields=['ultima_transacao_id', 'soma_pontos', 'soma_fundos', 'total_transacoes', 'atualizado_em'],
+        )
+    return len(carteiras), somadas, divergencias, len(checkpoints) if gravar else 0
+
+
+def _conferir_faixa(inicio, fim, completo, gravar):
+    return _conferir({'id__gte': inicio, 'id__lt': fim}, completo=completo, gravar=gravar)
+
+
+def _conferir_faixa_em_thread(inicio, fim, completo, gravar):
+    try:
+        return _conferir_faixa(inicio, fim, completo, gravar)
+    finally:
+        connections.close_all()
+
+
+def verificar_carteiras(chunk_size=2000, workers=4, completo=False, gravar=True):
+    """
+    Concilia todas as carteiras. `completo` ignora os checkpoints (soma o
+    histórico inteiro); `gravar=False` não avança os checkpoints.
+    """
+    inicio = time.monotonic()
+    limites = Carteira.objects.aggregate(menor=Min('id'), maior=Max('id'))
+    if limites['menor'] is None:
+        return ResultadoConciliacao(0, 0, [], 0, time.monotonic() - inicio)
+
+    faixas = [
+        (a, min(a + chunk_size, limites['maior'] + 1))
+        for a in range(limites['menor'], limites['maior'] + 1, chunk_size)
+    ]
+    carteiras = somadas = checkpoints = 0
+    suspeitas = set()
+
+    def acumular(resultados):
+        nonlocal carteiras, somadas, checkpoints
+        for n, s, divergencias, c in resultados:
+            carteiras += n
+            somadas += s
+            checkpoints += c
+            suspeitas.update(d.carteira_id for d in divergencias)
+
+    if workers <= 1:
+        acumular(_conferir_faixa(a, b, completo, gravar) for a, b in faixas)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            acumular(executor.map(lambda f: _conferir_faixa_em_thread(*f, completo, gravar), faixas))
+
+    # Segunda conferência com a carteira travada: movimentações concorrentes
+    # entre as leituras da primeira passada não viram falso positivo.
+    divergencias = []
+    suspeitas = sorted(suspeitas)
+    for i in range(0, len(suspeitas), LOTE_RECONFERENCIA):
+        with transaction.atomic():
+            _, _, confirmadas, c = _conferir(
+                {'id__in': suspeitas[i:i + LOTE_RECONFERENCIA]},
+                completo=completo, travar=True, gravar=gravar,
+            )
+        divergencias.extend(confirmadas)
+        checkpoints += c
+
+    return ResultadoConciliacao(
+        carteiras=carteiras,
+        transacoes=somadas,
+        divergencias=divergencias,
+        checkpoints=checkpoints,
+        duracao=time.monotonic() - inicio,
+    )
@@ -0,0 +1,140 @@
+"""
+Métricas do dashboard administrativo.
+
+Os totais que varrem tabelas grandes (apostas, cartelas, transações, carteiras)
+são calculados por `atualizar_metricas` — rodado pelo comando
+`atualizar_metricas_dashboard` em loop (processo worker do Procfile) — e
+guardados em MetricasDashboard. A view lê esse snapshot e calcula ao vivo os
+números "de hoje", que usam filtros por intervalo nas colunas indexadas. Se o
+snapshot passar de DASHBOARD_METRICAS_MAX_IDADE segundos (worker parado), a
+view recalcula na hora em vez de mostrar totais congelados. Os totais históricos incluem as
+tabelas de arquivo (ver arquivamento.py).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from .models import Carteira, MetricasDashboard, Transacao, TransacaoArquivada
+
+
+CHAVE_GERAL = 'geral'
+
+
+def _inicio_do_dia():
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+def _soma(valor):
+    return valor or Decimal('0')
+
+
+def _somar_agregados(quente, arquivo):
+    return {chave: (valor or 0) + (arquivo[chave] or 0) for chave, valor in quente.items()}
+
+
+def _agregar_apostas(model):
+    return model.objects.aggregate(
+        total_apostas=Count('id'),
+        apostas_pendentes=Count('id', filter=Q(is_won__isnull=True)),
+        apostas_ganhas=Count('id', filter=Q(is_won=True)),
+        apostas_perdidas=Count('id', filter=Q(is_won=False)),
+        volume_total=Sum('stake'),
+        payout_total=Sum('potential_return', filter=Q(is_won=True)),
+    )
+
+
+def calcular_metricas_acumuladas():
+    """Totais gerais: uma query de agregação condicional por tabela"""
+    from betting.models import (
+        Bet, BetArchive, CartelaInstance, CartelaInstanceArchive, Event, MarketSelection,
+    )
+    from betting.services import get_risk_exposure
+
+    eventos = Event.objects.aggregate(
+        total_eventos=Count('id'),
+        eventos_ao_vivo=Count('id', filter=Q(status='LIVE')),
+        eventos_agendados=Count('id', filter=Q(status='SCHEDULED')),
+    )
+    cartelas = CartelaInstance.objects.aggregate(
+        total_cartelas=Count('id'),
+        cartelas_pendentes_count=Count('id', filter=Q(status='APOSTA_PENDENTE')),
+        cartelas_confirmadas=Count('id', filter=Q(status='APOSTA_CONFIRMADA')),
+    )
+    # Só cartelas encerradas são arquivadas: entram apenas no total
+    cartelas['total_cartelas'] += CartelaInstanceArchive.objects.count()
+    selecoes = MarketSelection.objects.aggregate(
+        total_selecoes=Count('id'),
+        selecoes_ao_vivo=Count('id', filter=Q(is_live=True)),
+    )
+    apostas = _somar_agregados(_agregar_apostas(Bet), _agregar_apostas(BetArchive))
+    carteiras = Carteira.objects.aggregate(
+        total_carteiras=Count('id'),
+        saldo_total_pontos=Sum('pontos'),
+        saldo_total_fundos=Sum('fundos'),
+    )
+    risco = get_risk_exposure().aggregate(
+        risco_alto=Count('event_id', filter=Q(payout__gt=10000)),
+        risco_medio=Count('event_id', filter=Q(payout__gt=5000, payout__lte=10000)),
+    )
+
+    metricas = {
+        'total_usuarios': User.objects.count(),
+        'total_transacoes': Transacao.objects.count() + TransacaoArquivada.objects.count(),
+        **eventos,
+        **cartelas,
+        **selecoes,
+        **apostas,
+        **carteiras,
+        **risco,
+    }
+    for chave in ('volume_total', 'payout_total', 'saldo_total_pontos', 'saldo_total_fundos'):
+        metricas[chave] = _soma(metricas[chave])
+    return metricas
+
+
+def calcular_metricas_de_hoje():
+    """Números do dia: intervalos em colunas indexadas, custo não cresce com o histórico"""
+    from betting.models import Bet, Event
+
+    inicio = _inicio_do_dia()
+    apostas = Bet.objects.filter(created_at__gte=inicio).aggregate(
+        apostas_hoje=Count('id'),
+        volume_hoje=Sum('stake'),
+    )
+    return {
+        'usuarios_hoje': User.objects.filter(date_joined__gte=inicio).count(),
+        'eventos_hoje': Event.objects.filter(
+            start_time__gte=inicio,
+            start_time__lt=inicio + timedelta(days=1),
+        ).count(),
+        'apostas_hoje': apostas['apostas_hoje'],
+        'volume_hoje': _soma(apostas['volume_hoje']),
+        'transacoes_hoje': Transacao.objects.filter(criado_em__gte=inicio).count(),
+    }
+
+
+def atualizar_metricas():
+    """Recalcula e grava o snapshot dos totais gerais"""
+    snapshot, _ = MetricasDashboard.objects.update_or_create(
+        chave=CHAVE_GERAL,
+        defaults={
+            'dados': calcular_metricas_acumuladas(),
+            'atualizado_em': timezone.now(),
+        },
+    )
+    return snapshot
+
+
+def obter_metricas():
+    """
+    Snapshot dos totais gerais, recalculado na hora se ainda não existe ou se
+    está mais velho que DASHBOARD_METRICAS_MAX_IDADE segundos.
+    Retorna (dados, atualizado_em).
+    """
+    snapshot = MetricasDashboard.objects.filter(chave=CHAVE_GERAL).first()
+    limite = timezone.now() - timedelta(seconds=settings.DASHBOARD_METRICAS_MAX_IDADE)
+    if snapshot is None or snapshot.atualizado_em < limite:
+        snapshot = atualizar_metricas()
+    return snapshot.dados, snapshot.atualizado_em
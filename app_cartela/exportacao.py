@@ -0,0 +1,168 @@
+"""
+Exportação em streaming do extrato (Transacao) e do histórico de apostas (Bet).
+
+As linhas saem de `values_list(...).iterator(chunk_size=...)` — no Postgres isso
+usa cursor do lado do servidor — e são formatadas uma a uma, então a memória
+fica constante mesmo com milhões de registros. Primeiro saem as linhas da
+tabela de arquivo (mais antigas), depois as da tabela quente.
+"""
+import csv
+from datetime import datetime, time, timedelta
+from itertools import chain
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Transacao, TransacaoArquivada
+
+
+CHUNK_SIZE = 2000
+FORMATOS = ('csv', 'jsonl')
+RECURSOS = ('transacoes', 'apostas')
+
+COLUNAS_TRANSACOES = [
+    ('id', 'id'),
+    ('criado_em', 'criado_em'),
+    ('usuario_id', 'carteira__usuario_id'),
+    ('usuario', 'carteira__usuario__username'),
+    ('tipo', 'tipo'),
+    ('categoria', 'categoria'),
+    ('valor', 'valor'),
+    ('saldo_anterior_pontos', 'saldo_anterior_pontos'),
+    ('saldo_anterior_fundos', 'saldo_anterior_fundos'),
+    ('descricao', 'descricao'),
+]
+
+COLUNAS_APOSTAS = [
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('cartela_id', 'cartela_id'),
+    ('usuario_id', 'cartela__user_id'),
+    ('usuario', 'cartela__user__username'),
+    ('evento_id', 'cartela__event_id'),
+    ('template_tipo', 'cartela__cartela_template__tipo'),
+    ('categoria', 'categoria'),
+    ('stake', 'stake'),
+    ('odd_final', 'odd_final'),
+    ('potential_return', 'potential_return'),
+    ('is_won', 'is_won'),
+    ('settled_at', 'settled_at'),
+]
+
+
+def _intervalo(inicio, fim):
+    """Converte datas 'AAAA-MM-DD' (fim inclusivo) em datetimes do fuso local"""
+    limites = []
+    for valor, dias in ((inicio, 0), (fim, 1)):
+        if not valor:
+            limites.append(None)
+            continue
+        data = parse_date(valor) if isinstance(valor, str) else valor
+        if data is None:
+            raise ValueError(f'Data inválida: {valor}')
+        limites.append(timezone.make_aware(datetime.combine(data + timedelta(days=dias), time.min)))
+    return limites
+
+
+def _filtro_usuario(usuario, campo_id, campo_username):
+    if isinstance(usuario, int) or str(usuario).isdigit():
+        return {campo_id: int(usuario)}
+    return {campo_username: usuario}
+
+
+def filtrar_transacoes(inicio=None, fim=None, tipo=None, categoria=None, usuario=None, modelo=Transacao):
+    de, ate = _intervalo(inicio, fim)
+    qs = modelo.objects.all()
+    if de:
+        qs = qs.filter(criado_em__gte=de)
+    if ate:
+        qs = qs.filter(criado_em__lt=ate)
+    if tipo:
+        qs = qs.filter(tipo=tipo)
+    if categoria:
+        qs = qs.filter(categoria=categoria)
+    if usuario:
+        qs = qs.filter(**_filtro_usuario(usuario, 'carteira__usuario_id', 'carteira__usuario__username'))
+    return qs.order_by('criado_em', 'id')
+
+
+def filtrar_apostas(inicio=None, fim=None, tipo=None, categoria=None, usuario=None, modelo=None):
+    """`tipo` filtra pelo tipo do template da cartela; `categoria` pelo saldo debitado"""
+    from betting.models import Bet
+
+    de, ate = _intervalo(inicio, fim)
+    qs = (modelo or Bet).objects.all()
+    if de:
+        qs = qs.filter(created_at__gte=de)
+    if ate:
+        qs = qs.filter(created_at__lt=ate)
+    if tipo:
+        qs = qs.filter(cartela__cartela_template__tipo=tipo)
+    if categoria:
+        qs = qs.filter(categoria=categoria)
+    if usuario:
+        qs = qs.filter(**_filtro_usuario(usuario, 'cartela__user_id', 'cartela__user__username'))
+    return qs.order_by('created_at', 'id')
+
+
+def _linhas(recurso, filtros):
+    if recurso == 'transacoes':
+        colunas = COLUNAS_TRANSACOES
+        querysets = [
+            filtrar_transacoes(**filtros, modelo=TransacaoArquivada),
+            filtrar_transacoes(**filtros),
+        ]
+    elif recurso == 'apostas':
+        from betting.models import BetArchive
+
+        colunas = COLUNAS_APOSTAS
+        querysets = [
+            filtrar_apostas(**filtros, modelo=BetArchive),
+            filtrar_apostas(**filtros),
+        ]
+    else:
+        raise ValueError(f'Recurso inválido: {recurso}')
+    cabecalho = [nome for nome, _ in colunas]
+    campos = [campo for _, campo in colunas]
+    linhas = chain.from_iterable(
+        qs.values_list(*campos).iterator(chunk_size=CHUNK_SIZE) for qs in querysets
+    )
+    return cabecalho, linhas
+
+
+class _Eco:
+    """Buffer de escrita que só devolve o que recebeu (para csv.writer em streaming)"""
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def _gerar_csv(cabecalho, linhas):
+    writer = csv.writer(_Eco())
+    yield writer.writerow(cabecalho)
+    for linha in linhas:
+        yield writer.writerow([_valor_csv(v) for v in linha])
+
+
+def _gerar_jsonl(cabecalho, linhas):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for linha in linhas:
+        yield encoder.encode(dict(zip(cabecalho, linha))) + '\n'
+
+
+def exportar(recurso, formato='csv', **filtros):
+    """
+    Retorna um gerador de pedaços de texto (uma linha por item) do recurso.
+    Filtros: inicio, fim (AAAA-MM-DD), tipo, categoria, usuario (id ou username).
+    Parâmetros inválidos levantam ValueError aqui, antes do streaming começar.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}')
+    cabecalho, linhas = _linhas(recurso, filtros)
+    if formato == 'csv':
+        return _gerar_csv(cabecalho, linhas)
+    return _gerar_jsonl(cabecalho, linhas)
@@ -0,0 +1,197 @@
+"""
+Instrumentação das requisições: queries, tempo de SQL, de view e de serialização.
+
+`InstrumentacaoMiddleware` mede cada requisição com um `execute_wrapper` em
+todas as conexões (funciona com DEBUG=False), devolve os números no header
+Server-Timing e guarda as últimas amostras de cada view em `agregado`, exibido
+em /empresa/desempenho/. `SerializacaoMedidaMixin` (para serializers DRF) soma
+o tempo de `to_representation` — incluindo as queries preguiçosas que ele
+dispara, onde os N+1 costumam aparecer.
+
+`QUERY_BUDGETS` (settings) define o máximo de queries por view (nome da URL,
+ex. 'betting:bets-my'). Estourar o orçamento gera um warning no log, ou levanta
+OrcamentoDeQueriesExcedido quando QUERY_BUDGETS_RAISE está ligado (padrão nos
+testes).
+
+Respostas em streaming só têm medido o que roda antes do primeiro byte.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class OrcamentoDeQueriesExcedido(Exception):
+    pass
+
+
+class Medicao:
+    """Números de uma requisição (tempos em segundos)"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serializacao = 0.0
+        self.inicio_view = None
+        self.fim_view = None
+        self._profundidade = 0
+
+    @property
+    def view(self):
+        if self.inicio_view is None:
+            return None
+        return (self.fim_view or time.perf_counter()) - self.inicio_view
+
+    def server_timing(self, total):
+        partes = [f'db;dur={self.sql * 1000:.2f};desc="{self.queries} queries"']
+        if self.view is not None:
+            partes.append(f'view;dur={self.view * 1000:.2f}')
+        if self.serializacao:
+            partes.append(f'ser;dur={self.serializacao * 1000:.2f}')
+        partes.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(partes)
+
+
+# Controle de transação (savepoints de atomic aninhado etc.) entra no tempo de
+# SQL mas não na contagem: o orçamento é de queries de dados.
+_CONTROLE_DE_TRANSACAO = ('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+
+def _registrar_sql(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.sql += time.perf_counter() - inicio
+        if not sql.lstrip().upper().startswith(_CONTROLE_DE_TRANSACAO):
+            medicao.queries += 1
+
+
+@contextmanager
+def medir():
+    """Mede as queries executadas no bloco; produz a Medicao"""
+    medicao = Medicao()
+    token = _medicao_atual.set(medicao)
+    try:
+        with ExitStack() as stack:
+            for conexao in connections.all():
+                stack.enter_context(conexao.execute_wrapper(_registrar_sql))
+            yield medicao
+    finally:
+        _medicao_atual.reset(token)
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class AgregadoRolante:
+    """Últimas `janela` amostras por view, em memória (por processo)"""
+
+    def __init__(self, janela=500):
+        self.janela = janela
+        self._lock = threading.Lock()
+        self._amostras = defaultdict(lambda: deque(maxlen=self.janela))
+
+    def registrar(self, view, medicao, total):
+        amostra = (medicao.queries, medicao.sql, medicao.view or 0.0, medicao.serializacao, total)
+        with self._lock:
+            self._amostras[view].append(amostra)
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+
+    def resumo(self):
+        with self._lock:
+            copia = {view: list(amostras) for view, amostras in self._amostras.items()}
+        orcamentos = getattr(settings, 'QUERY_BUDGETS', {})
+        resumo = []
+        for view, amostras in copia.items():
+            queries, sql, tempos_view, serializacao, totais = zip(*amostras)
+            n = len(amostras)
+            resumo.append({
+                'view': view,
+                'requisicoes': n,
+                'queries_media': round(sum(queries) / n, 2),
+                'queries_max': max(queries),
+                'orcamento': orcamentos.get(view),
+                'sql_ms_media': round(sum(sql) / n * 1000, 2),
+                'view_ms_media': round(sum(tempos_view) / n * 1000, 2),
+                'serializacao_ms_media': round(sum(serializacao) / n * 1000, 2),
+                'total_ms_p50': round(_percentil(totais, 50) * 1000, 2),
+                'total_ms_p95': round(_percentil(totais, 95) * 1000, 2),
+            })
+        return sorted(resumo, key=lambda r: r['total_ms_p95'], reverse=True)
+
+
+agregado = AgregadoRolante(getattr(settings, 'INSTRUMENTACAO_JANELA', 500))
+
+
+def verificar_orcamento(view, queries):
+    orcamento = getattr(settings, 'QUERY_BUDGETS', {}).get(view)
+    if orcamento is None or queries <= orcamento:
+        return
+    mensagem = f'{view} executou {queries} queries (orçamento: {orcamento})'
+    if getattr(settings, 'QUERY_BUDGETS_RAISE', False):
+        raise OrcamentoDeQueriesExcedido(mensagem)
+    logger.warning(mensagem)
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição e publica Server-Timing; deve vir logo no início do MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medir() as medicao:
+            request._medicao = medicao
+            response = self.get_response(request)
+        total = time.perf_counter() - medicao.inicio
+
+        response['Server-Timing'] = medicao.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            agregado.registrar(match.view_name, medicao, total)
+            verificar_orcamento(match.view_name, medicao.queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._medicao.inicio_view = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Template/DRF Response: a renderização vem depois, fora do tempo de view
+        request._medicao.fim_view = time.perf_counter()
+        return response
+
+
+class SerializacaoMedidaMixin:
+    """Mixin de serializer DRF: soma o tempo de to_representation na medição atual"""
+
+    def to_representation(self, instance):
+        medicao = _medicao_atual.get()
+        if medicao is None or medicao._profundidade:
+            # Serializers aninhados já estão dentro do tempo do externo
+            return super().to_representation(instance)
+        medicao._profundidade += 1
+        inicio = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            medicao._profundidade -= 1
+            medicao.serializacao += time.perf_counter() - inicio
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from app_cartela.arquivamento import arquivar_transacoes
+from betting.archive import archive_cartelas
+
+
+class Command(BaseCommand):
+    help = (
+        'Move transações e cartelas encerradas (com itens, apostas e snapshots) '
+        'mais antigas que o corte para as tabelas de arquivo, em lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recurso',
+            nargs='?',
+            choices=['transacoes', 'cartelas', 'todos'],
+            default='todos',
+            help='O que arquivar (padrão: todos)'
+        )
+        parser.add_argument(
+            '--idade-dias',
+            type=int,
+            default=None,
+            help='Idade mínima em dias (padrão: settings.ARQUIVAMENTO_IDADE_DIAS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='Linhas principais por lote')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de pausa entre lotes')
+
+    def handle(self, *args, **options):
+        tarefas = []
+        if options['recurso'] in ('transacoes', 'todos'):
+            tarefas.append(('transações', arquivar_transacoes))
+        if options['recurso'] in ('cartelas', 'todos'):
+            tarefas.append(('cartelas', archive_cartelas))
+
+        for nome, arquivar in tarefas:
+            resultado = arquivar(options['idade_dias'], options['batch_size'], options['pausa'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {resultado.movidas} {nome} arquivadas em {resultado.lotes} lotes ({resultado.duracao:.2f}s)'
+            ))
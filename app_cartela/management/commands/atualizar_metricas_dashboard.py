@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from app_cartela.dashboard import atualizar_metricas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o snapshot de métricas do dashboard administrativo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Se informado, roda em loop recalculando a cada N segundos'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            inicio = time.monotonic()
+            snapshot = atualizar_metricas()
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Métricas atualizadas em {time.monotonic() - inicio:.2f}s '
+                f'({snapshot.atualizado_em:%d/%m/%Y %H:%M:%S})'
+            ))
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
@@ -1,13 +1,86 @@
-from django.core.management.base import BaseCommand
+import argparse
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta
+from app_cartela.models import Carteira, Transacao
 from betting.models import (
-    Event, MarketSelection, CartelaTemplate, CartelaTemplateItem
+    Event, MarketSelection, CartelaTemplate, CartelaTemplateItem,
+    CartelaInstance, CartelaInstanceItem, Bet,
 )
 
 
+TIMES = [
+    'Flamengo', 'Palmeiras', 'Corinthians', 'São Paulo', 'Santos', 'Grêmio',
+    'Internacional', 'Atlético-MG', 'Cruzeiro', 'Vasco', 'Fluminense', 'Botafogo',
+    'Bahia', 'Fortaleza', 'Athletico-PR', 'Sport',
+]
+
+TIPOS_SELECAO = [
+    ('TOTAL_GOALS_OVER', [{'line': 0.5}, {'line': 1.5}, {'line': 2.5}, {'line': 3.5}]),
+    ('TOTAL_GOALS_UNDER', [{'line': 1.5}, {'line': 2.5}, {'line': 3.5}]),
+    ('NEXT_CORNER', [{'team': 'home'}, {'team': 'away'}]),
+    ('TEAM_TO_SCORE', [
+        {'team': 'home', 'time': 'first_half'}, {'team': 'away', 'time': 'first_half'},
+        {'team': 'home', 'time': 'full_time'}, {'team': 'away', 'time': 'full_time'},
+    ]),
+    ('BOTH_TEAMS_TO_SCORE', [{'value': True}, {'value': False}]),
+    ('MATCH_RESULT', [{'result': 'home'}, {'result': 'draw'}, {'result': 'away'}]),
+]
+
+TIPOS_TRANSACAO = ['DEPOSITO', 'BONUS', 'PREMIO', 'DEBITO', 'SAQUE', 'APOSTA', 'GANHO']
+TIPOS_DEBITO = ('DEBITO', 'SAQUE', 'APOSTA')
+TIPOS_CREDITO = [t for t in TIPOS_TRANSACAO if t not in TIPOS_DEBITO]
+
+
+def data_base(valor):
+    """--data-base: data ou data/hora ISO 8601 (sem fuso: fuso do projeto)"""
+    data = parse_datetime(valor)
+    if data is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise argparse.ArgumentTypeError(f'Data inválida: {valor}')
+        data = datetime.combine(dia, datetime.min.time())
+    return data if timezone.is_aware(data) else timezone.make_aware(data)
+
+
+@contextmanager
+def sem_auto_now_add(model, campo):
+    """Permite gravar datas retroativas em campos auto_now_add durante a carga"""
+    field = model._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
 class Command(BaseCommand):
-    help = 'Cria dados de teste: eventos, seleções e template de cartela'
+    help = (
+        'Cria dados de teste: eventos, seleções e template de cartela. '
+        'Com --usuarios/--eventos/--cartelas/--transacoes gera carga em volume com bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=0, help='Usuários (com carteira) a gerar')
+        parser.add_argument('--eventos', type=int, default=0, help='Eventos a gerar')
+        parser.add_argument('--selecoes-por-evento', type=int, default=10, help='Seleções por evento gerado')
+        parser.add_argument('--cartelas', type=int, default=0, help='Cartelas (com itens e aposta) a gerar')
+        parser.add_argument('--transacoes', type=int, default=0, help='Transações de carteira a gerar')
+        parser.add_argument('--dias', type=int, default=365, help='Janela de tempo (dias) das datas geradas')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador (carga determinística)')
+        parser.add_argument(
+            '--data-base', type=data_base, default=None,
+            help='Data de referência da carga (AAAA-MM-DD ou ISO 8601; padrão: agora)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Linhas por bulk_create')
 
     def criar_selecoes_para_evento(self, evento):
         """Cria seleções de mercado para um evento"""
@@ -177,3 +250,299 @@ class Command(BaseCommand):
             for evt in eventos_criados:
                 self.stdout.write(f'   • {evt} (ID: {evt.id}) - {evt.get_sport_display()}')
 
+        if any(options[k] for k in ('usuarios', 'eventos', 'cartelas', 'transacoes')):
+            self.gerar_carga(template, options)
+
+    # ========================
+    # Carga em volume
+    # ========================
+
+    def _em_lotes(self, model, objetos, batch_size):
+        """bulk_create de um gerador em lotes; retorna os ids criados"""
+        ids = []
+        lote = []
+        for obj in objetos:
+            lote.append(obj)
+            if len(lote) >= batch_size:
+                ids.extend(o.pk for o in model.objects.bulk_create(lote, batch_size=batch_size))
+                lote = []
+        if lote:
+            ids.extend(o.pk for o in model.objects.bulk_create(lote, batch_size=batch_size))
+        return ids
+
+    def _medir(self, nome, func, *args):
+        inicio = time.monotonic()
+        with transaction.atomic():
+            resultado, linhas = func(*args)
+        duracao = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'   └─ {nome}: {linhas} linhas em {duracao:.2f}s ({linhas / duracao if duracao else 0:.0f} linhas/s)'
+        ))
+        return resultado, linhas
+
+    def _data_aleatoria(self, rng, agora, dias):
+        return agora - timedelta(seconds=rng.randrange(max(1, dias * 86400)))
+
+    def gerar_usuarios(self, rng, opcoes, agora):
+        prefixo = f'carga{opcoes["seed"]}_'
+        if User.objects.filter(username__startswith=prefixo).exists():
+            raise CommandError(f'Já existem usuários "{prefixo}*". Use outra --seed.')
+        senha = make_password('senha-carga')
+        usuarios = (
+            User(
+                username=f'{prefixo}{i}',
+                email=f'{prefixo}{i}@carga.cartela.bet',
+                password=senha,
+                date_joined=self._data_aleatoria(rng, agora, opcoes['dias']),
+            )
+            for i in range(opcoes['usuarios'])
+        )
+        # bulk_create não dispara o signal que cria a carteira: criamos junto.
+        user_ids = self._em_lotes(User, usuarios, opcoes['batch_size'])
+        carteiras = [
+            Carteira(
+                usuario_id=uid,
+                pontos=Decimal(rng.randrange(0, 100000)) / 100,
+                fundos=Decimal(rng.randrange(0, 500000)) / 100,
+            )
+            for uid in user_ids
+        ]
+        carteira_ids = self._em_lotes(Carteira, carteiras, opcoes['batch_size'])
+
+        # Saldo inicial lançado no extrato, antes de qualquer transação gerada,
+        # para a carteira conferir na conciliação (saldo = soma das transações)
+        inicio = agora - timedelta(days=opcoes['dias'])
+
+        def saldos_iniciais():
+            for carteira_id, carteira in zip(carteira_ids, carteiras):
+                anterior = {'PONTOS': Decimal('0.00'), 'FUNDOS': Decimal('0.00')}
+                for tipo, categoria, valor in (
+                    ('BONUS', 'PONTOS', carteira.pontos), ('DEPOSITO', 'FUNDOS', carteira.fundos),
+                ):
+                    if not valor:
+                        continue
+                    yield Transacao(
+                        carteira_id=carteira_id, tipo=tipo, categoria=categoria,
+                        valor=valor, descricao='Carga de teste (saldo inicial)',
+                        saldo_anterior_pontos=anterior['PONTOS'],
+                        saldo_anterior_fundos=anterior['FUNDOS'],
+                        criado_em=inicio,
+                    )
+                    anterior[categoria] = valor
+
+        with sem_auto_now_add(Transacao, 'criado_em'):
+            transacao_ids = self._em_lotes(Transacao, saldos_iniciais(), opcoes['batch_size'])
+        saldos = {
+            carteira_id: {'PONTOS': carteira.pontos, 'FUNDOS': carteira.fundos}
+            for carteira_id, carteira in zip(carteira_ids, carteiras)
+        }
+        return (dict(zip(user_ids, carteira_ids)), saldos), len(user_ids) + len(carteira_ids) + len(transacao_ids)
+
+    def gerar_eventos(self, rng, opcoes, agora):
+        eventos = []
+        for _ in range(opcoes['eventos']):
+            casa, fora = rng.sample(TIMES, 2)
+            inicio = agora + timedelta(hours=rng.randint(-24 * opcoes['dias'], 24 * 14))
+            if inicio > agora + timedelta(hours=2):
+                status = 'SCHEDULED'
+            elif inicio > agora - timedelta(hours=2):
+                status = 'LIVE'
+            else:
+                status = 'FINISHED'
+            eventos.append(Event(
+                sport='SOCCER', team_home=casa, team_away=fora,
+                start_time=inicio, status=status,
+                external_id=f'carga{opcoes["seed"]}-{rng.getrandbits(48):x}',
+            ))
+        event_ids = self._em_lotes(Event, eventos, opcoes['batch_size'])
+
+        catalogo = [(tipo, params) for tipo, variantes in TIPOS_SELECAO for params in variantes]
+        selecoes_por_evento = {}
+
+        def selecoes():
+            for event_id, evento in zip(event_ids, eventos):
+                escolhidas = rng.sample(catalogo, min(opcoes['selecoes_por_evento'], len(catalogo)))
+                for tipo, params in escolhidas:
+                    prob = rng.uniform(0.15, 0.85)
+                    odd_justa = round(1 / prob, 2)
+                    yield MarketSelection(
+                        event_id=event_id, selection_type=tipo, params=params,
+                        prob_base=round(prob, 4), odd_justa=odd_justa,
+                        odd_publicada=max(1.01, round(odd_justa * 0.93, 2)),
+                        is_live=evento.status == 'LIVE',
+                    )
+
+        lote = []
+        total = 0
+        for sel in selecoes():
+            lote.append(sel)
+            if len(lote) >= opcoes['batch_size']:
+                total += self._guardar_selecoes(lote, selecoes_por_evento)
+                lote = []
+        if lote:
+            total += self._guardar_selecoes(lote, selecoes_por_evento)
+        return (event_ids, selecoes_por_evento), len(event_ids) + total
+
+    def _guardar_selecoes(self, lote, selecoes_por_evento):
+        for sel in MarketSelection.objects.bulk_create(lote):
+            selecoes_por_evento.setdefault(sel.event_id, []).append((sel.pk, sel.odd_publicada))
+        return len(lote)
+
+    def gerar_cartelas(self, rng, opcoes, agora, template, carteira_de, saldos, selecoes_por_evento):
+        """
+        Cartelas com itens e, para as confirmadas, aposta e débito APOSTA na
+        carteira, como no fluxo de cotação e confirmação: a exposição de risco
+        (RiskExposureMetrics) soma todas as cartelas, o extrato recebe o débito
+        com o saldo corrente e o passivo por seleção é recalculado no fim.
+        Sem fundos para o stake, a cartela fica pendente (cotação não confirmada).
+        """
+        from betting import liability
+        from betting.services import _update_risk_exposure
+
+        eventos = [eid for eid, sels in selecoes_por_evento.items() if len(sels) >= 3]
+        user_ids = list(carteira_de)
+        if not eventos or not user_ids:
+            raise CommandError('Gerar cartelas exige usuários e eventos com ao menos 3 seleções.')
+        total = 0
+        restantes = opcoes['cartelas']
+        while restantes > 0:
+            n = min(restantes, opcoes['batch_size'])
+            restantes -= n
+            cartelas, escolhas, debitos = [], [], []
+            for _ in range(n):
+                event_id = rng.choice(eventos)
+                sels = rng.sample(selecoes_por_evento[event_id], rng.randint(3, min(5, len(selecoes_por_evento[event_id]))))
+                odd = 1.0
+                for _, o in sels:
+                    odd *= o
+                stake = Decimal(rng.randrange(100, 20000)) / 100
+                user_id = rng.choice(user_ids)
+                saldo = saldos[carteira_de[user_id]]
+                confirmada = rng.random() < 0.9 and saldo['FUNDOS'] >= stake
+                criada_em = self._data_aleatoria(rng, agora, opcoes['dias'])
+                cartelas.append(CartelaInstance(
+                    user_id=user_id, event_id=event_id, cartela_template=template,
+                    status='APOSTA_CONFIRMADA' if confirmada else 'APOSTA_PENDENTE',
+                    odd_final=odd, premio_maximo=(stake * Decimal(str(odd))).quantize(Decimal('0.01')),
+                    stake=stake, created_at=criada_em,
+                ))
+                escolhas.append((sels, confirmada))
+                if confirmada:
+                    debitos.append(Transacao(
+                        carteira_id=carteira_de[user_id], tipo='APOSTA', categoria='FUNDOS',
+                        valor=-stake, descricao='Carga de teste (aposta confirmada)',
+                        saldo_anterior_pontos=saldo['PONTOS'],
+                        saldo_anterior_fundos=saldo['FUNDOS'],
+                        criado_em=criada_em,
+                    ))
+                    saldo['FUNDOS'] -= stake
+            with sem_auto_now_add(CartelaInstance, 'created_at'):
+                criadas = CartelaInstance.objects.bulk_create(cartelas)
+            itens = [
+                CartelaInstanceItem(cartela_instance_id=c.pk, market_selection_id=sid, odd_usada=o)
+                for c, (sels, _) in zip(criadas, escolhas) for sid, o in sels
+            ]
+            CartelaInstanceItem.objects.bulk_create(itens, batch_size=opcoes['batch_size'])
+            apostas = [
+                Bet(
+                    cartela_id=c.pk, stake=c.stake, odd_final=c.odd_final,
+                    potential_return=c.premio_maximo, created_at=c.created_at,
+                )
+                for c, (_, confirmada) in zip(criadas, escolhas) if confirmada
+            ]
+            with sem_auto_now_add(Bet, 'created_at'):
+                Bet.objects.bulk_create(apostas, batch_size=opcoes['batch_size'])
+
+            with sem_auto_now_add(Transacao, 'criado_em'):
+                Transacao.objects.bulk_create(debitos, batch_size=opcoes['batch_size'])
+
+            # Exposição como na cotação: um upsert por evento do lote
+            exposicao = {}
+            for c in criadas:
+                volume, payout = exposicao.get(c.event_id, (Decimal('0'), Decimal('0')))
+                exposicao[c.event_id] = (volume + c.stake, payout + c.premio_maximo)
+            for event_id, (volume, payout) in exposicao.items():
+                _update_risk_exposure(event_id, template, template.influencer_id, volume, payout)
+            total += len(criadas) + len(itens) + len(apostas) + len(debitos) + len(exposicao)
+
+        self._gravar_saldos(saldos, opcoes['batch_size'])
+        total += liability.rebuild(batch_size=opcoes['batch_size'])
+        return None, total
+
+    def gerar_transacoes(self, rng, opcoes, agora, saldos):
+        """
+        Extrato coerente com as carteiras: em ordem cronológica (os ids seguem
+        a ordem das movimentações), com saldo_anterior_* igual ao saldo
+        corrente e débitos que nunca deixam o saldo negativo. No fim, o saldo
+        de cada carteira é gravado (soma das suas transações por categoria).
+        """
+        if not saldos:
+            raise CommandError('Gerar transações exige usuários (--usuarios).')
+        carteira_ids = list(saldos)
+        datas = sorted(self._data_aleatoria(rng, agora, opcoes['dias']) for _ in range(opcoes['transacoes']))
+
+        def transacoes():
+            for criado_em in datas:
+                carteira_id = rng.choice(carteira_ids)
+                saldo = saldos[carteira_id]
+                categoria = 'FUNDOS' if rng.random() < 0.8 else 'PONTOS'
+                tipo = rng.choice(TIPOS_TRANSACAO)
+                valor = Decimal(rng.randrange(100, 50000)) / 100
+                if tipo in TIPOS_DEBITO:
+                    if valor > saldo[categoria]:
+                        tipo = rng.choice(TIPOS_CREDITO)  # sem saldo: vira crédito
+                    else:
+                        valor = -valor
+                transacao = Transacao(
+                    carteira_id=carteira_id, tipo=tipo, categoria=categoria,
+                    valor=valor, descricao=f'Carga de teste ({tipo.lower()})',
+                    saldo_anterior_pontos=saldo['PONTOS'],
+                    saldo_anterior_fundos=saldo['FUNDOS'],
+                    criado_em=criado_em,
+                )
+                saldo[categoria] += valor
+                yield transacao
+
+        with sem_auto_now_add(Transacao, 'criado_em'):
+            ids = self._em_lotes(Transacao, transacoes(), opcoes['batch_size'])
+        self._gravar_saldos(saldos, opcoes['batch_size'])
+        return None, len(ids)
+
+    def _gravar_saldos(self, saldos, batch_size):
+        """Saldo das carteiras = soma do extrato gerado"""
+        Carteira.objects.bulk_update(
+            [Carteira(id=cid, pontos=s['PONTOS'], fundos=s['FUNDOS']) for cid, s in saldos.items()],
+            ['pontos', 'fundos'], batch_size=batch_size,
+        )
+
+    def gerar_carga(self, template, opcoes):
+        """Gera carga em volume, determinística a partir de --seed"""
+        rng = random.Random(opcoes['seed'])
+        # Datas relativas a --data-base: com ela, a mesma seed gera a mesma carga
+        agora = opcoes['data_base'] or timezone.now()
+        inicio = time.monotonic()
+        total = 0
+        self.stdout.write(self.style.SUCCESS(f'\n🚀 Gerando carga (seed={opcoes["seed"]})'))
+
+        carteira_de, saldos = {}, {}
+        if opcoes['usuarios']:
+            (carteira_de, saldos), linhas = self._medir('Usuários/carteiras', self.gerar_usuarios, rng, opcoes, agora)
+            total += linhas
+        selecoes_por_evento = {}
+        if opcoes['eventos']:
+            (_, selecoes_por_evento), linhas = self._medir('Eventos/seleções', self.gerar_eventos, rng, opcoes, agora)
+            total += linhas
+        if opcoes['cartelas']:
+            _, linhas = self._medir(
+                'Cartelas/itens/apostas', self.gerar_cartelas,
+                rng, opcoes, agora, template, carteira_de, saldos, selecoes_por_evento,
+            )
+            total += linhas
+        if opcoes['transacoes']:
+            _, linhas = self._medir('Transações', self.gerar_transacoes, rng, opcoes, agora, saldos)
+            total += linhas
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Carga concluída: {total} linhas em {duracao:.2f}s ({total / duracao if duracao else 0:.0f} linhas/s)'
+        ))
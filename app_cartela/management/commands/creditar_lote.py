@@ -0,0 +1,43 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from app_cartela.services import creditar_em_lote, ler_creditos_csv
+
+
+class Command(BaseCommand):
+    help = 'Credita bônus/prêmios em lote a partir de um CSV (usuario,categoria,valor,tipo[,descricao])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do CSV ou '-' para ler do stdin")
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Linhas por chunk (padrão: 1000)')
+        parser.add_argument('--descricao', default='', help='Descrição padrão para linhas sem descrição')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size deve ser maior que zero')
+
+        if options['arquivo'] == '-':
+            resultado = creditar_em_lote(
+                ler_creditos_csv(sys.stdin, descricao=options['descricao']),
+                chunk_size=options['chunk_size'],
+            )
+        else:
+            try:
+                arquivo = open(options['arquivo'], newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f'Não foi possível abrir o arquivo: {e}')
+            with arquivo:
+                resultado = creditar_em_lote(
+                    ler_creditos_csv(arquivo, descricao=options['descricao']),
+                    chunk_size=options['chunk_size'],
+                )
+
+        for chunk, linha, erro in resultado.falhas:
+            local = f'linha {linha}' if linha else 'chunk inteiro'
+            self.stdout.write(self.style.ERROR(f'❌ Chunk {chunk} ({local}): {erro}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.creditados}/{resultado.total} créditos aplicados '
+            f'em {resultado.chunks} chunks ({resultado.duracao:.2f}s, {resultado.por_segundo:.0f} créditos/s)'
+        ))
+        if resultado.falhas:
+            self.stdout.write(self.style.WARNING(f'⚠️  {len(resultado.falhas)} falhas'))
@@ -0,0 +1,48 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from app_cartela.exportacao import FORMATOS, RECURSOS, exportar
+
+
+class Command(BaseCommand):
+    help = 'Exporta o extrato de transações ou o histórico de apostas em CSV/JSONL (streaming)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recurso', choices=RECURSOS, help='transacoes ou apostas')
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--saida', default='-', help="Arquivo de saída ou '-' para stdout")
+        parser.add_argument('--inicio', help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', help='Data final, inclusiva (AAAA-MM-DD)')
+        parser.add_argument('--tipo', help='Tipo da transação ou do template da cartela')
+        parser.add_argument('--categoria', help='PONTOS ou FUNDOS')
+        parser.add_argument('--usuario', help='ID ou username do usuário')
+
+    def handle(self, *args, **options):
+        try:
+            linhas = exportar(
+                options['recurso'],
+                formato=options['formato'],
+                inicio=options['inicio'],
+                fim=options['fim'],
+                tipo=options['tipo'],
+                categoria=options['categoria'],
+                usuario=options['usuario'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # O CSV começa com a linha de cabeçalho, que não entra no total
+        cabecalho = options['formato'] == 'csv'
+        if options['saida'] == '-':
+            total = self._escrever(linhas, sys.stdout, cabecalho)
+        else:
+            with open(options['saida'], 'w', newline='', encoding='utf-8') as arquivo:
+                total = self._escrever(linhas, arquivo, cabecalho)
+            self.stderr.write(self.style.SUCCESS(f'✅ {total} linhas exportadas para {options["saida"]}'))
+
+    def _escrever(self, linhas, destino, cabecalho):
+        """Escreve as linhas e devolve quantas são de dados"""
+        total = 0
+        for linha in linhas:
+            destino.write(linha)
+            total += 1
+        return total - 1 if cabecalho else total
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from app_cartela.conciliacao import verificar_carteiras
+
+
+class Command(BaseCommand):
+    help = (
+        'Concilia o saldo de todas as carteiras com o extrato, em paralelo, '
+        'a partir do último checkpoint de cada carteira'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Carteiras por faixa de id')
+        parser.add_argument('--workers', type=int, default=4, help='Faixas conferidas em paralelo (1 = sem threads)')
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Ignora os checkpoints e soma o histórico inteiro'
+        )
+        parser.add_argument(
+            '--sem-checkpoint',
+            action='store_true',
+            help='Não grava/avança os checkpoints das carteiras que conferiram'
+        )
+
+    def handle(self, *args, **options):
+        resultado = verificar_carteiras(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            completo=options['completo'],
+            gravar=not options['sem_checkpoint'],
+        )
+
+        for d in resultado.divergencias:
+            self.stdout.write(self.style.ERROR(
+                f'❌ Carteira #{d.carteira_id} ({d.categoria}): extrato soma {d.esperado}, saldo é {d.atual}'
+            ))
+
+        taxa = resultado.carteiras / resultado.duracao if resultado.duracao else 0
+        estilo = self.style.ERROR if resultado.divergencias else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{"⚠️" if resultado.divergencias else "✅"} {resultado.carteiras} carteiras conferidas '
+            f'({resultado.transacoes} transações somadas) em {resultado.duracao:.2f}s '
+            f'({taxa:.0f} carteiras/s): {len(resultado.divergencias)} divergências, '
+            f'{resultado.checkpoints} checkpoints gravados'
+        ))
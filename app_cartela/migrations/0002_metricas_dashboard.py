@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:32
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_cartela', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricasDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=32, unique=True, verbose_name='Chave')),
+                ('dados', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Dados')),
+                ('atualizado_em', models.DateTimeField(verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Métricas do Dashboard',
+                'verbose_name_plural': 'Métricas do Dashboard',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_cartela', '0002_metricas_dashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransacaoArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('DEPOSITO', 'Depósito'), ('BONUS', 'Bônus'), ('PREMIO', 'Prêmio'), ('DEBITO', 'Débito'), ('SAQUE', 'Saque'), ('APOSTA', 'Aposta'), ('GANHO', 'Ganho')], max_length=20, verbose_name='Tipo')),
+                ('categoria', models.CharField(choices=[('PONTOS', 'Pontos'), ('FUNDOS', 'Fundos')], max_length=10, verbose_name='Categoria')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valor')),
+                ('descricao', models.CharField(blank=True, max_length=255, verbose_name='Descrição')),
+                ('saldo_anterior_pontos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Saldo Anterior (Pontos)')),
+                ('saldo_anterior_fundos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Saldo Anterior (Fundos)')),
+                ('criado_em', models.DateTimeField(verbose_name='Criado em')),
+                ('carteira', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transacoes_arquivadas', to='app_cartela.carteira', verbose_name='Carteira')),
+            ],
+            options={
+                'verbose_name': 'Transação Arquivada',
+                'verbose_name_plural': 'Transações Arquivadas',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['-criado_em'], name='app_cartela_criado__96484a_idx'), models.Index(fields=['carteira', '-criado_em'], name='app_cartela_carteir_82f2c8_idx')],
+            },
+        ),
+    ]
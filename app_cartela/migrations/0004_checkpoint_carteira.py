@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_cartela', '0003_transacao_arquivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointCarteira',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_transacao_id', models.BigIntegerField(default=0, verbose_name='Última Transação')),
+                ('soma_pontos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Soma (Pontos)')),
+                ('soma_fundos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Soma (Fundos)')),
+                ('total_transacoes', models.PositiveBigIntegerField(default=0, verbose_name='Transações')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('carteira', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoint', to='app_cartela.carteira', verbose_name='Carteira')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Carteira',
+                'verbose_name_plural': 'Checkpoints de Carteira',
+            },
+        ),
+    ]
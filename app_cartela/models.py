@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -37,93 +38,47 @@ class Carteira(models.Model):
     def __str__(self):
         return f'Carteira de {self.usuario.username}'
 
+    def _aplicar_movimento(self, movimento):
+        """Sincroniza a instância com os saldos retornados pelo UPDATE"""
+        self.pontos = movimento.pontos
+        self.fundos = movimento.fundos
+        return self
+
     def adicionar_pontos(self, valor, descricao='', tipo='BONUS'):
         """Adiciona pontos à carteira e cria transação"""
-        if valor <= 0:
-            raise ValueError('O valor deve ser maior que zero')
-        
-        saldo_anterior_pontos = self.pontos
-        saldo_anterior_fundos = self.fundos
-        self.pontos += valor
-        self.save()
-        
-        Transacao.objects.create(
-            carteira=self,
-            tipo=tipo,
-            categoria='PONTOS',
-            valor=valor,
+        from .services import creditar
+        movimento = creditar(
+            self.pk, 'PONTOS', valor, tipo,
             descricao=descricao or f'Adição de {valor} pontos',
-            saldo_anterior_pontos=saldo_anterior_pontos,
-            saldo_anterior_fundos=saldo_anterior_fundos
         )
-        return self
+        return self._aplicar_movimento(movimento)
 
     def adicionar_fundos(self, valor, descricao='', tipo='DEPOSITO'):
         """Adiciona fundos à carteira e cria transação"""
-        if valor <= 0:
-            raise ValueError('O valor deve ser maior que zero')
-        
-        saldo_anterior_pontos = self.pontos
-        saldo_anterior_fundos = self.fundos
-        self.fundos += valor
-        self.save()
-        
-        Transacao.objects.create(
-            carteira=self,
-            tipo=tipo,
-            categoria='FUNDOS',
-            valor=valor,
+        from .services import creditar
+        movimento = creditar(
+            self.pk, 'FUNDOS', valor, tipo,
             descricao=descricao or f'Adição de R$ {valor}',
-            saldo_anterior_pontos=saldo_anterior_pontos,
-            saldo_anterior_fundos=saldo_anterior_fundos
         )
-        return self
+        return self._aplicar_movimento(movimento)
 
     def debitar_pontos(self, valor, descricao=''):
         """Debita pontos da carteira e cria transação"""
-        if valor <= 0:
-            raise ValueError('O valor deve ser maior que zero')
-        if self.pontos < valor:
-            raise ValueError('Pontos insuficientes')
-        
-        saldo_anterior_pontos = self.pontos
-        saldo_anterior_fundos = self.fundos
-        self.pontos -= valor
-        self.save()
-        
-        Transacao.objects.create(
-            carteira=self,
-            tipo='DEBITO',
-            categoria='PONTOS',
-            valor=-valor,
+        from .services import debitar
+        movimento = debitar(
+            self.pk, 'PONTOS', valor,
             descricao=descricao or f'Débito de {valor} pontos',
-            saldo_anterior_pontos=saldo_anterior_pontos,
-            saldo_anterior_fundos=saldo_anterior_fundos
         )
-        return self
+        return self._aplicar_movimento(movimento)
 
     def debitar_fundos(self, valor, descricao=''):
         """Debita fundos da carteira e cria transação"""
-        if valor <= 0:
-            raise ValueError('O valor deve ser maior que zero')
-        if self.fundos < valor:
-            raise ValueError('Fundos insuficientes')
-        
-        saldo_anterior_pontos = self.pontos
-        saldo_anterior_fundos = self.fundos
-        self.fundos -= valor
-        self.save()
-        
-        Transacao.objects.create(
-            carteira=self,
-            tipo='DEBITO',
-            categoria='FUNDOS',
-            valor=-valor,
+        from .services import debitar
+        movimento = debitar(
+            self.pk, 'FUNDOS', valor,
             descricao=descricao or f'Débito de R$ {valor}',
-            saldo_anterior_pontos=saldo_anterior_pontos,
-            saldo_anterior_fundos=saldo_anterior_fundos
         )
-        return self
+        return self._aplicar_movimento(movimento)
 
 
 class Transacao(models.Model):
@@ -202,3 +157,99 @@ class Transacao(models.Model):
         if self.categoria == 'PONTOS':
             return f'{self.valor:+.2f} pontos'
         return f'R$ {self.valor:+.2f}'
+
+
+class TransacaoArquivada(models.Model):
+    """
+    Transações antigas movidas de Transacao pelo comando arquivar_dados.
+    Mesmas colunas e ids da tabela quente, sem FK física para a carteira.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    carteira = models.ForeignKey(
+        Carteira,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='transacoes_arquivadas',
+        verbose_name='Carteira'
+    )
+    tipo = models.CharField(max_length=20, choices=Transacao.TIPO_CHOICES, verbose_name='Tipo')
+    categoria = models.CharField(max_length=10, choices=Transacao.CATEGORIA_CHOICES, verbose_name='Categoria')
+    valor = models.DecimalField(max_digits=15, decimal_places=2, verbose_name='Valor')
+    descricao = models.CharField(max_length=255, blank=True, verbose_name='Descrição')
+    saldo_anterior_pontos = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Saldo Anterior (Pontos)'
+    )
+    saldo_anterior_fundos = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Saldo Anterior (Fundos)'
+    )
+    criado_em = models.DateTimeField(verbose_name='Criado em')
+
+    valor_formatado = Transacao.valor_formatado
+
+    class Meta:
+        verbose_name = 'Transação Arquivada'
+        verbose_name_plural = 'Transações Arquivadas'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['-criado_em']),
+            models.Index(fields=['carteira', '-criado_em']),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} - carteira #{self.carteira_id} - {self.valor} (arquivada)'
+
+
+class CheckpointCarteira(models.Model):
+    """
+    Soma do extrato da carteira até `ultima_transacao_id` (inclusive), gravada
+    pelo comando verificar_carteiras quando a carteira confere. A próxima
+    verificação só soma as transações posteriores.
+    """
+    carteira = models.OneToOneField(
+        Carteira,
+        on_delete=models.CASCADE,
+        related_name='checkpoint',
+        verbose_name='Carteira'
+    )
+    ultima_transacao_id = models.BigIntegerField(default=0, verbose_name='Última Transação')
+    soma_pontos = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Soma (Pontos)'
+    )
+    soma_fundos = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Soma (Fundos)'
+    )
+    total_transacoes = models.PositiveBigIntegerField(default=0, verbose_name='Transações')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Checkpoint de Carteira'
+        verbose_name_plural = 'Checkpoints de Carteira'
+
+    def __str__(self):
+        return f'Checkpoint carteira #{self.carteira_id} até transação #{self.ultima_transacao_id}'
+
+
+class MetricasDashboard(models.Model):
+    """Snapshot dos totais do dashboard administrativo (atualizado periodicamente)"""
+    chave = models.CharField(max_length=32, unique=True, verbose_name='Chave')
+    dados = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name='Dados')
+    atualizado_em = models.DateTimeField(verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Métricas do Dashboard'
+        verbose_name_plural = 'Métricas do Dashboard'
+
+    def __str__(self):
+        return f'Métricas {self.chave} - {self.atualizado_em:%d/%m/%Y %H:%M}'
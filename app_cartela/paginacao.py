@@ -0,0 +1,113 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class PaginaCursor:
+    """
+    Página de uma paginação por cursor (keyset) em (campo de data, id), do mais
+    recente para o mais antigo. Não faz COUNT(*) nem OFFSET: qualquer página
+    custa o mesmo que a primeira, usando o índice (..., -data) da tabela.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, campo):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.campo = campo
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if not (self.has_next and self.object_list):
+            return None
+        return codificar_cursor(self.object_list[-1], self.campo)
+
+    @property
+    def previous_cursor(self):
+        if not (self.has_previous and self.object_list):
+            return None
+        return codificar_cursor(self.object_list[0], self.campo)
+
+
+def codificar_cursor(obj, campo):
+    bruto = f'{getattr(obj, campo).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (datetime, id) ou None se o cursor for inválido"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, pk = bruto.rsplit('|', 1)
+        data = parse_datetime(data)
+        if data is None:
+            return None
+        return data, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _buscar(querysets, filtro, ordem, limite, campo, crescente):
+    """Aplica filtro/ordem/limite em cada queryset e junta os resultados na mesma ordem"""
+    itens = []
+    for queryset in querysets:
+        if filtro is not None:
+            queryset = queryset.filter(filtro)
+        itens.extend(queryset.order_by(*ordem)[:limite])
+    if len(querysets) > 1:
+        itens.sort(key=lambda obj: (getattr(obj, campo), obj.pk), reverse=not crescente)
+    return itens[:limite]
+
+
+def paginar_por_cursor(queryset, campo, cursor=None, direcao='next', por_pagina=20, arquivo=None):
+    """
+    Pagina `queryset` em ordem (-campo, -id).
+    direcao='next' traz os itens mais antigos que o cursor; 'prev' os mais recentes.
+    `arquivo` (opcional) é o queryset equivalente na tabela de arquivo: cada
+    página consulta as duas e junta o resultado, transparente para quem lê.
+    """
+    querysets = [queryset] if arquivo is None else [queryset, arquivo]
+    decrescente = (f'-{campo}', '-id')
+    posicao = decodificar_cursor(cursor) if cursor else None
+    if posicao is None:
+        itens = _buscar(querysets, None, decrescente, por_pagina + 1, campo, False)
+        return PaginaCursor(itens[:por_pagina], len(itens) > por_pagina, False, campo)
+
+    data, pk = posicao
+    if direcao == 'prev':
+        itens = _buscar(
+            querysets,
+            Q(**{f'{campo}__gt': data}) | Q(**{campo: data, 'id__gt': pk}),
+            (campo, 'id'),
+            por_pagina + 1,
+            campo,
+            True,
+        )
+        tem_mais = len(itens) > por_pagina
+        itens = itens[:por_pagina]
+        itens.reverse()
+        # Cursor além do item mais recente (velho ou forjado): página vazia
+        return PaginaCursor(itens, bool(itens), tem_mais, campo)
+
+    itens = _buscar(
+        querysets,
+        Q(**{f'{campo}__lt': data}) | Q(**{campo: data, 'id__lt': pk}),
+        decrescente,
+        por_pagina + 1,
+        campo,
+        False,
+    )
+    return PaginaCursor(itens[:por_pagina], len(itens) > por_pagina, bool(itens), campo)
@@ -0,0 +1,364 @@
+import csv
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+from .models import Carteira, Transacao
+
+
+CENTAVOS = Decimal('0.01')
+
+# Resultado de uma movimentação: saldos da categoria movimentada antes e
+# depois da operação, mais a transação gravada no extrato.
+MovimentoCarteira = namedtuple(
+    'MovimentoCarteira',
+    ['carteira_id', 'categoria', 'saldo_anterior', 'saldo_atual', 'pontos', 'fundos', 'transacao'],
+)
+
+
+def _to_decimal(valor):
+    """Normaliza valores vindos do cursor (Decimal no Postgres, float no SQLite)"""
+    return Decimal(str(valor)).quantize(CENTAVOS)
+
+
+def _coluna_categoria(categoria):
+    if categoria == 'PONTOS':
+        return 'pontos'
+    if categoria == 'FUNDOS':
+        return 'fundos'
+    raise ValueError('Categoria inválida')
+
+
+def _movimentar_postgres(carteira_id, coluna, delta, tipo, categoria, descricao, agora):
+    """
+    Postgres: UPDATE condicional + INSERT da transação em um único statement.
+    O UPDATE só acontece se o saldo resultante não ficar negativo.
+    """
+    qn = connection.ops.quote_name
+    carteira_table = qn(Carteira._meta.db_table)
+    transacao_table = qn(Transacao._meta.db_table)
+    delta_pontos = delta if coluna == 'pontos' else Decimal('0')
+    delta_fundos = delta if coluna == 'fundos' else Decimal('0')
+    sql = f"""
+        WITH mov AS (
+            UPDATE {carteira_table}
+               SET {qn(coluna)} = {qn(coluna)} + %s, {qn('atualizado_em')} = %s
+             WHERE {qn('id')} = %s AND {qn(coluna)} + %s >= 0
+         RETURNING {qn('id')}, {qn('pontos')}, {qn('fundos')}
+        )
+        INSERT INTO {transacao_table} (
+            {qn('carteira_id')}, {qn('tipo')}, {qn('categoria')}, {qn('valor')}, {qn('descricao')},
+            {qn('saldo_anterior_pontos')}, {qn('saldo_anterior_fundos')}, {qn('criado_em')}
+        )
+        SELECT {qn('id')}, %s, %s, %s, %s, {qn('pontos')} - %s, {qn('fundos')} - %s, %s FROM mov
+        RETURNING {qn('id')}, {qn('saldo_anterior_pontos')}, {qn('saldo_anterior_fundos')}
+    """
+    params = [
+        delta, agora, carteira_id, delta,
+        tipo, categoria, delta, descricao, delta_pontos, delta_fundos, agora,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    transacao_id, anterior_pontos, anterior_fundos = row
+    anterior_pontos = _to_decimal(anterior_pontos)
+    anterior_fundos = _to_decimal(anterior_fundos)
+    return (
+        transacao_id,
+        anterior_pontos,
+        anterior_fundos,
+        anterior_pontos + delta_pontos,
+        anterior_fundos + delta_fundos,
+    )
+
+
+def _movimentar_generico(carteira_id, coluna, delta, tipo, categoria, descricao, agora):
+    """
+    Demais bancos (SQLite em desenvolvimento): UPDATE ... RETURNING seguido do
+    INSERT da transação, dentro da mesma transação de banco.
+    """
+    qn = connection.ops.quote_name
+    sql = f"""
+        UPDATE {qn(Carteira._meta.db_table)}
+           SET {qn(coluna)} = {qn(coluna)} + %s, {qn('atualizado_em')} = %s
+         WHERE {qn('id')} = %s AND {qn(coluna)} + %s >= 0
+     RETURNING {qn('pontos')}, {qn('fundos')}
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [delta, agora, carteira_id, delta])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        pontos, fundos = _to_decimal(row[0]), _to_decimal(row[1])
+        anterior_pontos = pontos - delta if coluna == 'pontos' else pontos
+        anterior_fundos = fundos - delta if coluna == 'fundos' else fundos
+        transacao = Transacao.objects.create(
+            carteira_id=carteira_id,
+            tipo=tipo,
+            categoria=categoria,
+            valor=delta,
+            descricao=descricao,
+            saldo_anterior_pontos=anterior_pontos,
+            saldo_anterior_fundos=anterior_fundos,
+        )
+    return transacao.id, anterior_pontos, anterior_fundos, pontos, fundos
+
+
+def movimentar_carteira(carteira_id, categoria, valor, tipo, descricao=''):
+    """
+    Aplica um crédito (valor > 0) ou débito (valor < 0) na carteira de forma
+    atômica: a checagem de saldo e a alteração acontecem no mesmo UPDATE
+    condicional, sem ler a carteira antes e sem janela de lost update.
+
+    Retorna um MovimentoCarteira com os saldos antes/depois, sem recarregar
+    a carteira. Levanta ValueError se o saldo for insuficiente.
+    """
+    delta = Decimal(str(valor)).quantize(CENTAVOS)
+    if delta == 0:
+        raise ValueError('O valor deve ser diferente de zero')
+    coluna = _coluna_categoria(categoria)
+    agora = timezone.now()
+
+    if connection.vendor == 'postgresql':
+        resultado = _movimentar_postgres(carteira_id, coluna, delta, tipo, categoria, descricao, agora)
+    else:
+        resultado = _movimentar_generico(carteira_id, coluna, delta, tipo, categoria, descricao, agora)
+
+    if resultado is None:
+        # Caminho de erro: só aqui pagamos uma query extra para diferenciar
+        # carteira inexistente de saldo insuficiente.
+        if delta > 0 or not Carteira.objects.filter(id=carteira_id).exists():
+            raise Carteira.DoesNotExist('Carteira não encontrada.')
+        raise ValueError('Pontos insuficientes' if coluna == 'pontos' else 'Fundos insuficientes')
+
+    transacao_id, anterior_pontos, anterior_fundos, pontos, fundos = resultado
+    transacao = Transacao(
+        id=transacao_id,
+        carteira_id=carteira_id,
+        tipo=tipo,
+        categoria=categoria,
+        valor=delta,
+        descricao=descricao,
+        saldo_anterior_pontos=anterior_pontos,
+        saldo_anterior_fundos=anterior_fundos,
+        criado_em=agora,
+    )
+    transacao._state.adding = False
+    transacao._state.db = connection.alias
+    return MovimentoCarteira(
+        carteira_id=carteira_id,
+        categoria=categoria,
+        saldo_anterior=anterior_pontos if coluna == 'pontos' else anterior_fundos,
+        saldo_atual=pontos if coluna == 'pontos' else fundos,
+        pontos=pontos,
+        fundos=fundos,
+        transacao=transacao,
+    )
+
+
+def creditar(carteira_id, categoria, valor, tipo, descricao=''):
+    """Crédito atômico em pontos ou fundos"""
+    if valor <= 0:
+        raise ValueError('O valor deve ser maior que zero')
+    return movimentar_carteira(carteira_id, categoria, valor, tipo, descricao)
+
+
+def debitar(carteira_id, categoria, valor, tipo='DEBITO', descricao=''):
+    """Débito atômico em pontos ou fundos; falha se o saldo for insuficiente"""
+    if valor <= 0:
+        raise ValueError('O valor deve ser maior que zero')
+    return movimentar_carteira(carteira_id, categoria, -valor, tipo, descricao)
+
+
+# ========================
+# Crédito em lote
+# ========================
+
+TIPOS_CREDITO = ('DEPOSITO', 'BONUS', 'PREMIO', 'GANHO')
+
+CreditoLote = namedtuple('CreditoLote', ['usuario', 'categoria', 'valor', 'tipo', 'descricao'])
+CreditoLote.__new__.__defaults__ = ('',)
+
+ResultadoLote = namedtuple(
+    'ResultadoLote',
+    ['total', 'creditados', 'chunks', 'falhas', 'duracao', 'por_segundo'],
+)
+
+
+def ler_creditos_csv(arquivo, descricao=''):
+    """
+    Lê linhas `usuario,categoria,valor,tipo[,descricao]` de um arquivo CSV.
+    `usuario` é o username ou, se nenhum usuário tem esse username, o id. Um cabeçalho começando com
+    "usuario" é ignorado.
+    """
+    for linha in csv.reader(arquivo):
+        if not linha or not linha[0].strip() or linha[0].strip().lower() == 'usuario':
+            continue
+        campos = [c.strip() for c in linha]
+        campos += [''] * (5 - len(campos))
+        yield CreditoLote(
+            usuario=campos[0],
+            categoria=campos[1].upper(),
+            valor=campos[2].replace(',', '.'),
+            tipo=campos[3].upper() or 'BONUS',
+            descricao=campos[4] or descricao,
+        )
+
+
+def _validar_credito(credito):
+    """Normaliza um crédito; levanta ValueError com a mensagem da falha"""
+    credito = CreditoLote(*credito)
+    if credito.categoria not in ('PONTOS', 'FUNDOS'):
+        raise ValueError(f'Categoria inválida: {credito.categoria}')
+    if credito.tipo not in TIPOS_CREDITO:
+        raise ValueError(f'Tipo de crédito inválido: {credito.tipo}')
+    try:
+        valor = Decimal(str(credito.valor)).quantize(CENTAVOS)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Valor inválido: {credito.valor}')
+    if valor <= 0:
+        raise ValueError('O valor deve ser maior que zero')
+    return credito._replace(valor=valor)
+
+
+def _creditar_chunk(creditos, agora):
+    """
+    Aplica um chunk de créditos já validados: 1 SELECT das carteiras,
+    1 UPDATE com CASE por carteira e 1 bulk_create das transações.
+    Retorna (quantidade creditada, falhas por linha).
+    """
+    # Texto é username; só vale como id se nenhum usuário tem esse username
+    ids = {c.usuario for _, c in creditos if isinstance(c.usuario, int)}
+    usernames = {str(c.usuario) for _, c in creditos if not isinstance(c.usuario, int)}
+    ids |= {int(u) for u in usernames if u.isdigit()}
+    carteiras = (
+        Carteira.objects
+        .select_for_update(of=('self',))
+        .filter(Q(usuario_id__in=ids) | Q(usuario__username__in=usernames))
+        .values('id', 'usuario_id', 'usuario__username', 'pontos', 'fundos')
+    )
+    por_id = {}
+    por_username = {}
+    saldos = {}
+    for c in carteiras:
+        por_id[c['usuario_id']] = c['id']
+        por_username[c['usuario__username']] = c['id']
+        saldos[c['id']] = {'PONTOS': c['pontos'], 'FUNDOS': c['fundos']}
+
+    def carteira_de(usuario):
+        if isinstance(usuario, int):
+            return por_id.get(usuario)
+        usuario = str(usuario)
+        carteira_id = por_username.get(usuario)
+        if carteira_id is None and usuario.isdigit():
+            carteira_id = por_id.get(int(usuario))
+        return carteira_id
+
+    deltas = {'PONTOS': {}, 'FUNDOS': {}}
+    transacoes = []
+    falhas = []
+    for indice, credito in creditos:
+        carteira_id = carteira_de(credito.usuario)
+        if carteira_id is None:
+            falhas.append((indice, f'Carteira não encontrada para o usuário {credito.usuario}'))
+            continue
+        saldo = saldos[carteira_id]
+        transacoes.append(Transacao(
+            carteira_id=carteira_id,
+            tipo=credito.tipo,
+            categoria=credito.categoria,
+            valor=credito.valor,
+            descricao=credito.descricao or f'{credito.tipo.title()} em lote',
+            saldo_anterior_pontos=saldo['PONTOS'],
+            saldo_anterior_fundos=saldo['FUNDOS'],
+            criado_em=agora,
+        ))
+        saldo[credito.categoria] += credito.valor
+        delta = deltas[credito.categoria]
+        delta[carteira_id] = delta.get(carteira_id, Decimal('0')) + credito.valor
+
+    if transacoes:
+        campo = Carteira._meta.get_field('fundos')
+        output_field = DecimalField(max_digits=campo.max_digits, decimal_places=campo.decimal_places)
+        atualizacao = {'atualizado_em': agora}
+        for categoria, coluna in (('PONTOS', 'pontos'), ('FUNDOS', 'fundos')):
+            if deltas[categoria]:
+                atualizacao[coluna] = F(coluna) + Case(
+                    *[When(id=cid, then=Value(valor)) for cid, valor in deltas[categoria].items()],
+                    default=Value(Decimal('0')),
+                    output_field=output_field,
+                )
+        carteira_ids = set(deltas['PONTOS']) | set(deltas['FUNDOS'])
+        Carteira.objects.filter(id__in=carteira_ids).update(**atualizacao)
+        Transacao.objects.bulk_create(transacoes, batch_size=len(transacoes))
+    return len(transacoes), falhas
+
+
+def aplicar_creditos(creditos):
+    """
+    Aplica de uma vez uma lista de (usuario, categoria, valor, tipo[, descricao])
+    dentro da transação do chamador — para serviços que precisam creditar
+    junto com outras escritas (ex.: liquidação de apostas).
+    Retorna (quantidade creditada, falhas [(linha, erro)]).
+    """
+    validos = [(indice, _validar_credito(c)) for indice, c in enumerate(creditos, start=1)]
+    if not validos:
+        return 0, []
+    return _creditar_chunk(validos, timezone.now())
+
+
+def creditar_em_lote(creditos, chunk_size=1000):
+    """
+    Credita uma lista (ou gerador) de (usuario, categoria, valor, tipo[, descricao])
+    em chunks set-based. Cada chunk roda na sua própria transação: uma falha
+    de banco descarta só aquele chunk e o processamento continua.
+
+    Retorna um ResultadoLote com o total de linhas, créditos aplicados,
+    chunks processados, falhas [(chunk, linha, erro)], duração e linhas/s.
+    """
+    inicio = time.monotonic()
+    total = creditados = chunks = 0
+    falhas = []
+
+    def processar(chunk_numero, validos):
+        nonlocal creditados
+        if not validos:
+            return
+        try:
+            with transaction.atomic():
+                aplicados, falhas_chunk = _creditar_chunk(validos, timezone.now())
+        except Exception as e:
+            falhas.append((chunk_numero, None, f'Chunk com {len(validos)} linhas descartado: {e}'))
+            return
+        creditados += aplicados
+        falhas.extend((chunk_numero, indice, erro) for indice, erro in falhas_chunk)
+
+    validos = []
+    for indice, credito in enumerate(creditos, start=1):
+        total += 1
+        try:
+            validos.append((indice, _validar_credito(credito)))
+        except (TypeError, ValueError) as e:
+            falhas.append((chunks + 1, indice, str(e)))
+        if total % chunk_size == 0:
+            chunks += 1
+            processar(chunks, validos)
+            validos = []
+    if total % chunk_size:
+        chunks += 1
+        processar(chunks, validos)
+
+    duracao = time.monotonic() - inicio
+    return ResultadoLote(
+        total=total,
+        creditados=creditados,
+        chunks=chunks,
+        falhas=falhas,
+        duracao=duracao,
+        por_segundo=creditados / duracao if duracao else 0.0,
+    )
@@ -1,3 +1,327 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .arquivamento import arquivar_transacoes
+from .conciliacao import verificar_carteiras
+from .dashboard import atualizar_metricas, obter_metricas
+from .exportacao import exportar
+from .instrumentacao import OrcamentoDeQueriesExcedido, agregado
+from .models import Carteira, CheckpointCarteira, MetricasDashboard, Transacao, TransacaoArquivada
+from .paginacao import codificar_cursor, paginar_por_cursor
+from . import services as servicos
+from .services import creditar, creditar_em_lote, debitar
 
-# Create your tests here.
+
+class InstrumentacaoMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.staff = User.objects.create_user("empresa", "empresa@cartela.bet", "senha-segura", is_staff=True)
+
+    def setUp(self):
+        agregado.limpar()
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("app_cartela:carteira"))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=')
+
+    @override_settings(QUERY_BUDGETS={"app_cartela:carteira": 1}, QUERY_BUDGETS_RAISE=True)
+    def test_query_budget_exceeded_raises(self):
+        with self.assertRaisesMessage(OrcamentoDeQueriesExcedido, "app_cartela:carteira"):
+            self.client.get(reverse("app_cartela:carteira"))
+
+    def test_desempenho_aggregates_per_view(self):
+        self.client.get(reverse("app_cartela:carteira"))
+        self.client.get(reverse("app_cartela:carteira"))
+
+        self.client.force_login(self.staff)
+        dados = self.client.get(reverse("app_cartela:desempenho")).json()
+        (carteira,) = [v for v in dados["views"] if v["view"] == "app_cartela:carteira"]
+        self.assertEqual(carteira["requisicoes"], 2)
+        self.assertGreater(carteira["queries_max"], 0)
+
+    def test_desempenho_is_staff_only(self):
+        response = self.client.get(reverse("app_cartela:desempenho"))
+        self.assertRedirects(response, reverse("app_cartela:dashboard"), fetch_redirect_response=False)
+
+
+class MetricasDashboardTests(TestCase):
+    @override_settings(DASHBOARD_METRICAS_MAX_IDADE=300)
+    def test_stale_snapshot_is_recomputed(self):
+        atualizar_metricas()
+        User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+
+        dados, _ = obter_metricas()
+        self.assertEqual(dados["total_usuarios"], 0)
+
+        MetricasDashboard.objects.update(atualizado_em=timezone.now() - timedelta(seconds=301))
+        dados, atualizado_em = obter_metricas()
+        self.assertEqual(dados["total_usuarios"], 1)
+        self.assertGreater(atualizado_em, timezone.now() - timedelta(seconds=5))
+
+
+class ArquivamentoTransacoesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        carteira = cls.user.carteira
+        for valor in ("10.00", "20.00", "30.00"):
+            carteira.adicionar_fundos(Decimal(valor), "Depósito")
+        antigas = Transacao.objects.filter(valor__in=[Decimal("10.00"), Decimal("20.00")])
+        antigas.update(criado_em=timezone.now() - timedelta(days=400))
+
+    def test_moves_old_rows_in_batches(self):
+        resultado = arquivar_transacoes(idade_dias=180, batch_size=1)
+
+        self.assertEqual((resultado.movidas, resultado.lotes), (2, 2))
+        self.assertEqual(Transacao.objects.count(), 1)
+        self.assertEqual(TransacaoArquivada.objects.count(), 2)
+
+    def test_wallet_history_and_export_read_archive(self):
+        arquivar_transacoes(idade_dias=180)
+        self.client.force_login(self.user)
+
+        page = self.client.get(reverse("app_cartela:carteira")).context["page_obj"]
+        self.assertEqual([t.valor for t in page], [Decimal("30.00"), Decimal("20.00"), Decimal("10.00")])
+        linhas = list(exportar("transacoes", formato="jsonl"))
+        self.assertEqual(len(linhas), 3)
+
+
+class ExportacaoApostasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from betting.models import Bet
+
+        call_command(
+            "create_test_data", "--data-base=2025-06-01",
+            usuarios=3, eventos=2, cartelas=30, seed=5, stdout=StringIO(),
+        )
+        cls.pontos = list(Bet.objects.values_list("id", flat=True)[:3])
+        Bet.objects.filter(id__in=cls.pontos).update(categoria="PONTOS")
+
+    def test_categoria_filters_bets(self):
+        linhas = [json.loads(linha) for linha in exportar("apostas", formato="jsonl", categoria="PONTOS")]
+
+        self.assertEqual(sorted(linha["id"] for linha in linhas), sorted(self.pontos))
+        self.assertTrue(all(linha["categoria"] == "PONTOS" for linha in linhas))
+
+    def test_command_reports_data_rows_only(self):
+        from betting.models import Bet
+
+        stderr = StringIO()
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, "apostas.csv")
+            call_command("exportar_dados", "apostas", saida=saida, categoria="FUNDOS", stderr=stderr)
+            with open(saida, encoding="utf-8") as arquivo:
+                self.assertEqual(len(arquivo.readlines()), Bet.objects.filter(categoria="FUNDOS").count() + 1)
+
+        self.assertIn(f"{Bet.objects.filter(categoria='FUNDOS').count()} linhas exportadas", stderr.getvalue())
+
+
+class PaginacaoCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        for valor in ("10.00", "20.00"):
+            cls.user.carteira.adicionar_fundos(Decimal(valor), "Depósito")
+
+    def test_prev_cursor_past_newest_row_returns_empty_page(self):
+        mais_recente = Transacao.objects.order_by("-criado_em", "-id").first()
+        self.client.force_login(self.user)
+
+        response = self.client.get(
+            reverse("app_cartela:carteira"),
+            {"cursor": codificar_cursor(mais_recente, "criado_em"), "dir": "prev"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page_obj"]
+        self.assertEqual(list(page), [])
+        self.assertEqual((page.next_cursor, page.previous_cursor), (None, None))
+
+    def test_next_cursor_past_oldest_row_returns_empty_page(self):
+        mais_antiga = Transacao.objects.order_by("criado_em", "id").first()
+
+        page = paginar_por_cursor(Transacao.objects.all(), "criado_em", cursor=codificar_cursor(mais_antiga, "criado_em"))
+
+        self.assertEqual((list(page), page.next_cursor, page.previous_cursor), ([], None, None))
+
+
+class VerificarCarteirasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.user.carteira.adicionar_fundos(Decimal("50.00"), "Depósito")
+        cls.user.carteira.adicionar_pontos(Decimal("7.00"), "Bônus")
+
+    def test_checkpoint_only_sums_later_transactions(self):
+        primeira = verificar_carteiras(workers=1)
+        self.assertEqual((primeira.transacoes, primeira.divergencias), (2, []))
+
+        self.user.carteira.debitar_fundos(Decimal("20.00"), "Saque")
+        segunda = verificar_carteiras(workers=1)
+
+        self.assertEqual((segunda.transacoes, segunda.divergencias), (1, []))
+        checkpoint = CheckpointCarteira.objects.get(carteira=self.user.carteira)
+        self.assertEqual(checkpoint.soma_fundos, Decimal("30.00"))
+        self.assertEqual(checkpoint.total_transacoes, 3)
+
+    def test_divergent_balance_is_reported_and_not_checkpointed(self):
+        Carteira.objects.filter(id=self.user.carteira.id).update(fundos=Decimal("49.00"))
+
+        resultado = verificar_carteiras(workers=1)
+
+        (divergencia,) = resultado.divergencias
+        self.assertEqual((divergencia.categoria, divergencia.esperado), ("FUNDOS", Decimal("50.00")))
+        self.assertFalse(CheckpointCarteira.objects.exists())
+
+    def test_generated_load_ledger_matches_wallets(self):
+        from betting.expiry import expire_stale_quotes
+        from betting.models import Bet, RiskExposureMetrics
+
+        call_command(
+            "create_test_data", "--data-base=2025-06-01",
+            usuarios=5, eventos=3, cartelas=60, transacoes=300, seed=3, stdout=StringIO(),
+        )
+
+        self.assertEqual(Transacao.objects.filter(descricao__endswith="(aposta confirmada)").count(), Bet.objects.count())
+        expire_stale_quotes()
+        self.assertFalse(RiskExposureMetrics.objects.filter(payout_maximo__lt=0).exists())
+        resultado = verificar_carteiras(workers=1)
+
+        self.assertEqual(resultado.divergencias, [])
+        self.assertEqual(resultado.carteiras, 6)
+        carteira = Carteira.objects.exclude(id=self.user.carteira.id).first()
+        saldo = {"PONTOS": Decimal("0.00"), "FUNDOS": Decimal("0.00")}
+        for transacao in Transacao.objects.filter(carteira=carteira).order_by("id"):
+            self.assertEqual((transacao.saldo_anterior_pontos, transacao.saldo_anterior_fundos), (saldo["PONTOS"], saldo["FUNDOS"]))
+            saldo[transacao.categoria] += transacao.valor
+            self.assertGreaterEqual(saldo[transacao.categoria], 0)
+        self.assertEqual((carteira.pontos, carteira.fundos), (saldo["PONTOS"], saldo["FUNDOS"]))
+
+
+class MovimentarCarteiraTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.carteira = cls.user.carteira
+        creditar(cls.carteira.id, "FUNDOS", Decimal("10.00"), "DEPOSITO")
+        creditar(cls.carteira.id, "PONTOS", Decimal("3.00"), "BONUS")
+
+    def test_insufficient_balance_is_rejected_without_writes(self):
+        with self.assertRaisesMessage(ValueError, "Fundos insuficientes"):
+            debitar(self.carteira.id, "FUNDOS", Decimal("10.01"))
+
+        self.carteira.refresh_from_db()
+        self.assertEqual(self.carteira.fundos, Decimal("10.00"))
+        self.assertFalse(Transacao.objects.filter(tipo="DEBITO").exists())
+
+    def test_second_debit_of_same_balance_fails(self):
+        # Instância lida antes dos débitos: o saldo "em memória" não é usado
+        desatualizada = Carteira.objects.get(id=self.carteira.id)
+
+        debitar(desatualizada.id, "FUNDOS", desatualizada.fundos)
+        with self.assertRaisesMessage(ValueError, "Fundos insuficientes"):
+            debitar(desatualizada.id, "FUNDOS", desatualizada.fundos)
+
+        self.carteira.refresh_from_db()
+        self.assertEqual(self.carteira.fundos, Decimal("0.00"))
+        self.assertEqual(Transacao.objects.filter(tipo="DEBITO").count(), 1)
+
+    def test_ledger_row_records_balances_before_the_movement(self):
+        movimento = debitar(self.carteira.id, "FUNDOS", Decimal("4.00"), tipo="APOSTA")
+
+        self.assertEqual((movimento.saldo_anterior, movimento.saldo_atual), (Decimal("10.00"), Decimal("6.00")))
+        transacao = Transacao.objects.get(id=movimento.transacao.id)
+        self.assertEqual(transacao.valor, Decimal("-4.00"))
+        self.assertEqual(
+            (transacao.saldo_anterior_fundos, transacao.saldo_anterior_pontos),
+            (Decimal("10.00"), Decimal("3.00")),
+        )
+
+
+class CreditarEmLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(f"jogador{i}", f"jogador{i}@cartela.bet", "senha-segura")
+            for i in range(4)
+        ]
+
+    def test_failed_chunk_is_discarded_and_others_are_applied(self):
+        creditos = [(u.id, "FUNDOS", "5.00", "BONUS") for u in self.users]
+        chamadas = itertools.count(1)
+        original = servicos._creditar_chunk
+
+        def falha_no_segundo(validos, agora):
+            # O segundo chunk grava e só então falha: tudo dele deve ser desfeito
+            resultado = original(validos, agora)
+            if next(chamadas) == 2:
+                raise DatabaseError("deadlock")
+            return resultado
+
+        with mock.patch.object(servicos, "_creditar_chunk", side_effect=falha_no_segundo):
+            resultado = creditar_em_lote(creditos, chunk_size=2)
+
+        self.assertEqual((resultado.total, resultado.creditados, resultado.chunks), (4, 2, 2))
+        ((chunk, linha, erro),) = resultado.falhas
+        self.assertEqual((chunk, linha), (2, None))
+        self.assertIn("deadlock", erro)
+        fundos = dict(Carteira.objects.values_list("usuario_id", "fundos"))
+        self.assertEqual([fundos[u.id] for u in self.users], [Decimal("5.00")] * 2 + [Decimal("0.00")] * 2)
+
+    def test_numeric_username_wins_over_user_id(self):
+        numerico = User.objects.create_user("777", "777@cartela.bet", "senha-segura")
+        por_id = User.objects.create(id=777, username="outro", email="outro@cartela.bet")
+        Carteira.objects.get_or_create(usuario=por_id)
+
+        resultado = creditar_em_lote([("777", "FUNDOS", "5.00", "BONUS"), (f"{self.users[0].id}", "FUNDOS", "1.00", "BONUS")])
+
+        self.assertEqual((resultado.creditados, resultado.falhas), (2, []))
+        fundos = dict(Carteira.objects.values_list("usuario_id", "fundos"))
+        self.assertEqual((fundos[numerico.id], fundos[777], fundos[self.users[0].id]), (Decimal("5.00"), Decimal("0.00"), Decimal("1.00")))
+
+    def test_upload_that_is_not_utf8_is_rejected(self):
+        staff = User.objects.create_user("empresa", "empresa@cartela.bet", "senha-segura", is_staff=True)
+        self.client.force_login(staff)
+        arquivo = SimpleUploadedFile("creditos.csv", "jogador0,FUNDOS,5.00,BONUS,Promoção\n".encode("latin-1"))
+
+        response = self.client.post(reverse("app_cartela:bonus"), {"modo": "lote", "arquivo": arquivo}, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("UTF-8", " ".join(str(m) for m in response.context["messages"]))
+        self.assertFalse(Transacao.objects.exists())
+
+    def test_invalid_lines_do_not_discard_their_chunk(self):
+        creditos = [
+            (self.users[0].id, "FUNDOS", "5.00", "BONUS"),
+            (self.users[1].username, "PONTOS", "2.50", "PREMIO"),
+            (self.users[0].id, "FICHAS", "1.00", "BONUS"),
+            ("ninguem", "FUNDOS", "1.00", "BONUS"),
+            (self.users[0].id, "FUNDOS", "1.00", "BONUS"),
+        ]
+
+        resultado = creditar_em_lote(creditos, chunk_size=10)
+
+        self.assertEqual(resultado.creditados, 3)
+        self.assertEqual(sorted(linha for _, linha, _ in resultado.falhas), [3, 4])
+        carteira = Carteira.objects.get(usuario=self.users[0])
+        self.assertEqual(carteira.fundos, Decimal("6.00"))
+        # Duas linhas da mesma carteira no chunk: saldos anteriores encadeados
+        anteriores = list(
+            Transacao.objects.filter(carteira=carteira).order_by("id").values_list("saldo_anterior_fundos", flat=True)
+        )
+        self.assertEqual(anteriores, [Decimal("0.00"), Decimal("5.00")])
@@ -20,6 +20,8 @@ urlpatterns = [
     # Dashboards
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('empresa/dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
+    path('empresa/exportar/<str:recurso>/', views.exportar_view, name='exportar'),
+    path('empresa/desempenho/', views.desempenho_view, name='desempenho'),
     
     # Funcionalidades do jogador
     path('carteira/', views.carteira_view, name='carteira'),
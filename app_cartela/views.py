@@ -8,10 +8,15 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
-from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from decimal import Decimal, InvalidOperation
+import codecs
+import io
 from .models import Carteira, Transacao
+from .exportacao import exportar
+from .paginacao import paginar_por_cursor
+from .services import creditar_em_lote, ler_creditos_csv
 
 
 def register_view(request):
@@ -250,90 +255,13 @@ def admin_dashboard_view(request):
         messages.error(request, 'Acesso negado. Apenas administradores.')
         return redirect('app_cartela:dashboard')
     
-    from betting.models import (
-        Event, Bet, CartelaInstance, RiskExposureMetrics,
-        CartelaTemplate, MarketSelection, Influencer
-    )
-    from app_cartela.models import Carteira, Transacao
-    from django.contrib.auth.models import User
-    from django.db.models import Sum, Count, Q, Avg
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Estatísticas gerais
-    total_usuarios = User.objects.count()
-    usuarios_hoje = User.objects.filter(
-        date_joined__date=timezone.now().date()
-    ).count()
-    
-    total_eventos = Event.objects.count()
-    eventos_hoje = Event.objects.filter(
-        start_time__date=timezone.now().date()
-    ).count()
-    eventos_ao_vivo = Event.objects.filter(status='LIVE').count()
-    eventos_agendados = Event.objects.filter(status='SCHEDULED').count()
-    
-    # Estatísticas de cartelas
-    total_cartelas = CartelaInstance.objects.count()
-    cartelas_pendentes_count = CartelaInstance.objects.filter(
-        status='APOSTA_PENDENTE'
-    ).count()
-    cartelas_confirmadas = CartelaInstance.objects.filter(
-        status='APOSTA_CONFIRMADA'
-    ).count()
-    total_templates = CartelaTemplate.objects.filter(ativo=True).count()
-    
-    # Estatísticas de seleções/quadrinhos
-    total_selecoes = MarketSelection.objects.count()
-    selecoes_ao_vivo = MarketSelection.objects.filter(is_live=True).count()
-    
-    # Estatísticas de apostas
-    total_apostas = Bet.objects.count()
-    apostas_hoje = Bet.objects.filter(
-        created_at__date=timezone.now().date()
-    ).count()
-    apostas_pendentes = Bet.objects.filter(is_won__isnull=True).count()
-    apostas_ganhas = Bet.objects.filter(is_won=True).count()
-    apostas_perdidas = Bet.objects.filter(is_won=False).count()
-    
-    # Volume financeiro
-    volume_total = Bet.objects.aggregate(
-        total=Sum('stake')
-    )['total'] or 0
-    
-    volume_hoje = Bet.objects.filter(
-        created_at__date=timezone.now().date()
-    ).aggregate(
-        total=Sum('stake')
-    )['total'] or 0
-    
-    payout_total = Bet.objects.filter(is_won=True).aggregate(
-        total=Sum('potential_return')
-    )['total'] or 0
-    
-    # Carteiras
-    total_carteiras = Carteira.objects.count()
-    saldo_total_pontos = Carteira.objects.aggregate(
-        total=Sum('pontos')
-    )['total'] or 0
-    saldo_total_fundos = Carteira.objects.aggregate(
-        total=Sum('fundos')
-    )['total'] or 0
-    
-    # Transações
-    total_transacoes = Transacao.objects.count()
-    transacoes_hoje = Transacao.objects.filter(
-        criado_em__date=timezone.now().date()
-    ).count()
-    
-    # Métricas de risco
-    risco_alto = RiskExposureMetrics.objects.filter(
-        payout_maximo__gt=10000
-    ).count()
-    risco_medio = RiskExposureMetrics.objects.filter(
-        payout_maximo__gt=5000,
-        payout_maximo__lte=10000
-    ).count()
+    from betting.models import Event, Bet, CartelaInstance, CartelaTemplate, Influencer
+    from app_cartela.dashboard import obter_metricas, calcular_metricas_de_hoje
+    
+    # Totais gerais vêm do snapshot periódico (comando atualizar_metricas_dashboard);
+    # os números de hoje são calculados ao vivo por intervalo nas colunas indexadas.
+    metricas, metricas_atualizadas_em = obter_metricas()
+    metricas_hoje = calcular_metricas_de_hoje()
     
     # Influenciadores
     total_influenciadores = Influencer.objects.filter(is_active=True).count()
@@ -357,45 +285,15 @@ def admin_dashboard_view(request):
     ).select_related('user', 'event', 'cartela_template').order_by('-created_at')[:10]
     
     # Templates de cartela
-    templates_ativos = CartelaTemplate.objects.filter(ativo=True).order_by('tipo', 'nome')
+    templates_ativos = list(CartelaTemplate.objects.filter(ativo=True).order_by('tipo', 'nome'))
     
     return render(request, 'app_cartela/admin_dashboard.html', {
         'user': request.user,
-        # Usuários
-        'total_usuarios': total_usuarios,
-        'usuarios_hoje': usuarios_hoje,
-        # Eventos
-        'total_eventos': total_eventos,
-        'eventos_hoje': eventos_hoje,
-        'eventos_ao_vivo': eventos_ao_vivo,
-        'eventos_agendados': eventos_agendados,
-        # Cartelas
-        'total_cartelas': total_cartelas,
-        'cartelas_pendentes_count': cartelas_pendentes_count,
-        'cartelas_confirmadas': cartelas_confirmadas,
-        'total_templates': total_templates,
-        'total_selecoes': total_selecoes,
-        'selecoes_ao_vivo': selecoes_ao_vivo,
-        # Apostas
-        'total_apostas': total_apostas,
-        'apostas_hoje': apostas_hoje,
-        'apostas_pendentes': apostas_pendentes,
-        'apostas_ganhas': apostas_ganhas,
-        'apostas_perdidas': apostas_perdidas,
-        # Financeiro
-        'volume_total': volume_total,
-        'volume_hoje': volume_hoje,
-        'payout_total': payout_total,
-        # Carteiras
-        'total_carteiras': total_carteiras,
-        'saldo_total_pontos': saldo_total_pontos,
-        'saldo_total_fundos': saldo_total_fundos,
-        # Transações
-        'total_transacoes': total_transacoes,
-        'transacoes_hoje': transacoes_hoje,
-        # Risco
-        'risco_alto': risco_alto,
-        'risco_medio': risco_medio,
+        # Totais (snapshot) e números de hoje
+        **metricas,
+        **metricas_hoje,
+        'metricas_atualizadas_em': metricas_atualizadas_em,
+        'total_templates': len(templates_ativos),
         # Influenciadores
         'total_influenciadores': total_influenciadores,
         # Listas
@@ -406,6 +304,45 @@ def admin_dashboard_view(request):
     })
 
 
+@login_required
+def exportar_view(request, recurso):
+    """Exportação em streaming (CSV/JSONL) do extrato ou das apostas (apenas administradores)"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acesso negado. Apenas administradores.')
+        return redirect('app_cartela:dashboard')
+    
+    formato = request.GET.get('formato', 'csv')
+    try:
+        linhas = exportar(
+            recurso,
+            formato=formato,
+            inicio=request.GET.get('inicio'),
+            fim=request.GET.get('fim'),
+            tipo=request.GET.get('tipo'),
+            categoria=request.GET.get('categoria'),
+            usuario=request.GET.get('usuario'),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    content_type = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(linhas, content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{recurso}.{formato}"'
+    return response
+
+
+@login_required
+def desempenho_view(request):
+    """Queries e tempos por view das últimas requisições deste processo (apenas administradores)"""
+    if not request.user.is_staff:
+        messages.error(request, 'Acesso negado. Apenas administradores.')
+        return redirect('app_cartela:dashboard')
+    
+    from .instrumentacao import agregado
+    
+    return JsonResponse({'janela': agregado.janela, 'views': agregado.resumo()})
+
+
 @login_required
 def carteira_view(request):
     """View para visualizar a carteira completa"""
@@ -415,18 +352,26 @@ def carteira_view(request):
     tipo_filter = request.GET.get('tipo', '')
     categoria_filter = request.GET.get('categoria', '')
     
-    # Query das transações
+    # Query das transações (tabela quente + arquivo)
     transacoes = carteira.transacoes.all()
+    arquivadas = carteira.transacoes_arquivadas.all()
     
     if tipo_filter:
         transacoes = transacoes.filter(tipo=tipo_filter)
+        arquivadas = arquivadas.filter(tipo=tipo_filter)
     if categoria_filter:
         transacoes = transacoes.filter(categoria=categoria_filter)
-    
-    # Paginação
-    paginator = Paginator(transacoes, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        arquivadas = arquivadas.filter(categoria=categoria_filter)
+    
+    # Paginação por cursor em (criado_em, id)
+    page_obj = paginar_por_cursor(
+        transacoes,
+        'criado_em',
+        cursor=request.GET.get('cursor'),
+        direcao=request.GET.get('dir', 'next'),
+        por_pagina=20,
+        arquivo=arquivadas,
+    )
     
     return render(request, 'app_cartela/carteira.html', {
         'carteira': carteira,
@@ -461,6 +406,19 @@ def deposito_view(request):
     })
 
 
+def _utf8_valido(arquivo):
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for bloco in arquivo.chunks():
+            decodificador.decode(bloco)
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    finally:
+        arquivo.seek(0)
+    return True
+
+
 @login_required
 def bonus_view(request):
     """View para adicionar bônus (apenas para administradores)"""
@@ -470,6 +428,34 @@ def bonus_view(request):
     
     carteira, created = Carteira.objects.get_or_create(usuario=request.user)
     
+    if request.method == 'POST' and request.POST.get('modo') == 'lote':
+        # Modo lote: CSV colado ou enviado (usuario,categoria,valor,tipo[,descricao])
+        arquivo = request.FILES.get('arquivo')
+        if arquivo:
+            # Confere a codificação antes: os chunks são aplicados à medida que
+            # o arquivo é lido e um erro no meio deixaria o lote pela metade
+            if not _utf8_valido(arquivo):
+                messages.error(request, 'O arquivo CSV deve estar em UTF-8.')
+                return redirect('app_cartela:bonus')
+            linhas = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+        else:
+            linhas = io.StringIO(request.POST.get('linhas', ''))
+        resultado = creditar_em_lote(
+            ler_creditos_csv(linhas, descricao=request.POST.get('descricao', ''))
+        )
+        if resultado.creditados:
+            messages.success(
+                request,
+                f'{resultado.creditados}/{resultado.total} créditos aplicados '
+                f'em {resultado.duracao:.2f}s ({resultado.por_segundo:.0f} créditos/s).'
+            )
+        for chunk, linha, erro in resultado.falhas[:20]:
+            local = f'linha {linha}' if linha else f'chunk {chunk}'
+            messages.error(request, f'{local.capitalize()}: {erro}')
+        if len(resultado.falhas) > 20:
+            messages.error(request, f'... e mais {len(resultado.falhas) - 20} falhas.')
+        return redirect('app_cartela:bonus')
+    
     if request.method == 'POST':
         usuario_id = request.POST.get('usuario_id')
         valor_str = request.POST.get('valor', '').replace(',', '.')
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     Event, MarketSelection, Influencer, CartelaTemplate,
     CartelaTemplateItem, CartelaInstance, CartelaInstanceItem,
-    Bet, OddsSnapshot, RiskExposureMetrics
+    Bet, OddsSnapshot, EventOddsSnapshot, RiskExposureMetrics, IdempotencyKey,
+    SelectionCorrelation, SelectionLiability,
 )
 
 
@@ -22,6 +23,13 @@ class MarketSelectionAdmin(admin.ModelAdmin):
     raw_id_fields = ['event']
 
 
+@admin.register(SelectionCorrelation)
+class SelectionCorrelationAdmin(admin.ModelAdmin):
+    list_display = ['sport', 'selection_type_a', 'selection_type_b', 'factor', 'updated_at']
+    list_filter = ['sport']
+    search_fields = ['selection_type_a', 'selection_type_b']
+
+
 @admin.register(Influencer)
 class InfluencerAdmin(admin.ModelAdmin):
     list_display = ['display_name', 'user', 'is_active']
@@ -46,7 +54,7 @@ class CartelaInstanceAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'event', 'status', 'stake', 'premio_maximo', 'created_at']
     list_filter = ['status', 'cartela_template__tipo', 'created_at']
     search_fields = ['user__username', 'event__team_home', 'event__team_away']
-    raw_id_fields = ['user', 'event', 'cartela_template']
+    raw_id_fields = ['user', 'event', 'cartela_template', 'odds_snapshot']
     readonly_fields = ['created_at', 'locked_at']
 
 
@@ -58,8 +66,8 @@ class CartelaInstanceItemAdmin(admin.ModelAdmin):
 
 @admin.register(Bet)
 class BetAdmin(admin.ModelAdmin):
-    list_display = ['id', 'cartela', 'stake', 'odd_final', 'potential_return', 'is_won', 'created_at']
-    list_filter = ['is_won', 'created_at']
+    list_display = ['id', 'cartela', 'stake', 'categoria', 'odd_final', 'potential_return', 'is_won', 'created_at']
+    list_filter = ['is_won', 'categoria', 'created_at']
     raw_id_fields = ['cartela']
     readonly_fields = ['created_at', 'settled_at']
 
@@ -71,8 +79,32 @@ class OddsSnapshotAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(EventOddsSnapshot)
+class EventOddsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['hash', 'event', 'created_at']
+    raw_id_fields = ['event']
+    readonly_fields = ['hash', 'created_at']
+    exclude = ['selection_ids', 'odds', 'probs']
+
+
 @admin.register(RiskExposureMetrics)
 class RiskExposureMetricsAdmin(admin.ModelAdmin):
-    list_display = ['event', 'cartela_template', 'volume_total', 'payout_maximo', 'updated_at']
+    list_display = ['event', 'cartela_template', 'shard', 'volume_total', 'payout_maximo', 'updated_at']
     list_filter = ['cartela_template__tipo']
     raw_id_fields = ['event', 'cartela_template', 'influencer']
+
+
+@admin.register(SelectionLiability)
+class SelectionLiabilityAdmin(admin.ModelAdmin):
+    list_display = ['market_selection', 'event', 'liability', 'bets', 'updated_at']
+    ordering = ['-liability']
+    raw_id_fields = ['market_selection', 'event']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'scope', 'user', 'response_status', 'created_at']
+    list_filter = ['scope', 'response_status']
+    search_fields = ['key', 'user__username']
+    raw_id_fields = ['user']
+    readonly_fields = ['created_at']
@@ -0,0 +1,37 @@
+"""
+Arquivamento de cartelas encerradas (ver app_cartela/arquivamento.py).
+
+Uma cartela vai para o arquivo quando está SETTLED, EXPIRADA ou CANCELADA e
+foi criada antes do corte. Ela vai junto com os itens, a aposta e os
+snapshots, no mesmo lote. Apostas em aberto nunca são arquivadas. As leituras
+de apostas do usuário e do detalhe da cartela também consultam o arquivo.
+"""
+from app_cartela.arquivamento import arquivar_em_lotes, data_de_corte, mover_linhas
+from .models import (
+    CartelaInstance, CartelaInstanceItem, Bet, OddsSnapshot,
+    CartelaInstanceArchive, CartelaInstanceItemArchive, BetArchive, OddsSnapshotArchive,
+)
+
+
+ARCHIVABLE_STATUSES = ("SETTLED", "EXPIRADA", "CANCELADA")
+
+
+def archive_cartelas(older_than_days=None, batch_size=2000, pause=0.0):
+    cutoff = data_de_corte(older_than_days)
+
+    def select_batch(n):
+        return list(
+            CartelaInstance.objects
+            .filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+            .order_by("id")
+            .values_list("id", flat=True)[:n]
+        )
+
+    def move_batch(ids):
+        # Filhas primeiro: as tabelas quentes têm FK para a cartela
+        mover_linhas(OddsSnapshot, OddsSnapshotArchive, "cartela_id", ids)
+        mover_linhas(CartelaInstanceItem, CartelaInstanceItemArchive, "cartela_instance_id", ids)
+        mover_linhas(Bet, BetArchive, "cartela_id", ids)
+        return mover_linhas(CartelaInstance, CartelaInstanceArchive, "id", ids)
+
+    return arquivar_em_lotes(select_batch, move_batch, batch_size, pause)
@@ -0,0 +1,310 @@
+"""
+Benchmark do caminho quente de apostas (cotação → confirmação) e vizinhos.
+
+Cada cenário tem um `preparar(i)` (fora da medição) e um `executar(arg)`
+(medido). As iterações são distribuídas entre `concorrencia` threads, cada uma
+com sua própria conexão de banco; por chamada são medidos latência e número
+de queries. O resultado é um dict pronto para ser gravado em JSON e comparado
+entre commits (ver comando `benchmark_apostas`).
+
+Cria dados próprios com o prefixo "bench_" e credita as carteiras pelo
+serviço de carteira (com Transacao, como qualquer depósito). Só roda contra o
+banco de teste ou contra o banco dedicado indicado em BENCHMARK_DATABASE —
+ver `verificar_banco`.
+O SQLite serializa escritas — com concorrência > 1 os cenários que escrevem
+acumulam erros "database is locked"; meça concorrência contra o Postgres.
+"""
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app_cartela.services import creditar
+from .models import Event, MarketSelection, CartelaTemplate
+from .services import generate_cartela_quote, confirm_bet
+
+
+CENARIOS = ("quote", "confirm", "debito", "dashboard", "selecoes")
+PREFIXO = "bench_"
+HOST = "localhost"
+SALDO_INICIAL = Decimal("1000000.00")
+
+
+def verificar_banco():
+    """
+    Recusa rodar fora do banco de teste ou do banco dedicado ao benchmark.
+
+    O fixture cria usuários, eventos e transações; contra o banco de produção
+    isso sujaria o ledger. Levanta ImproperlyConfigured se o banco atual não
+    for o de teste (prefixo "test_" ou SQLite em memória) nem o nome
+    configurado em BENCHMARK_DATABASE.
+    """
+    nome = str(connection.settings_dict["NAME"] or "")
+    if settings.BENCHMARK_DATABASE and nome == settings.BENCHMARK_DATABASE:
+        return
+    if nome.startswith(TEST_DATABASE_PREFIX):
+        return
+    if connection.vendor == "sqlite" and connection.creation.is_in_memory_db(nome):
+        return
+    raise ImproperlyConfigured(
+        f'O benchmark não roda no banco "{nome}": use o banco de teste ou '
+        f"defina BENCHMARK_DATABASE com o nome de um banco dedicado."
+    )
+
+
+def _percentil(valores, p):
+    """Percentil por interpolação linear (valores já ordenados)"""
+    if not valores:
+        return None
+    k = (len(valores) - 1) * p / 100
+    baixo = int(k)
+    alto = min(baixo + 1, len(valores) - 1)
+    return valores[baixo] + (valores[alto] - valores[baixo]) * (k - baixo)
+
+
+def _resumo(latencias, queries, erros, duracao):
+    ordenadas = sorted(latencias)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None  # noqa: E731
+    return {
+        "iteracoes": len(latencias),
+        "erros": erros,
+        "duracao_s": round(duracao, 4),
+        "throughput_rps": round(len(latencias) / duracao, 2) if duracao else None,
+        "latencia_ms": {
+            "media": ms(statistics.fmean(ordenadas)) if ordenadas else None,
+            "min": ms(ordenadas[0]) if ordenadas else None,
+            "p50": ms(_percentil(ordenadas, 50)),
+            "p90": ms(_percentil(ordenadas, 90)),
+            "p95": ms(_percentil(ordenadas, 95)),
+            "p99": ms(_percentil(ordenadas, 99)),
+            "max": ms(ordenadas[-1]) if ordenadas else None,
+        },
+        "queries": {
+            "media": round(statistics.fmean(queries), 2) if queries else None,
+            "max": max(queries) if queries else None,
+        },
+    }
+
+
+class Fixture:
+    """Dados próprios do benchmark: usuários, evento, template e seleções"""
+
+    def __init__(self, selecoes=20, itens=3, usuarios=8, seed=42):
+        self.rng = random.Random(seed)
+        self.itens = itens
+        self.staff, _ = User.objects.get_or_create(
+            username=f"{PREFIXO}staff", defaults={"is_staff": True},
+        )
+        self.usuarios = []
+        for i in range(usuarios):
+            user, _ = User.objects.get_or_create(username=f"{PREFIXO}{i}")
+            self._completar_saldo(user.carteira)
+            self.usuarios.append(user)
+        self.event = Event.objects.create(
+            sport="SOCCER",
+            team_home=f"{PREFIXO}casa",
+            team_away=f"{PREFIXO}fora",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        self.template = CartelaTemplate.objects.create(
+            nome=f"{PREFIXO}cartela",
+            tipo="PRE_MATCH",
+            config={"min_items": 1, "max_items": max(itens, 1)},
+        )
+        self.selection_ids = [
+            s.id for s in MarketSelection.objects.bulk_create([
+                MarketSelection(
+                    event=self.event,
+                    selection_type="TOTAL_GOALS_OVER",
+                    params={"line": i + 0.5},
+                    prob_base=0.5,
+                    odd_justa=2.0,
+                    odd_publicada=1.9,
+                )
+                for i in range(max(selecoes, itens))
+            ])
+        ]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _completar_saldo(carteira):
+        """Completa fundos e pontos até SALDO_INICIAL com créditos registrados"""
+        for categoria, tipo, saldo in (
+            ("FUNDOS", "DEPOSITO", carteira.fundos),
+            ("PONTOS", "BONUS", carteira.pontos),
+        ):
+            falta = SALDO_INICIAL - saldo
+            if falta > 0:
+                creditar(carteira.pk, categoria, falta, tipo, descricao="Benchmark")
+        carteira.refresh_from_db(fields=["fundos", "pontos"])
+
+    def usuario(self, i):
+        return self.usuarios[i % len(self.usuarios)]
+
+    def amostra(self):
+        with self._lock:
+            return self.rng.sample(self.selection_ids, self.itens)
+
+    def cotar(self, i):
+        return generate_cartela_quote(
+            user=self.usuario(i),
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=self.amostra(),
+            stake=Decimal("10.00"),
+        )
+
+
+def cenarios(fixture):
+    """nome -> (preparar(i), executar(arg))"""
+    clientes = threading.local()
+
+    def cliente_staff():
+        if not hasattr(clientes, "staff"):
+            clientes.staff = Client(HTTP_HOST=HOST)
+            clientes.staff.force_login(fixture.staff)
+        return clientes.staff
+
+    def cliente_api():
+        if not hasattr(clientes, "api"):
+            clientes.api = APIClient(HTTP_HOST=HOST)
+            clientes.api.force_authenticate(fixture.usuario(0))
+        return clientes.api
+
+    url_dashboard = reverse("app_cartela:admin_dashboard")
+    url_selecoes = reverse(
+        "betting:cartela-selections-by-event-template",
+        kwargs={"event_id": fixture.event.id},
+    )
+
+    def get(cliente, url, **params):
+        resposta = cliente.get(url, params)
+        if resposta.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {resposta.status_code}")
+        return resposta
+
+    return {
+        "quote": (lambda i: i, fixture.cotar),
+        "confirm": (
+            lambda i: (fixture.usuario(i), fixture.cotar(i)[0].id),
+            lambda arg: confirm_bet(*arg),
+        ),
+        "debito": (
+            lambda i: fixture.usuario(i).carteira,
+            lambda carteira: carteira.debitar_fundos(Decimal("0.01"), "Benchmark"),
+        ),
+        "dashboard": (
+            lambda i: cliente_staff(),
+            lambda cliente: get(cliente, url_dashboard),
+        ),
+        "selecoes": (
+            lambda i: cliente_api(),
+            lambda cliente: get(cliente, url_selecoes, template_id=fixture.template.id),
+        ),
+    }
+
+
+def medir(preparar, executar, iteracoes, concorrencia=1, aquecimento=0):
+    """Roda `iteracoes` chamadas em `concorrencia` threads e resume as medições"""
+    for i in range(aquecimento):
+        executar(preparar(-1 - i))
+
+    latencias, queries = [], []
+    erros = []
+    lock = threading.Lock()
+
+    def trabalhador(indices):
+        locais_lat, locais_q, locais_erros = [], [], []
+        try:
+            for i in indices:
+                try:
+                    arg = preparar(i)
+                except Exception as exc:
+                    # Ex.: "database is locked" do SQLite sob concorrência
+                    locais_erros.append(f"preparar: {type(exc).__name__}: {exc}")
+                    continue
+                with CaptureQueriesContext(connection) as ctx:
+                    inicio = time.perf_counter()
+                    try:
+                        executar(arg)
+                    except Exception as exc:
+                        locais_erros.append(f"{type(exc).__name__}: {exc}")
+                        continue
+                    finally:
+                        fim = time.perf_counter()
+                locais_lat.append(fim - inicio)
+                locais_q.append(len(ctx))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+        with lock:
+            latencias.extend(locais_lat)
+            queries.extend(locais_q)
+            erros.extend(locais_erros)
+
+    fatias = [range(t, iteracoes, concorrencia) for t in range(concorrencia)]
+    inicio = time.perf_counter()
+    if concorrencia == 1:
+        trabalhador(fatias[0])
+    else:
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            list(executor.map(trabalhador, fatias))
+    duracao = time.perf_counter() - inicio
+
+    resumo = _resumo(latencias, queries, len(erros), duracao)
+    if erros:
+        resumo["exemplos_de_erro"] = sorted(set(erros))[:5]
+    return resumo
+
+
+def tamanhos():
+    """Tamanho das tabelas principais, para contextualizar os números"""
+    from app_cartela.models import Carteira, Transacao
+    from .models import Bet, CartelaInstance, CartelaInstanceItem
+
+    return {
+        model._meta.db_table: model.objects.count()
+        for model in (
+            User, Carteira, Transacao, Event, MarketSelection,
+            CartelaInstance, CartelaInstanceItem, Bet,
+        )
+    }
+
+
+def executar_benchmark(nomes=CENARIOS, iteracoes=200, concorrencia=1, aquecimento=10,
+                       selecoes=20, itens=3, seed=42):
+    """Prepara o fixture e mede cada cenário; retorna o dict de resultados"""
+    verificar_banco()
+    fixture = Fixture(
+        selecoes=selecoes, itens=itens, usuarios=max(concorrencia, 1), seed=seed,
+    )
+    disponiveis = cenarios(fixture)
+    resultados = {}
+    for nome in nomes:
+        preparar, executar = disponiveis[nome]
+        resultados[nome] = medir(preparar, executar, iteracoes, concorrencia, aquecimento)
+    return {
+        "database": connection.vendor,
+        "parametros": {
+            "iteracoes": iteracoes,
+            "concorrencia": concorrencia,
+            "aquecimento": aquecimento,
+            "selecoes_por_evento": selecoes,
+            "itens_por_cartela": itens,
+            "seed": seed,
+        },
+        "tamanhos": tamanhos(),
+        "cenarios": resultados,
+    }
@@ -0,0 +1,87 @@
+"""
+Expiração de cotações (cartelas APOSTA_PENDENTE além de QUOTE_TTL).
+
+Cada lote trava até batch_size cartelas vencidas (SKIP LOCKED no Postgres, para
+não disputar com confirmações em andamento), marca todas como EXPIRADA com um
+único UPDATE e devolve à exposição de risco o stake/prêmio que a cotação
+somou, agregado por (evento, template, influenciador). Memória e locks ficam
+limitados ao tamanho do lote, qualquer que seja o backlog.
+"""
+import time
+from collections import namedtuple
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from . import risk
+from .models import CartelaInstance
+from .services import QUOTE_TTL, _update_risk_exposure
+
+
+ExpiryResult = namedtuple("ExpiryResult", ["expired", "batches", "duration"])
+
+
+def _stale_quotes(cutoff):
+    return CartelaInstance.objects.filter(status="APOSTA_PENDENTE", created_at__lt=cutoff)
+
+
+def _expire_batch(cutoff, batch_size):
+    """Expira um lote; retorna quantas cartelas foram expiradas"""
+    with transaction.atomic():
+        ids = list(
+            _stale_quotes(cutoff)
+            .select_for_update(skip_locked=True)
+            .order_by("created_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        batch = _stale_quotes(cutoff).filter(id__in=ids)
+        exposure = list(
+            batch
+            .values("event_id", "cartela_template_id", "cartela_template__influencer_id")
+            .annotate(volume=Sum("stake"), payout=Sum("premio_maximo"))
+            .order_by()
+        )
+        expired = batch.update(status="EXPIRADA")
+
+        for row in exposure:
+            _update_risk_exposure(
+                event=row["event_id"],
+                cartela_template=row["cartela_template_id"],
+                influencer=row["cartela_template__influencer_id"],
+                stake=-(row["volume"] or Decimal("0")),
+                potential_return=-(row["payout"] or Decimal("0")),
+            )
+        transaction.on_commit(lambda: _release_risk(exposure))
+    return expired
+
+
+def _release_risk(exposure):
+    for row in exposure:
+        risk.engine.record_quote(
+            row["event_id"],
+            row["cartela_template__influencer_id"],
+            -(row["payout"] or Decimal("0")),
+        )
+
+
+def expire_stale_quotes(batch_size=1000, pause=0.0, max_batches=None):
+    """
+    Expira todas as cotações vencidas em lotes de batch_size, com `pause`
+    segundos entre lotes para não competir com o tráfego.
+    """
+    start = time.monotonic()
+    cutoff = timezone.now() - QUOTE_TTL
+    expired = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = _expire_batch(cutoff, batch_size)
+        if not count:
+            break
+        expired += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return ExpiryResult(expired=expired, batches=batches, duration=time.monotonic() - start)
@@ -0,0 +1,69 @@
+"""
+Idempotência de endpoints de escrita via header Idempotency-Key.
+
+A primeira requisição com uma chave grava a linha de IdempotencyKey e executa
+o handler na mesma transação; a resposta é guardada junto. Retries com a
+mesma chave leem a resposta guardada com um SELECT simples — sem lock em
+cartela ou carteira. Duas requisições simultâneas com a mesma chave colidem
+no índice único: a segunda espera o commit da primeira e devolve a resposta
+dela.
+"""
+import hashlib
+import json
+from django.db import IntegrityError, transaction
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _normalize(body):
+    """Mesma forma que o JSON renderizado pelo DRF (Decimal/datetime como texto)"""
+    return json.loads(json.dumps(body, cls=JSONEncoder))
+
+
+def _request_hash(payload):
+    encoded = json.dumps(payload, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return 422, {"error": "Idempotency-Key já usada com outra requisição."}, False
+    return stored.response_status, stored.response_body, True
+
+
+def run_idempotent(user, scope, key, payload, handler):
+    """
+    Executa handler() -> (status, body) no máximo uma vez por (user, scope, key).
+    Retorna (status, body, replayed). Erros que o handler devolve como status
+    (ex.: validação) também são guardados. Exceções do handler propagam e
+    desfazem a linha da chave: o retry com a mesma chave executa de novo.
+    """
+    request_hash = _request_hash(payload)
+    stored = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+    if stored is not None:
+        return _replay(stored, request_hash)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    scope=scope,
+                    key=key,
+                    request_hash=request_hash,
+                    response_status=0,
+                    response_body={},
+                )
+        except IntegrityError:
+            # Requisição concorrente com a mesma chave já foi concluída
+            return _replay(IdempotencyKey.objects.get(user=user, scope=scope, key=key), request_hash)
+
+        status, body = handler()
+        record.response_status = status
+        record.response_body = _normalize(body)
+        record.save(update_fields=["response_status", "response_body"])
+    return status, record.response_body, False
@@ -0,0 +1,277 @@
+"""
+Ingestão em lote das odds do feed (MarketSelection).
+
+Cada linha do feed identifica a seleção por (event_external_id, selection_type,
+params) e traz prob_base, odd_justa, odd_publicada e is_live. As linhas são
+processadas em chunks, cada um na sua transação:
+
+- external_id -> Event.id vem de um índice em memória, preenchido com uma
+  query por chunk só para os external_ids ainda não vistos;
+- as seleções de cada evento são carregadas uma vez por execução, indexadas
+  por (selection_type, params), com as odds atuais;
+- linhas sem mudança de odds são puladas; as alteradas vão num
+  UPDATE ... FROM (VALUES ...) por lote e as novas num bulk_create.
+
+O QuerySet.bulk_update do Django monta um CASE WHEN por linha e campo e, com
+milhares de seleções, gasta segundos só compilando as expressões; o UPDATE
+com VALUES roda igual no Postgres e no SQLite (3.33+).
+
+Como nada disso dispara signals, o cache de odds dos eventos tocados é
+invalidado e os deltas são publicados no stream ao vivo (live.py) depois do
+commit de cada chunk.
+"""
+import csv
+import itertools
+import json
+import time
+from collections import defaultdict, namedtuple
+from django.db import connection, transaction
+from django.utils import timezone
+from . import live
+from .models import Event, MarketSelection
+from .odds_cache import bump_event_version
+
+
+FEED_FIELDS = (
+    "event_external_id",
+    "selection_type",
+    "params",
+    "prob_base",
+    "odd_justa",
+    "odd_publicada",
+    "is_live",
+)
+
+ODDS_FIELDS = ("prob_base", "odd_justa", "odd_publicada", "is_live")
+
+FEED_FORMATS = ("json", "jsonl", "csv")
+
+# Erros guardados no resultado (o total continua em `rejected`)
+MAX_ERRORS = 100
+
+IngestResult = namedtuple(
+    "IngestResult",
+    ["received", "created", "updated", "unchanged", "rejected", "errors", "duration"],
+)
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "sim", "s"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", "nao", "não", ""}
+
+
+def read_feed(stream, fmt=None):
+    """
+    Gera as linhas (dicts) de um feed em texto: JSON (lista), JSON lines ou CSV
+    com cabeçalho. Sem `fmt`, detecta pelo primeiro caractere. JSON lines e CSV
+    são lidos linha a linha, sem carregar o stream inteiro.
+    """
+    lines = iter(stream)
+    first = next((line for line in lines if line.strip()), None)
+    if first is None:
+        return
+    lines = itertools.chain([first], lines)
+    if fmt is None:
+        fmt = {"[": "json", "{": "jsonl"}.get(first.lstrip()[0], "csv")
+    if fmt == "json":
+        yield from json.loads("".join(lines))
+    elif fmt == "jsonl":
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == "csv":
+        yield from csv.DictReader(lines)
+    else:
+        raise ValueError(f"Formato desconhecido: {fmt}")
+
+
+def params_key(params):
+    """Chave canônica dos params (ordem das chaves não importa)"""
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"is_live inválido: {value!r}")
+
+
+def _parse_row(row):
+    """Retorna ((external_id, selection_type, params_key), params, odds) ou ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError("Linha não é um objeto")
+    missing = [f for f in FEED_FIELDS if f not in row and f not in ("params", "is_live")]
+    if missing:
+        raise ValueError(f"Campos ausentes: {', '.join(missing)}")
+
+    external_id = str(row["event_external_id"]).strip()
+    selection_type = str(row["selection_type"]).strip()
+    if not external_id or not selection_type:
+        raise ValueError("event_external_id e selection_type são obrigatórios")
+    params = row.get("params") or {}
+    if isinstance(params, str):
+        params = json.loads(params)
+    if not isinstance(params, dict):
+        raise ValueError("params deve ser um objeto")
+
+    odds = {
+        "prob_base": float(row["prob_base"]),
+        "odd_justa": float(row["odd_justa"]),
+        "odd_publicada": float(row["odd_publicada"]),
+        "is_live": _parse_bool(row.get("is_live", False)),
+    }
+    if not 0.0 <= odds["prob_base"] <= 1.0:
+        raise ValueError("prob_base fora de [0, 1]")
+    if odds["odd_justa"] < 1.0 or odds["odd_publicada"] < 1.0:
+        raise ValueError("Odds devem ser >= 1.0")
+    return (external_id, selection_type, params_key(params)), params, odds
+
+
+class _Indexes:
+    """Índices em memória de uma execução: eventos por external_id e seleções por evento"""
+
+    def __init__(self):
+        self.events = {}
+        self.selections = {}
+
+    def resolve_events(self, external_ids):
+        unseen = [e for e in external_ids if e not in self.events]
+        if unseen:
+            for external_id, event_id in (
+                Event.objects.filter(external_id__in=unseen).values_list("external_id", "id")
+            ):
+                self.events[external_id] = event_id
+            for external_id in unseen:
+                self.events.setdefault(external_id, None)
+
+    def load_selections(self, event_ids):
+        pending = [e for e in event_ids if e not in self.selections]
+        for event_id in pending:
+            self.selections[event_id] = {}
+        if pending:
+            for row in (
+                MarketSelection.objects.filter(event_id__in=pending)
+                .order_by("id")
+                .values("id", "event_id", "selection_type", "params", *ODDS_FIELDS)
+            ):
+                key = (row["selection_type"], params_key(row["params"]))
+                self.selections[row["event_id"]][key] = row
+
+
+def _update_odds(selections, updated_at):
+    """Grava ODDS_FIELDS + updated_at das seleções, um UPDATE por lote de parâmetros"""
+    if not selections:
+        return
+    qn = connection.ops.quote_name
+    meta = MarketSelection._meta
+    table = qn(meta.db_table)
+    columns = [meta.get_field(f).column for f in ODDS_FIELDS]
+    assignments = ", ".join(f"{qn(c)} = v.column{i}" for i, c in enumerate(columns, start=2))
+    updated_at = meta.get_field("updated_at").get_db_prep_value(updated_at, connection)
+    row_placeholders = "(" + ", ".join(["%s"] * (len(columns) + 1)) + ")"
+    batch_size = connection.ops.bulk_batch_size(["id", *ODDS_FIELDS], selections)
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(selections), batch_size):
+            batch = selections[start:start + batch_size]
+            params = [updated_at]
+            for selection in batch:
+                params.append(selection.id)
+                params.extend(getattr(selection, f) for f in ODDS_FIELDS)
+            cursor.execute(
+                f"UPDATE {table} SET {assignments}, {qn(meta.get_field('updated_at').column)} = %s "
+                f"FROM (VALUES {', '.join([row_placeholders] * len(batch))}) AS v "
+                f"WHERE {table}.{qn(meta.pk.column)} = v.column1",
+                params,
+            )
+
+
+def _ingest_chunk(chunk, indexes, counts, errors):
+    parsed = {}
+    for number, row in chunk:
+        try:
+            key, params, odds = _parse_row(row)
+        except (ValueError, TypeError) as exc:
+            counts["rejected"] += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append((number, str(exc)))
+            continue
+        # Mesma seleção repetida no chunk: vale a última linha
+        parsed[key] = (number, params, odds)
+
+    indexes.resolve_events({key[0] for key in parsed})
+    indexes.load_selections({indexes.events[key[0]] for key in parsed} - {None})
+
+    now = timezone.now()
+    to_update = []
+    to_create = []
+    for (external_id, selection_type, _), (number, params, odds) in parsed.items():
+        event_id = indexes.events[external_id]
+        if event_id is None:
+            counts["rejected"] += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append((number, f"Evento não encontrado: {external_id}"))
+            continue
+        current = indexes.selections[event_id].get((selection_type, params_key(params)))
+        if current is None:
+            to_create.append(MarketSelection(
+                event_id=event_id, selection_type=selection_type, params=params, **odds,
+            ))
+        elif all(current[f] == odds[f] for f in ODDS_FIELDS):
+            counts["unchanged"] += 1
+        else:
+            to_update.append(MarketSelection(
+                id=current["id"], event_id=event_id, selection_type=selection_type,
+                params=current["params"], updated_at=now, **odds,
+            ))
+
+    if not to_update and not to_create:
+        return
+
+    with transaction.atomic():
+        _update_odds(to_update, now)
+        MarketSelection.objects.bulk_create(to_create)
+
+        deltas = defaultdict(list)
+        for selection in itertools.chain(to_update, to_create):
+            deltas[selection.event_id].append(live.selection_delta(selection))
+
+        def after_commit():
+            for event_id, selections in deltas.items():
+                bump_event_version(event_id)
+                live.publish(event_id, selections)
+
+        transaction.on_commit(after_commit)
+
+    # Índice só é atualizado depois do commit do chunk
+    for selection in itertools.chain(to_update, to_create):
+        key = (selection.selection_type, params_key(selection.params))
+        row = {"id": selection.id, "params": selection.params}
+        row.update({f: getattr(selection, f) for f in ODDS_FIELDS})
+        indexes.selections[selection.event_id][key] = row
+    counts["updated"] += len(to_update)
+    counts["created"] += len(to_create)
+
+
+def ingest_odds(rows, chunk_size=2000):
+    """
+    Aplica as linhas do feed (iterável de dicts, ver read_feed). Linhas
+    inválidas ou de eventos desconhecidos são rejeitadas sem abortar o resto.
+    """
+    start = time.monotonic()
+    indexes = _Indexes()
+    counts = {"received": 0, "created": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+    errors = []
+
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            break
+        counts["received"] += len(chunk)
+        _ingest_chunk(chunk, indexes, counts, errors)
+
+    return IngestResult(errors=errors, duration=time.monotonic() - start, **counts)
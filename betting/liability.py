@@ -0,0 +1,101 @@
+"""
+Passivo por seleção (SelectionLiability): quanto pagamos se a seleção X bater.
+
+Cada linha soma o potential_return das apostas confirmadas e ainda não
+liquidadas que contêm a seleção. A confirmação incrementa as linhas das
+seleções da cartela com um único INSERT ... ON CONFLICT DO UPDATE, na mesma
+transação da Bet (mesmo padrão de _update_risk_exposure). A liquidação do
+evento apaga as linhas dele.
+
+A leitura dos top-N de um evento usa o índice (event, -liability) e não faz
+join de CartelaInstanceItem com Bet. rebuild() recalcula o índice a partir das
+apostas, para corrigir divergências (ex.: apostas alteradas fora do fluxo).
+"""
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import CartelaInstanceItem, SelectionLiability
+
+
+def record_bet(event_id, selection_ids, potential_return):
+    """Soma o prêmio da aposta ao passivo de cada seleção da cartela"""
+    selection_ids = sorted(set(selection_ids))  # ordem fixa de locks entre confirmações
+    if not selection_ids:
+        return
+    qn = connection.ops.quote_name
+    table = qn(SelectionLiability._meta.db_table)
+    now = timezone.now()
+    rows = ", ".join(["(%s, %s, %s, 1, %s)"] * len(selection_ids))
+    params = []
+    for selection_id in selection_ids:
+        params.extend([selection_id, event_id, Decimal(str(potential_return)), now])
+    sql = f"""
+        INSERT INTO {table} (
+            {qn('market_selection_id')}, {qn('event_id')}, {qn('liability')}, {qn('bets')}, {qn('updated_at')}
+        )
+        VALUES {rows}
+        ON CONFLICT ({qn('market_selection_id')})
+        DO UPDATE SET
+            {qn('liability')} = {table}.{qn('liability')} + EXCLUDED.{qn('liability')},
+            {qn('bets')} = {table}.{qn('bets')} + EXCLUDED.{qn('bets')},
+            {qn('updated_at')} = EXCLUDED.{qn('updated_at')}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def release_event(event_id):
+    """Evento liquidado: nenhuma aposta dele segue em aberto"""
+    return SelectionLiability.objects.filter(event_id=event_id).delete()[0]
+
+
+def top_selections(event_id, limit=10):
+    """As `limit` seleções de maior passivo do evento"""
+    return (
+        SelectionLiability.objects
+        .filter(event_id=event_id, liability__gt=0)
+        .select_related("market_selection")
+        .order_by("-liability")[:limit]
+    )
+
+
+def _open_bet_items(event_id=None):
+    items = CartelaInstanceItem.objects.filter(
+        cartela_instance__status="APOSTA_CONFIRMADA",
+        cartela_instance__bet__is_won__isnull=True,
+    )
+    if event_id is not None:
+        items = items.filter(cartela_instance__event_id=event_id)
+    return (
+        items
+        .values("market_selection_id", "cartela_instance__event_id")
+        .annotate(payout=Sum("cartela_instance__bet__potential_return"), bets=Count("cartela_instance__bet"))
+        .order_by()
+    )
+
+
+def rebuild(event_id=None, batch_size=2000):
+    """
+    Recalcula o passivo a partir das apostas em aberto (de um evento ou de
+    todos). Apaga e regrava as linhas na mesma transação. Retorna quantas
+    seleções ficaram com passivo.
+    """
+    with transaction.atomic():
+        existing = SelectionLiability.objects.all()
+        if event_id is not None:
+            existing = existing.filter(event_id=event_id)
+        existing.delete()
+        now = timezone.now()
+        rows = [
+            SelectionLiability(
+                market_selection_id=row["market_selection_id"],
+                event_id=row["cartela_instance__event_id"],
+                liability=row["payout"] or Decimal("0"),
+                bets=row["bets"],
+                updated_at=now,
+            )
+            for row in _open_bet_items(event_id).iterator(chunk_size=batch_size)
+        ]
+        SelectionLiability.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
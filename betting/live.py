@@ -0,0 +1,281 @@
+"""
+Odds ao vivo: pub/sub em memória para o stream SSE de seleções.
+
+Depois do commit, cada save/delete de MarketSelection publica um delta com os
+campos de odds_cache.SELECTION_FIELDS (ver signals.py). O hub do processo
+entrega o delta às assinaturas do evento. Cada assinatura tem uma fila no event
+loop em que foi aberta. Publicar é thread-safe, porque o signal roda em threads
+síncronas (admin, comandos, views DRF).
+
+Cada worker tem o seu hub. Com vários workers, configure ODDS_STREAM_BROKER
+(host:porta do comando broker_odds). A publicação passa a ir para o broker, que
+repassa a linha a todos os workers conectados, inclusive ao que publicou. O
+envio ao broker roda numa thread de fundo: publish() só enfileira e não
+segura a requisição (on_commit de apostas e ingestão) se o broker cair; nesse
+caso a thread entrega localmente. Sem broker a entrega é só local. O broker é um substituto simples de um pub/sub
+externo (Redis, NOTIFY do Postgres) com o mesmo papel.
+"""
+import asyncio
+import json
+import logging
+import queue
+import socket
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .odds_cache import SELECTION_FIELDS
+
+
+logger = logging.getLogger(__name__)
+
+# Marcador na fila: o cliente perdeu deltas e precisa de um snapshot novo
+RESYNC = object()
+
+# Bytes pendentes para um worker antes de o broker desconectá-lo
+BROKER_MAX_BUFFER = 4 * 1024 * 1024
+
+# Publicações aguardando envio ao broker; acima disso a entrega é só local
+PUBLISH_QUEUE_SIZE = 10000
+
+
+def selection_delta(selection, removed=False):
+    """Delta publicado para uma seleção: os campos da API e, se apagada, removed"""
+    delta = {field: getattr(selection, field) for field in SELECTION_FIELDS}
+    if removed:
+        delta["removed"] = True
+    return delta
+
+
+class Subscription:
+    """Fila de deltas de um evento para uma conexão; criar dentro do event loop"""
+
+    def __init__(self, event_id, queue_size):
+        self.event_id = event_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def _deliver(self, selections):
+        # Roda no loop da assinatura (call_soon_threadsafe)
+        try:
+            self.queue.put_nowait(selections)
+        except asyncio.QueueFull:
+            # Cliente lento: descarta o que está pendente e pede um snapshot
+            self._resync()
+
+    def _resync(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+
+    async def receive(self, timeout=None):
+        """
+        Próximo delta. Mensagens já enfileiradas são combinadas por id da
+        seleção (vale a mais recente). Retorna RESYNC se houve descarte.
+        """
+        message = await asyncio.wait_for(self.queue.get(), timeout)
+        if message is RESYNC:
+            return RESYNC
+        selections = {s["id"]: s for s in message}
+        while not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message is RESYNC:
+                return RESYNC
+            selections.update((s["id"], s) for s in message)
+        return list(selections.values())
+
+
+class OddsHub:
+    """Assinaturas por evento deste processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, event_id):
+        subscription = Subscription(event_id, settings.ODDS_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions[event_id].add(subscription)
+        _ensure_broker_listener()
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._subscriptions.get(event_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[event_id]
+
+    def subscriber_count(self, event_id=None):
+        with self._lock:
+            if event_id is not None:
+                return len(self._subscriptions.get(event_id, ()))
+            return sum(len(s) for s in self._subscriptions.values())
+
+    def publish_local(self, event_id, selections):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, selections)
+            except RuntimeError:
+                # Loop encerrado sem sair do subscribe(); a conexão já era
+                pass
+
+
+hub = OddsHub()
+
+
+def _broker_address():
+    address = settings.ODDS_STREAM_BROKER
+    if not address:
+        return None
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _encode(event_id, selections):
+    return (json.dumps({"event_id": event_id, "selections": selections}, cls=DjangoJSONEncoder) + "\n").encode()
+
+
+class _BrokerPublisher:
+    """Fila e thread de envio ao broker, compartilhadas pelas threads do processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(PUBLISH_QUEUE_SIZE)
+        self._thread = None
+        self._sock = None
+
+    def submit(self, address, event_id, selections):
+        """Enfileira sem bloquear; False se a fila está cheia"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="odds-broker-publisher", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((address, event_id, selections))
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            address, event_id, selections = self._queue.get()
+            try:
+                if not self.send(address, _encode(event_id, selections)):
+                    logger.warning("Broker de odds %s:%s indisponível; entrega só local", *address)
+                    hub.publish_local(event_id, selections)
+            except Exception:
+                logger.exception("Falha ao publicar odds do evento %s", event_id)
+            finally:
+                self._queue.task_done()
+
+    def send(self, address, line):
+        for _ in range(2):  # uma reconexão se o broker reiniciou
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(address, timeout=1)
+                    self._sock.sendall(b"publish\n")
+                self._sock.sendall(line)
+                return True
+            except OSError:
+                self._close()
+        return False
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+_publisher = _BrokerPublisher()
+
+
+def publish(event_id, selections):
+    """Publica deltas de seleções do evento (lista de dicts de selection_delta)"""
+    if not selections:
+        return
+    address = _broker_address()
+    if address is not None:
+        if _publisher.submit(address, event_id, selections):
+            return
+        logger.warning("Fila de publicação no broker de odds cheia; entrega só local")
+    hub.publish_local(event_id, selections)
+
+
+_listener = None
+
+
+def _ensure_broker_listener():
+    """Um ouvinte do broker por processo, no loop da primeira assinatura"""
+    global _listener
+    if _broker_address() is None:
+        return
+    if _listener is not None and not _listener.done() and not _listener.get_loop().is_closed():
+        return
+    _listener = asyncio.get_running_loop().create_task(_listen_broker())
+
+
+async def _listen_broker():
+    while True:
+        address = _broker_address()
+        try:
+            reader, writer = await asyncio.open_connection(*address)
+            writer.write(b"subscribe\n")
+            await writer.drain()
+            async for line in reader:
+                message = json.loads(line)
+                hub.publish_local(message["event_id"], message["selections"])
+        except (OSError, ValueError) as exc:
+            logger.warning("Ouvinte do broker de odds: %s", exc)
+        # Conexão caiu: os clientes podem ter perdido deltas
+        with hub._lock:
+            subscriptions = [s for subs in hub._subscriptions.values() for s in subs]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._resync)
+            except RuntimeError:
+                pass
+        await asyncio.sleep(1)
+
+
+async def serve_broker(host, port, on_ready=None):
+    """
+    Broker de linhas JSON. A primeira linha de cada conexão diz o papel:
+    "subscribe" (worker que recebe tudo) ou "publish" (envia deltas).
+    Workers que não acompanham o ritmo são desconectados e ressincronizam.
+    """
+    subscribers = set()
+
+    async def handle(reader, writer):
+        role = (await reader.readline()).strip()
+        try:
+            if role == b"subscribe":
+                subscribers.add(writer)
+                await reader.read()  # até o worker desconectar
+            elif role == b"publish":
+                async for line in reader:
+                    for subscriber in list(subscribers):
+                        if subscriber.transport.get_write_buffer_size() > BROKER_MAX_BUFFER:
+                            subscribers.discard(subscriber)
+                            subscriber.close()
+                            continue
+                        subscriber.write(line)
+        except ConnectionError:
+            pass
+        finally:
+            subscribers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if on_ready is not None:
+        on_ready(server)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,104 @@
+import json
+import subprocess
+from django.conf import settings
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from betting.benchmark import CENARIOS, executar_benchmark, verificar_banco
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede latência (p50/p95/p99), queries e throughput do caminho de apostas '
+        '(quote, confirm, débito de carteira, dashboard admin, lista de seleções) '
+        'e grava o resultado em JSON para comparar entre commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cenarios',
+            default=','.join(CENARIOS),
+            help=f'Cenários separados por vírgula ({", ".join(CENARIOS)})'
+        )
+        parser.add_argument('--iteracoes', type=int, default=200, help='Chamadas medidas por cenário')
+        parser.add_argument('--concorrencia', type=int, default=1, help='Threads simultâneas')
+        parser.add_argument('--aquecimento', type=int, default=10, help='Chamadas não medidas antes de cada cenário')
+        parser.add_argument('--selecoes', type=int, default=20, help='Seleções do evento de benchmark')
+        parser.add_argument('--itens', type=int, default=3, help='Itens por cartela cotada')
+        parser.add_argument('--seed', type=int, default=42, help='Semente do gerador')
+        parser.add_argument('--saida', help='Arquivo JSON de resultado (padrão: só imprime o resumo)')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar o p95')
+        # Carga de fundo opcional, repassada ao create_test_data
+        parser.add_argument('--usuarios', type=int, default=0, help='Carga: usuários a gerar antes de medir')
+        parser.add_argument('--eventos', type=int, default=0, help='Carga: eventos a gerar antes de medir')
+        parser.add_argument('--cartelas', type=int, default=0, help='Carga: cartelas a gerar antes de medir')
+        parser.add_argument('--transacoes', type=int, default=0, help='Carga: transações a gerar antes de medir')
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        nomes = [n.strip() for n in options['cenarios'].split(',') if n.strip()]
+        invalidos = set(nomes) - set(CENARIOS)
+        if invalidos:
+            raise CommandError(f'Cenários inválidos: {", ".join(sorted(invalidos))}')
+        if options['iteracoes'] < 1 or options['concorrencia'] < 1:
+            raise CommandError('--iteracoes e --concorrencia devem ser positivos')
+        try:
+            verificar_banco()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        carga = {k: options[k] for k in ('usuarios', 'eventos', 'cartelas', 'transacoes')}
+        if any(carga.values()):
+            call_command('create_test_data', seed=options['seed'], stdout=self.stdout, **carga)
+
+        resultado = {
+            'commit': self._commit(),
+            'executado_em': timezone.now().isoformat(),
+            **executar_benchmark(
+                nomes,
+                iteracoes=options['iteracoes'],
+                concorrencia=options['concorrencia'],
+                aquecimento=options['aquecimento'],
+                selecoes=options['selecoes'],
+                itens=options['itens'],
+                seed=options['seed'],
+            ),
+        }
+
+        base = {}
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                base = json.load(f).get('cenarios', {})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n📊 Benchmark ({resultado["database"]}, commit {resultado["commit"] or "?"}, '
+            f'{options["iteracoes"]} iterações, concorrência {options["concorrencia"]})'
+        ))
+        for nome, r in resultado['cenarios'].items():
+            lat = r['latencia_ms']
+            linha = (
+                f'   • {nome:<10} p50 {lat["p50"]}ms  p95 {lat["p95"]}ms  p99 {lat["p99"]}ms  '
+                f'{r["throughput_rps"]} req/s  {r["queries"]["media"]} queries'
+            )
+            anterior = base.get(nome, {}).get('latencia_ms', {}).get('p95')
+            if anterior and lat['p95'] is not None:
+                linha += f'  (p95 {(lat["p95"] - anterior) / anterior:+.1%} vs base)'
+            self.stdout.write(linha)
+            if r['erros']:
+                self.stdout.write(self.style.ERROR(
+                    f'     ❌ {r["erros"]} erros: {"; ".join(r.get("exemplos_de_erro", []))}'
+                ))
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'✅ Resultado gravado em {options["saida"]}'))
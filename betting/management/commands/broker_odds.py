@@ -0,0 +1,22 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from betting.live import serve_broker
+
+
+class Command(BaseCommand):
+    help = 'Broker local que repassa os deltas de odds entre os workers ASGI (ODDS_STREAM_BROKER)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Endereço de escuta')
+        parser.add_argument('--porta', type=int, default=8765, help='Porta de escuta')
+
+    def handle(self, *args, **options):
+        def pronto(server):
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Broker de odds escutando em {options["host"]}:{options["porta"]}'
+            ))
+
+        try:
+            asyncio.run(serve_broker(options['host'], options['porta'], on_ready=pronto))
+        except KeyboardInterrupt:
+            self.stdout.write('🛑 Broker encerrado')
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from betting.expiry import expire_stale_quotes
+
+
+class Command(BaseCommand):
+    help = 'Expira cartelas em APOSTA_PENDENTE com cotação vencida e devolve a exposição de risco'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cartelas por lote (um UPDATE por lote)')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de pausa entre lotes')
+        parser.add_argument(
+            '--intervalo',
+            type=int,
+            default=0,
+            help='Se informado, roda em loop varrendo a cada N segundos'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            resultado = expire_stale_quotes(
+                batch_size=options['batch_size'],
+                pause=options['pausa'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {resultado.expired} cartelas expiradas em {resultado.batches} lotes '
+                f'({resultado.duration:.2f}s)'
+            ))
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
@@ -0,0 +1,39 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from betting.ingestion import FEED_FORMATS, ingest_odds, read_feed
+
+
+class Command(BaseCommand):
+    help = 'Importa odds do feed (JSON, JSON lines ou CSV) e atualiza as seleções em lote'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs='?', default='-', help='Arquivo do feed ("-" = stdin)')
+        parser.add_argument(
+            '--formato',
+            choices=FEED_FORMATS,
+            help='Formato do feed (padrão: detecta pelo primeiro caractere)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Linhas por transação')
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo']
+        try:
+            stream = sys.stdin if arquivo == '-' else open(arquivo, encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {arquivo}: {e}')
+
+        try:
+            resultado = ingest_odds(read_feed(stream, options['formato']), chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(f'Feed inválido: {e}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for numero, erro in resultado.errors:
+            self.stdout.write(self.style.WARNING(f'⚠️  Linha {numero}: {erro}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.received} linhas em {resultado.duration:.2f}s: '
+            f'{resultado.updated} atualizadas, {resultado.created} novas, '
+            f'{resultado.unchanged} sem mudança, {resultado.rejected} rejeitadas'
+        ))
@@ -0,0 +1,50 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from betting.settlement import settle_event
+
+
+class Command(BaseCommand):
+    help = 'Liquida as apostas confirmadas de um evento a partir das seleções vencedoras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int, help='ID do evento')
+        parser.add_argument(
+            '--vencedoras',
+            default='',
+            help='IDs das seleções vencedoras separados por vírgula (as demais perdem)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Apostas vencedoras por transação')
+        parser.add_argument(
+            '--categoria',
+            choices=['FUNDOS', 'PONTOS'],
+            default=None,
+            help='Força a categoria creditada com os ganhos (padrão: a categoria debitada em cada aposta)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            vencedoras = [int(v) for v in options['vencedoras'].split(',') if v.strip()]
+        except ValueError:
+            raise CommandError('--vencedoras deve conter apenas IDs numéricos')
+
+        try:
+            resultado = settle_event(
+                options['event_id'],
+                vencedoras,
+                chunk_size=options['chunk_size'],
+                categoria=options['categoria'],
+            )
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        for aposta_id, erro in resultado.failures:
+            self.stdout.write(self.style.ERROR(f'❌ Aposta #{aposta_id} não liquidada: {erro}'))
+        if resultado.failures:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ Evento {options["event_id"]} segue aberto: reexecute para liquidar as apostas que falharam'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Evento {options["event_id"]} liquidado em {resultado.duration:.2f}s: '
+            f'{resultado.won} ganhas, {resultado.lost} perdidas, R$ {resultado.paid_out:.2f} pagos'
+        ))
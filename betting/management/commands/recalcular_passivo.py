@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from betting.liability import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o passivo por seleção (SelectionLiability) a partir das apostas em aberto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int, default=None, help='ID do evento (padrão: todos)')
+
+    def handle(self, *args, **options):
+        total = rebuild(options['evento'])
+        escopo = f'do evento {options["evento"]}' if options['evento'] else 'de todos os eventos'
+        self.stdout.write(self.style.SUCCESS(f'✅ Passivo {escopo} recalculado: {total} seleções'))
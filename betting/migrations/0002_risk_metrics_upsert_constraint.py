@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:29
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='riskexposuremetrics',
+            constraint=models.UniqueConstraint(models.F('event'), models.F('cartela_template'), django.db.models.functions.comparison.Coalesce('influencer', 0), name='risk_metrics_upsert_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:29
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0002_risk_metrics_upsert_constraint'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='riskexposuremetrics',
+            name='risk_metrics_upsert_uniq',
+        ),
+        migrations.AlterUniqueTogether(
+            name='riskexposuremetrics',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='riskexposuremetrics',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Sub-linha do contador; a exposição real é a soma dos shards', verbose_name='Shard'),
+        ),
+        migrations.AddConstraint(
+            model_name='riskexposuremetrics',
+            constraint=models.UniqueConstraint(models.F('event'), models.F('cartela_template'), django.db.models.functions.comparison.Coalesce('influencer', 0), models.F('shard'), name='risk_metrics_upsert_uniq'),
+        ),
+    ]
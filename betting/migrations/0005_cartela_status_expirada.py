@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0004_bet_categoria_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartelainstance',
+            name='status',
+            field=models.CharField(choices=[('CRIADA', 'Criada'), ('APOSTA_PENDENTE', 'Aposta pendente'), ('APOSTA_CONFIRMADA', 'Aposta confirmada'), ('SETTLED', 'Liquidada'), ('CANCELADA', 'Cancelada'), ('EXPIRADA', 'Expirada')], default='CRIADA', max_length=32, verbose_name='Status'),
+        ),
+    ]
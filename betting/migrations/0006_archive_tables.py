@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0005_cartela_status_expirada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartelaInstanceArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('CRIADA', 'Criada'), ('APOSTA_PENDENTE', 'Aposta pendente'), ('APOSTA_CONFIRMADA', 'Aposta confirmada'), ('SETTLED', 'Liquidada'), ('CANCELADA', 'Cancelada'), ('EXPIRADA', 'Expirada')], max_length=32, verbose_name='Status')),
+                ('odd_final', models.FloatField(blank=True, null=True, verbose_name='Odd Final')),
+                ('premio_maximo', models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True, verbose_name='Prêmio Máximo')),
+                ('stake', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Valor Apostado')),
+                ('snapshot_data', models.JSONField(blank=True, default=dict, verbose_name='Dados do Snapshot')),
+                ('created_at', models.DateTimeField(verbose_name='Criado em')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Travado em')),
+                ('cartela_template', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_instances', to='betting.cartelatemplate', verbose_name='Template')),
+                ('event', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_cartelas', to='betting.event', verbose_name='Evento')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_cartelas', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Cartela Arquivada',
+                'verbose_name_plural': 'Cartelas Arquivadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BetArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('stake', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Valor Apostado')),
+                ('categoria', models.CharField(choices=[('FUNDOS', 'Fundos'), ('PONTOS', 'Pontos')], max_length=10, verbose_name='Categoria')),
+                ('odd_final', models.FloatField(verbose_name='Odd Final')),
+                ('potential_return', models.DecimalField(decimal_places=2, max_digits=18, verbose_name='Retorno Potencial')),
+                ('is_won', models.BooleanField(blank=True, null=True, verbose_name='Ganhou?')),
+                ('settled_at', models.DateTimeField(blank=True, null=True, verbose_name='Liquidado em')),
+                ('created_at', models.DateTimeField(verbose_name='Criado em')),
+                ('cartela', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='bet', to='betting.cartelainstancearchive', verbose_name='Cartela')),
+            ],
+            options={
+                'verbose_name': 'Aposta Arquivada',
+                'verbose_name_plural': 'Apostas Arquivadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CartelaInstanceItemArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('odd_usada', models.FloatField(verbose_name='Odd Usada')),
+                ('cartela_instance', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='items', to='betting.cartelainstancearchive', verbose_name='Cartela')),
+                ('market_selection', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_cartela_items', to='betting.marketselection', verbose_name='Seleção')),
+            ],
+            options={
+                'verbose_name': 'Item de Cartela Arquivado',
+                'verbose_name_plural': 'Itens de Cartela Arquivados',
+            },
+        ),
+        migrations.CreateModel(
+            name='OddsSnapshotArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data', models.JSONField(verbose_name='Dados')),
+                ('created_at', models.DateTimeField(verbose_name='Criado em')),
+                ('cartela', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='snapshots', to='betting.cartelainstancearchive', verbose_name='Cartela')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Odds Arquivado',
+                'verbose_name_plural': 'Snapshots de Odds Arquivados',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cartelainstancearchive',
+            index=models.Index(fields=['user', '-created_at'], name='betting_car_user_id_4ad03a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='betarchive',
+            index=models.Index(fields=['-created_at'], name='betting_bet_created_03d985_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0006_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['external_id'], name='betting_eve_externa_5519f2_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0007_event_external_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventOddsSnapshot',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Hash')),
+                ('selection_ids', models.BinaryField(verbose_name='IDs das Seleções (int64)')),
+                ('odds', models.BinaryField(verbose_name='Odds Publicadas (float64)')),
+                ('probs', models.BinaryField(verbose_name='Probabilidades Base (float64)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='odds_snapshots', to='betting.event', verbose_name='Evento')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Odds do Evento',
+                'verbose_name_plural': 'Snapshots de Odds do Evento',
+            },
+        ),
+        migrations.AddField(
+            model_name='cartelainstance',
+            name='odds_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cartelas', to='betting.eventoddssnapshot', verbose_name='Snapshot de Odds'),
+        ),
+        migrations.AddField(
+            model_name='cartelainstancearchive',
+            name='odds_snapshot',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_cartelas', to='betting.eventoddssnapshot', verbose_name='Snapshot de Odds'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoddssnapshot',
+            index=models.Index(fields=['event', '-created_at'], name='betting_eve_event_i_2a0f76_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:57
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0008_event_odds_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SelectionCorrelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sport', models.CharField(choices=[('SOCCER', 'Futebol'), ('BASKETBALL', 'Basquete'), ('TENNIS', 'Tênis'), ('VOLLEYBALL', 'Vôlei')], max_length=32, verbose_name='Esporte')),
+                ('selection_type_a', models.CharField(max_length=64, verbose_name='Tipo de Seleção A')),
+                ('selection_type_b', models.CharField(max_length=64, verbose_name='Tipo de Seleção B')),
+                ('factor', models.FloatField(default=1.0, help_text='P(A e B) / (P(A) * P(B)); 1.0 = independentes', validators=[django.core.validators.MinValueValidator(0.0)], verbose_name='Fator')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Correlação de Seleções',
+                'verbose_name_plural': 'Correlações de Seleções',
+                'ordering': ['sport', 'selection_type_a', 'selection_type_b'],
+                'constraints': [models.UniqueConstraint(fields=('sport', 'selection_type_a', 'selection_type_b'), name='selection_correlation_uniq')],
+            },
+        ),
+    ]
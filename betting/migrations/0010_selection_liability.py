@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('betting', '0009_selection_correlation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SelectionLiability',
+            fields=[
+                ('market_selection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='liability', serialize=False, to='betting.marketselection', verbose_name='Seleção')),
+                ('liability', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Passivo')),
+                ('bets', models.PositiveIntegerField(default=0, verbose_name='Apostas')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selection_liabilities', to='betting.event', verbose_name='Evento')),
+            ],
+            options={
+                'verbose_name': 'Passivo por Seleção',
+                'verbose_name_plural': 'Passivos por Seleção',
+                'indexes': [models.Index(fields=['event', '-liability'], name='selection_liability_top_idx')],
+            },
+        ),
+    ]
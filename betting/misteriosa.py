@@ -0,0 +1,240 @@
+"""
+Gerador de cartelas MISTERIOSA: as K combinações de seleções de um evento com
+odd mais próxima do alvo dentro de uma faixa [min_odd, max_odd].
+
+A busca é um branch-and-bound em log P (a odd final é 1 / (P * (1 + margem)),
+ver pricing.py), sobre o EventPricing do evento: log p_i, tipos e matriz de
+correlações já montados e em cache por versão de odds. Cada nó da busca é uma
+cartela parcial. O nó é podado quando:
+
+- nenhuma extensão até o tamanho máximo cabe na faixa de log P alvo (limites
+  por seleção: log p_i mais a maior e a menor correlação entre os tipos);
+- a melhor distância ao alvo que as extensões podem atingir não bate a pior
+  das K melhores já encontradas.
+
+Seleções conflitantes nunca entram juntas: mesmo selection_type além do
+limite do template (max_per_type, padrão 1, ou max_items do item) e pares com
+fator de correlação zero (mutuamente exclusivos). Só entram seleções que as
+regras do template permitem (template_rules.py).
+
+A busca para ao esgotar MISTERIOSA_TIME_BUDGET_MS e devolve o melhor achado
+até ali (complete=False).
+"""
+import heapq
+import math
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from . import odds_cache, pricing, template_rules
+
+
+# Relógio consultado a cada N candidatos avaliados (inclusive os podados):
+# o estouro do orçamento de tempo fica limitado ao custo de N avaliações
+CLOCK_EVERY = 512
+
+DEFAULT_MIN_ITEMS = 2
+DEFAULT_MAX_ITEMS = 4
+
+MysteryResult = namedtuple("MysteryResult", ["cartelas", "complete", "explored", "duration"])
+
+
+def _as_list(values):
+    return values.tolist() if hasattr(values, "tolist") else values
+
+
+class _Search:
+    def __init__(self, candidates, log_prob, type_of, lift, type_limits, sizes, target, k, deadline):
+        # Mais prováveis primeiro: completam a faixa alvo com menos seleções
+        self.order = sorted(candidates, key=lambda p: -log_prob[p])
+        self.log_prob = log_prob
+        self.type_of = type_of
+        self.lift = lift
+        self.type_limits = type_limits
+        self.min_size, self.max_size = sizes
+        self.low, self.high, self.center = target
+        self.k = k
+        self.deadline = deadline
+        self.best = []  # heap de (-distância, posições)
+        self.explored = 0
+        self.steps = 0
+        self.timed_out = False
+
+        # Contribuição máxima/mínima de cada seleção ao log P da cartela: log p
+        # mais a maior (menor) correlação entre tipos presentes, por parceiro
+        types = sorted(set(type_of[p] for p in self.order))
+        lifts = [lift[a][b] for a in types for b in types if lift[a][b] > -math.inf]
+        extra = self.max_size - 1
+        best_lift = max([0.0] + lifts)
+        worst_lift = min([0.0] + lifts)
+        # Em self.order (log p decrescente) as próximas r seleções dão a maior soma
+        self.gain_max = {p: log_prob[p] + extra * best_lift for p in self.order}
+        gain_min = sorted(log_prob[p] + extra * worst_lift for p in self.order)
+        # Soma das r menores contribuições (limite inferior para r seleções a mais)
+        self.worst_sum = [0.0]
+        for value in gain_min[:self.max_size]:
+            self.worst_sum.append(self.worst_sum[-1] + value)
+        # Menor log p do índice i em diante (a cartela é limitada à menor p_i)
+        self.suffix_min = [math.inf] * (len(self.order) + 1)
+        for i in range(len(self.order) - 1, -1, -1):
+            self.suffix_min[i] = min(self.suffix_min[i + 1], log_prob[self.order[i]])
+
+    def _distance(self, low, high):
+        """Distância (em log) do alvo ao intervalo [low, high] de log P atingível"""
+        if low > self.high or high < self.low:
+            return math.inf
+        if low <= self.center <= high:
+            return 0.0
+        return min(abs(low - self.center), abs(high - self.center))
+
+    def _worst(self):
+        return -self.best[0][0] if len(self.best) == self.k else math.inf
+
+    def run(self):
+        self._extend(0, [], 0.0, math.inf, {})
+        return self
+
+    def _extend(self, start, chosen, total, min_log_prob, type_counts):
+        self.explored += 1
+
+        size = len(chosen)
+        if size >= self.min_size:
+            log_prob = min(total, min_log_prob)
+            if self.low <= log_prob <= self.high:
+                distance = abs(log_prob - self.center)
+                if distance < self._worst():
+                    entry = (-distance, tuple(chosen))
+                    if len(self.best) < self.k:
+                        heapq.heappush(self.best, entry)
+                    else:
+                        heapq.heapreplace(self.best, entry)
+        if size == self.max_size:
+            return
+
+        for i in range(start, len(self.order)):
+            self.steps += 1
+            if self.steps % CLOCK_EVERY == 0 and time.monotonic() > self.deadline:
+                self.timed_out = True
+                return
+            position = self.order[i]
+            selection_type = self.type_of[position]
+            if type_counts.get(selection_type, 0) >= self.type_limits.get(selection_type, 1):
+                continue
+            step = self.log_prob[position]
+            for other in chosen:
+                step += self.lift[selection_type][self.type_of[other]]
+            if step == -math.inf:
+                continue  # probabilidade zero ou par mutuamente exclusivo
+
+            new_total = total + step
+            new_min = min(min_log_prob, self.log_prob[position])
+            if not self._promising(i + 1, size + 1, new_total, new_min):
+                continue
+
+            chosen.append(position)
+            type_counts[selection_type] = type_counts.get(selection_type, 0) + 1
+            self._extend(i + 1, chosen, new_total, new_min, type_counts)
+            type_counts[selection_type] -= 1
+            chosen.pop()
+            if self.timed_out:
+                return
+
+    def _promising(self, start, size, total, min_log_prob):
+        """Alguma extensão do nó (incluindo ele mesmo) pode entrar entre as K melhores?"""
+        remaining = len(self.order) - start
+        best = total if size >= self.min_size else -math.inf
+        worst = total if size >= self.min_size else math.inf
+        upper = total
+        for extra in range(1, min(self.max_size - size, remaining) + 1):
+            # As seleções seguintes estão em ordem decrescente de log p
+            upper += self.gain_max[self.order[start + extra - 1]]
+            lower = total + self.worst_sum[extra]
+            if size + extra >= self.min_size:
+                best = max(best, upper)
+                worst = min(worst, lower)
+        if best == -math.inf:
+            return False
+        # A cartela final é limitada à menor p_i entre as escolhidas e as que virão
+        best = min(best, min_log_prob)
+        worst = min(worst, min_log_prob, self.suffix_min[start])
+        return self._distance(worst, best) < self._worst()
+
+
+def generate_mystery_cartelas(event_id, cartela_template_id, min_odd, max_odd, k=None, time_budget_ms=None):
+    """
+    Até `k` cartelas (ids das seleções + odd pela margem do template) do evento
+    com odd em [min_odd, max_odd], as mais próximas da média geométrica da
+    faixa primeiro. O tamanho das cartelas segue min_items/max_items do
+    template (padrão 2 a 4).
+    """
+    if min_odd < pricing.MIN_ODD or max_odd < min_odd:
+        raise ValidationError("Faixa de odds inválida.")
+    k = min(k or settings.MISTERIOSA_MAX_RESULTS, settings.MISTERIOSA_MAX_RESULTS)
+    if time_budget_ms is None:
+        time_budget_ms = settings.MISTERIOSA_TIME_BUDGET_MS
+    start = time.monotonic()
+
+    data = odds_cache.get_event_odds(event_id)
+    if data is None:
+        raise ValidationError("Evento não encontrado.")
+    compiled = template_rules.load(cartela_template_id)
+    if compiled is None or not compiled[0].ativo:
+        raise ValidationError("Template de cartela não encontrado ou inativo.")
+    template, rules = compiled
+    if template.tipo != "MISTERIOSA":
+        raise ValidationError("Template não é do tipo MISTERIOSA.")
+    engine = pricing.event_pricing(event_id, data)
+
+    candidates = [engine.position[s["id"]] for s in data["selections"] if rules.allows(s)]
+    min_size = max(1, rules.min_items or DEFAULT_MIN_ITEMS)
+    max_size = min(rules.max_items or DEFAULT_MAX_ITEMS, settings.MISTERIOSA_MAX_ITEMS)
+    if not candidates or max_size < min_size:
+        return MysteryResult(cartelas=[], complete=True, explored=0, duration=time.monotonic() - start)
+
+    # Limite de seleções por tipo: max_items do item e max_per_type do template
+    # (o menor dos dois); sem nenhum, uma seleção por tipo
+    type_limits = {}
+    for s in data["selections"]:
+        index = int(engine.type_of[engine.position[s["id"]]])
+        if index in type_limits:
+            continue
+        item = (rules.types or {}).get(s["selection_type"])
+        limits = [v for v in (rules.max_per_type, item and item[2]) if v is not None]
+        type_limits[index] = min(limits) if limits else 1
+
+    margin = pricing.template_margin(template)
+    log_margin = math.log(1.0 + margin)
+    # odd = 1 / (P * (1 + margem)): faixa de odds vira faixa de log P
+    target = (
+        -math.log(max_odd) - log_margin,
+        -math.log(min_odd) - log_margin,
+        -0.5 * (math.log(min_odd) + math.log(max_odd)) - log_margin,
+    )
+    search = _Search(
+        candidates,
+        _as_list(engine.log_prob),
+        [int(t) for t in _as_list(engine.type_of)],
+        _as_list(engine.lift),
+        type_limits,
+        (min_size, max_size),
+        target,
+        k,
+        start + time_budget_ms / 1000.0,
+    ).run()
+
+    by_id = {s["id"]: s for s in data["selections"]}
+    cartelas = []
+    for _, positions in sorted(search.best, reverse=True):
+        selection_ids = [engine.ids[p] for p in positions]
+        try:
+            # Regras de contagem que a busca não cobre (min_items por tipo)
+            rules.validate([by_id[i] for i in selection_ids])
+        except ValidationError:
+            continue
+        cartelas.append((selection_ids, engine.price(selection_ids, margin)))
+    return MysteryResult(
+        cartelas=cartelas,
+        complete=not search.timed_out,
+        explored=search.explored,
+        duration=time.monotonic() - start,
+    )
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
 
@@ -36,6 +37,7 @@ class Event(models.Model):
         indexes = [
             models.Index(fields=['sport', 'status']),
             models.Index(fields=['start_time']),
+            models.Index(fields=['external_id']),
         ]
     
     def __str__(self):
@@ -81,6 +83,74 @@ class MarketSelection(models.Model):
         return f"{self.event} - {self.selection_type} ({self.odd_publicada})"
 
 
+class SelectionCorrelation(models.Model):
+    """
+    Correlação entre dois tipos de seleção de um esporte, usada no preço da
+    cartela (ver pricing.py). O fator é P(A e B) / (P(A) * P(B)): 1.0 para
+    tipos independentes, acima de 1 quando tendem a sair juntos, abaixo de 1
+    quando tendem a se excluir. O par é guardado em ordem alfabética.
+    """
+    sport = models.CharField(max_length=32, choices=Event.SPORT_CHOICES, verbose_name="Esporte")
+    selection_type_a = models.CharField(max_length=64, verbose_name="Tipo de Seleção A")
+    selection_type_b = models.CharField(max_length=64, verbose_name="Tipo de Seleção B")
+    factor = models.FloatField(
+        default=1.0,
+        validators=[MinValueValidator(0.0)],
+        help_text="P(A e B) / (P(A) * P(B)); 1.0 = independentes",
+        verbose_name="Fator"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+    
+    class Meta:
+        verbose_name = "Correlação de Seleções"
+        verbose_name_plural = "Correlações de Seleções"
+        ordering = ['sport', 'selection_type_a', 'selection_type_b']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sport', 'selection_type_a', 'selection_type_b'],
+                name='selection_correlation_uniq',
+            ),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self.selection_type_b < self.selection_type_a:
+            self.selection_type_a, self.selection_type_b = self.selection_type_b, self.selection_type_a
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.sport}: {self.selection_type_a} x {self.selection_type_b} ({self.factor})"
+
+
+class EventOddsSnapshot(models.Model):
+    """
+    Odds de todas as seleções de um evento num instante, guardadas uma vez só.
+    A chave é o sha256 do conteúdo; cartelas cotadas com as mesmas odds
+    apontam para o mesmo snapshot (ver snapshots.py). Os vetores são arrays
+    empacotados little-endian, na ordem de selection_ids.
+    """
+    hash = models.CharField(max_length=64, primary_key=True, verbose_name="Hash")
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name="odds_snapshots",
+        verbose_name="Evento"
+    )
+    selection_ids = models.BinaryField(verbose_name="IDs das Seleções (int64)")
+    odds = models.BinaryField(verbose_name="Odds Publicadas (float64)")
+    probs = models.BinaryField(verbose_name="Probabilidades Base (float64)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    
+    class Meta:
+        verbose_name = "Snapshot de Odds do Evento"
+        verbose_name_plural = "Snapshots de Odds do Evento"
+        indexes = [
+            models.Index(fields=['event', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_id}:{self.hash[:12]}"
+
+
 class Influencer(models.Model):
     """Influenciador que cria cartelas especiais"""
     user = models.OneToOneField(
@@ -164,6 +234,7 @@ class CartelaInstance(models.Model):
         ("APOSTA_CONFIRMADA", "Aposta confirmada"),
         ("SETTLED", "Liquidada"),
         ("CANCELADA", "Cancelada"),
+        ("EXPIRADA", "Expirada"),
     ]
     
     user = models.ForeignKey(
@@ -206,6 +277,14 @@ class CartelaInstance(models.Model):
         verbose_name="Valor Apostado"
     )
     snapshot_data = models.JSONField(default=dict, blank=True, verbose_name="Dados do Snapshot")
+    odds_snapshot = models.ForeignKey(
+        EventOddsSnapshot,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="cartelas",
+        verbose_name="Snapshot de Odds"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Travado em")
     
@@ -249,6 +328,11 @@ class CartelaInstanceItem(models.Model):
 
 class Bet(models.Model):
     """Aposta ligada a uma cartela"""
+    CATEGORIA_CHOICES = [
+        ("FUNDOS", "Fundos"),
+        ("PONTOS", "Pontos"),
+    ]
+    
     cartela = models.OneToOneField(
         CartelaInstance,
         on_delete=models.CASCADE,
@@ -261,6 +345,13 @@ class Bet(models.Model):
         validators=[MinValueValidator(Decimal('0.01'))],
         verbose_name="Valor Apostado"
     )
+    categoria = models.CharField(
+        max_length=10,
+        choices=CATEGORIA_CHOICES,
+        default="FUNDOS",
+        verbose_name="Categoria",
+        help_text="Saldo da carteira debitado na confirmação (e creditado no ganho)"
+    )
     odd_final = models.FloatField(verbose_name="Odd Final")
     potential_return = models.DecimalField(
         max_digits=18,
@@ -284,7 +375,7 @@ class Bet(models.Model):
 
 
 class OddsSnapshot(models.Model):
-    """Snapshot de odds para auditoria"""
+    """Snapshot de odds para auditoria (legado: cartelas novas usam EventOddsSnapshot)"""
     cartela = models.ForeignKey(
         CartelaInstance,
         on_delete=models.CASCADE,
@@ -338,15 +429,241 @@ class RiskExposureMetrics(models.Model):
         verbose_name="Payout Máximo"
     )
     margem_media = models.FloatField(default=0.0, verbose_name="Margem Média")
+    shard = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Sub-linha do contador; a exposição real é a soma dos shards",
+        verbose_name="Shard"
+    )
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
     
     class Meta:
         verbose_name = "Métrica de Risco"
         verbose_name_plural = "Métricas de Risco"
-        unique_together = ['event', 'cartela_template', 'influencer']
         indexes = [
             models.Index(fields=['event', 'cartela_template']),
         ]
+        constraints = [
+            # Alvo do upsert de exposição: trata influencer NULL como um valor
+            # (unique_together considera NULLs distintos).
+            models.UniqueConstraint(
+                'event', 'cartela_template', Coalesce('influencer', 0), 'shard',
+                name='risk_metrics_upsert_uniq',
+            ),
+        ]
     
     def __str__(self):
         return f"Risco - {self.event} - {self.cartela_template}"
+
+
+class SelectionLiability(models.Model):
+    """
+    Passivo por seleção: soma dos prêmios potenciais das apostas confirmadas
+    e ainda não liquidadas que contêm a seleção ("quanto pagamos se X bater").
+    Incrementado na confirmação e zerado na liquidação (ver liability.py).
+    """
+    market_selection = models.OneToOneField(
+        MarketSelection,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="liability",
+        verbose_name="Seleção"
+    )
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name="selection_liabilities",
+        verbose_name="Evento"
+    )
+    liability = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name="Passivo"
+    )
+    bets = models.PositiveIntegerField(default=0, verbose_name="Apostas")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+    
+    class Meta:
+        verbose_name = "Passivo por Seleção"
+        verbose_name_plural = "Passivos por Seleção"
+        indexes = [
+            # Top-N por evento sem ordenar a tabela
+            models.Index(fields=['event', '-liability'], name='selection_liability_top_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Passivo - {self.market_selection_id} ({self.liability})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Resposta guardada de uma requisição com header Idempotency-Key.
+    Um retry com a mesma chave recebe a mesma resposta sem reexecutar nada.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+        verbose_name="Usuário"
+    )
+    scope = models.CharField(max_length=50, verbose_name="Escopo")
+    key = models.CharField(max_length=255, verbose_name="Chave")
+    request_hash = models.CharField(max_length=64, verbose_name="Hash da Requisição")
+    response_status = models.PositiveSmallIntegerField(verbose_name="Status da Resposta")
+    response_body = models.JSONField(verbose_name="Corpo da Resposta")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Criado em")
+    
+    class Meta:
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"],
+                name="idempotency_key_uniq",
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.response_status})"
+
+
+# ========================
+# Arquivo (ver archive.py)
+# ========================
+# Cartelas liquidadas/expiradas/canceladas antigas e suas linhas filhas saem
+# das tabelas quentes para estas, com as mesmas colunas e ids. As FKs não têm
+# constraint física (o arquivo sobrevive a deleções), mas permitem
+# select_related/prefetch_related na leitura.
+
+class CartelaInstanceArchive(models.Model):
+    """Cartela arquivada (mesmas colunas de CartelaInstance)"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="archived_cartelas",
+        verbose_name="Usuário"
+    )
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="archived_cartelas",
+        verbose_name="Evento"
+    )
+    cartela_template = models.ForeignKey(
+        CartelaTemplate,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="archived_instances",
+        verbose_name="Template"
+    )
+    status = models.CharField(max_length=32, choices=CartelaInstance.STATUS_CHOICES, verbose_name="Status")
+    odd_final = models.FloatField(null=True, blank=True, verbose_name="Odd Final")
+    premio_maximo = models.DecimalField(
+        max_digits=18, decimal_places=2, null=True, blank=True, verbose_name="Prêmio Máximo"
+    )
+    stake = models.DecimalField(max_digits=18, decimal_places=2, verbose_name="Valor Apostado")
+    snapshot_data = models.JSONField(default=dict, blank=True, verbose_name="Dados do Snapshot")
+    odds_snapshot = models.ForeignKey(
+        EventOddsSnapshot,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="archived_cartelas",
+        verbose_name="Snapshot de Odds"
+    )
+    created_at = models.DateTimeField(verbose_name="Criado em")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Travado em")
+    
+    class Meta:
+        verbose_name = "Cartela Arquivada"
+        verbose_name_plural = "Cartelas Arquivadas"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Cartela #{self.id} (arquivada)"
+
+
+class CartelaInstanceItemArchive(models.Model):
+    """Item de cartela arquivado"""
+    id = models.BigIntegerField(primary_key=True)
+    cartela_instance = models.ForeignKey(
+        CartelaInstanceArchive,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="items",
+        verbose_name="Cartela"
+    )
+    market_selection = models.ForeignKey(
+        MarketSelection,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="archived_cartela_items",
+        verbose_name="Seleção"
+    )
+    odd_usada = models.FloatField(verbose_name="Odd Usada")
+    
+    class Meta:
+        verbose_name = "Item de Cartela Arquivado"
+        verbose_name_plural = "Itens de Cartela Arquivados"
+    
+    def __str__(self):
+        return f"Item #{self.id} - Cartela #{self.cartela_instance_id} (arquivado)"
+
+
+class BetArchive(models.Model):
+    """Aposta arquivada (mesmas colunas de Bet)"""
+    id = models.BigIntegerField(primary_key=True)
+    cartela = models.OneToOneField(
+        CartelaInstanceArchive,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="bet",
+        verbose_name="Cartela"
+    )
+    stake = models.DecimalField(max_digits=18, decimal_places=2, verbose_name="Valor Apostado")
+    categoria = models.CharField(max_length=10, choices=Bet.CATEGORIA_CHOICES, verbose_name="Categoria")
+    odd_final = models.FloatField(verbose_name="Odd Final")
+    potential_return = models.DecimalField(max_digits=18, decimal_places=2, verbose_name="Retorno Potencial")
+    is_won = models.BooleanField(null=True, blank=True, verbose_name="Ganhou?")
+    settled_at = models.DateTimeField(null=True, blank=True, verbose_name="Liquidado em")
+    created_at = models.DateTimeField(verbose_name="Criado em")
+    
+    class Meta:
+        verbose_name = "Aposta Arquivada"
+        verbose_name_plural = "Apostas Arquivadas"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Bet #{self.id} - Cartela #{self.cartela_id} (arquivada)"
+
+
+class OddsSnapshotArchive(models.Model):
+    """Snapshot de odds arquivado"""
+    id = models.BigIntegerField(primary_key=True)
+    cartela = models.ForeignKey(
+        CartelaInstanceArchive,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="snapshots",
+        verbose_name="Cartela"
+    )
+    data = models.JSONField(verbose_name="Dados")
+    created_at = models.DateTimeField(verbose_name="Criado em")
+    
+    class Meta:
+        verbose_name = "Snapshot de Odds Arquivado"
+        verbose_name_plural = "Snapshots de Odds Arquivados"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Snapshot #{self.id} - Cartela #{self.cartela_id} (arquivado)"
@@ -0,0 +1,153 @@
+"""
+Cache das seleções (odds) por evento.
+
+Cada evento tem um contador de versão no cache; a lista de seleções fica
+guardada sob a chave (evento, versão). Qualquer save/delete de MarketSelection
+incrementa a versão do evento (ver signals.py), então a próxima leitura
+recarrega do banco e as entradas antigas simplesmente expiram ou são
+descartadas pelo LRU do backend (LocMemCache com MAX_ENTRIES por padrão).
+
+Atualizações que não disparam signals (QuerySet.update, bulk_update) precisam
+chamar bump_event_version explicitamente.
+"""
+import time
+from django.core.cache import caches
+from django.db import transaction
+from .models import Event, EventOddsSnapshot, MarketSelection
+from .snapshots import build_snapshot, pack_selections, snapshot_hash
+
+
+ODDS_CACHE_ALIAS = "odds"
+
+SELECTION_FIELDS = (
+    "id",
+    "selection_type",
+    "params",
+    "prob_base",
+    "odd_justa",
+    "odd_publicada",
+    "is_live",
+)
+
+
+def _cache():
+    return caches[ODDS_CACHE_ALIAS]
+
+
+def _version_key(event_id):
+    return f"odds:event:{event_id}:version"
+
+
+def _data_key(event_id, version):
+    return f"odds:event:{event_id}:v{version}"
+
+
+def _stored_snapshot_key(digest):
+    return f"odds:snapshot:{digest}"
+
+
+def get_version(key):
+    """Contador de versão sob `key` (criado a partir do relógio se não existe)"""
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        # Versão nova baseada no relógio: se a chave de versão foi descartada
+        # pelo LRU, nunca reaproveitamos dados de uma versão antiga.
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_event_version(event_id):
+    return get_version(_version_key(event_id))
+
+
+def bump_event_version(event_id):
+    """Invalida as seleções em cache do evento"""
+    bump_version(_version_key(event_id))
+
+
+def _load_event_odds(event_id):
+    event = Event.objects.filter(id=event_id).values("id", "sport", "status").first()
+    if event is None:
+        return None
+    selections = list(
+        MarketSelection.objects
+        .filter(event_id=event_id)
+        .order_by("selection_type", "updated_at")
+        .values(*SELECTION_FIELDS)
+    )
+    return {
+        "event": event,
+        "selections": selections,
+        "snapshot_hash": snapshot_hash(event_id, pack_selections(selections)),
+    }
+
+
+def get_event_odds(event_id):
+    """
+    Retorna {"event": {...}, "selections": [dict, ...], "snapshot_hash": str}
+    do evento, ou None se o evento não existe. Os dicts das seleções têm
+    exatamente os campos de MarketSelectionSerializer e podem ir direto para
+    a resposta da API; snapshot_hash identifica o vetor de odds (snapshots.py).
+    """
+    cache = _cache()
+    key = _data_key(event_id, get_event_version(event_id))
+    data = cache.get(key)
+    if data is None:
+        data = _load_event_odds(event_id)
+        if data is not None:
+            cache.set(key, data)
+    return data
+
+
+def get_event_selections(event_id, selection_ids=None):
+    """
+    Seleções do evento como instâncias de MarketSelection (não recarregadas
+    do banco), opcionalmente restritas a selection_ids. None se o evento
+    não existe.
+    """
+    data = get_event_odds(event_id)
+    if data is None:
+        return None
+    return selections_from(event_id, data, selection_ids)
+
+
+def selections_from(event_id, data, selection_ids=None):
+    """Como get_event_selections, a partir de um `data` já lido de get_event_odds"""
+    wanted = set(selection_ids) if selection_ids is not None else None
+    return [
+        MarketSelection(event_id=event_id, **s)
+        for s in data["selections"]
+        if wanted is None or s["id"] in wanted
+    ]
+
+
+def store_snapshot(event_id, data):
+    """
+    Grava (uma vez) o EventOddsSnapshot das odds em `data` e retorna o hash.
+    Sem query quando este processo já gravou o mesmo snapshot. A marca de
+    "já gravado" só vai para o cache depois do commit: se a transação da
+    cotação for desfeita, a próxima cotação grava o snapshot de novo.
+    """
+    cache = _cache()
+    digest = data["snapshot_hash"]
+    key = _stored_snapshot_key(digest)
+    if cache.get(key) is None:
+        snapshot = build_snapshot(event_id, data["selections"])
+        EventOddsSnapshot.objects.bulk_create([snapshot], ignore_conflicts=True)
+        transaction.on_commit(lambda: cache.set(key, True, timeout=None))
+    return digest
+
+
+def clear():
+    _cache().clear()
@@ -0,0 +1,59 @@
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from app_cartela.paginacao import paginar_por_cursor
+
+
+class CreatedAtCursorPagination(BasePagination):
+    """
+    Paginação por cursor em (created_at, id), do mais recente para o mais antigo.
+    Sem COUNT(*)/OFFSET: páginas profundas custam o mesmo que a primeira e a
+    consulta aproveita o índice em -created_at.
+
+    Se a view define get_archive_queryset(), cada página também consulta a
+    tabela de arquivo e junta os resultados (ver app_cartela.paginacao).
+    Resposta no mesmo formato da CursorPagination do DRF: next/previous/results.
+    """
+    page_size = 20
+    cursor_query_param = "cursor"
+    direction_query_param = "dir"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        get_archive = getattr(view, "get_archive_queryset", None)
+        self.request = request
+        self.page = paginar_por_cursor(
+            queryset,
+            "created_at",
+            cursor=request.query_params.get(self.cursor_query_param),
+            direcao=request.query_params.get(self.direction_query_param, "next"),
+            por_pagina=self.page_size,
+            arquivo=get_archive() if get_archive else None,
+        )
+        return list(self.page)
+
+    def _link(self, cursor, direction):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, cursor)
+        if direction == "next":
+            return remove_query_param(url, self.direction_query_param)
+        return replace_query_param(url, self.direction_query_param, direction)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self._link(self.page.next_cursor, "next"),
+            "previous": self._link(self.page.previous_cursor, "prev"),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
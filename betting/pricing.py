@@ -0,0 +1,218 @@
+"""
+Preço das cartelas a partir de prob_base, com correlação entre seleções.
+
+A probabilidade conjunta de uma cartela é o produto das prob_base das seleções,
+corrigido por um fator de correlação para cada par. O fator vem de
+SelectionCorrelation (esporte, tipo A, tipo B) e vale 1.0 quando o par não
+está cadastrado. Em log:
+
+    log P = soma(log p_i) + soma dos pares i<j de log fator(tipo_i, tipo_j)
+
+O resultado é limitado à menor p_i, porque a cartela não pode ser mais
+provável que a sua seleção menos provável. A odd final é
+1 / (P * (1 + margem)), com a margem por CartelaTemplate.tipo
+(settings.PRICING_MARGINS ou template.config["margin"]).
+
+Para cada versão de odds do evento, identificada pelo snapshot_hash do cache
+de odds, os log p_i, os índices de tipo e a matriz tipo x tipo de log fatores
+são montados uma vez e guardados em memória no processo. Com NumPy, uma
+cotação ou o preço de todas as combinações de k seleções (price_combinations)
+vira indexação de arrays, sem laço em Python. Sem NumPy, o mesmo cálculo roda
+em Python puro.
+"""
+import itertools
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from . import odds_cache
+from .models import SelectionCorrelation
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: cai no cálculo em Python puro
+    np = None
+
+
+MIN_ODD = 1.01
+
+# Teto do expoente: odds acima de e^700 não cabem num float
+MAX_LOG_ODD = 700.0
+
+# Versões de odds de eventos mantidas em memória por processo
+MAX_CACHED_EVENTS = 256
+
+CORRELATIONS_VERSION_KEY = "pricing:correlations:version"
+
+
+def bump_correlations_version():
+    odds_cache.bump_version(CORRELATIONS_VERSION_KEY)
+
+
+def _load_correlations(sport, version):
+    """{(tipo_a, tipo_b): log fator} do esporte, no cache de odds por versão"""
+    cache = caches[odds_cache.ODDS_CACHE_ALIAS]
+    key = f"pricing:correlations:{sport}:v{version}"
+    correlations = cache.get(key)
+    if correlations is None:
+        correlations = {
+            (a, b): math.log(factor) if factor > 0 else -math.inf
+            for a, b, factor in SelectionCorrelation.objects.filter(sport=sport).values_list(
+                "selection_type_a", "selection_type_b", "factor",
+            )
+        }
+        cache.set(key, correlations, timeout=None)
+    return correlations
+
+
+def template_margin(template):
+    margin = template.config.get("margin")
+    if margin is None:
+        margin = settings.PRICING_MARGINS.get(template.tipo, settings.PRICING_DEFAULT_MARGIN)
+    return float(margin)
+
+
+def _to_odds(log_prob, margin):
+    return max(MIN_ODD, math.exp(min(-log_prob, MAX_LOG_ODD)) / (1.0 + margin))
+
+
+class EventPricing:
+    """Arrays de preço de uma versão de odds de um evento"""
+
+    def __init__(self, selections, correlations):
+        self.ids = [s["id"] for s in selections]
+        self.position = {selection_id: i for i, selection_id in enumerate(self.ids)}
+        types = sorted({s["selection_type"] for s in selections})
+        type_index = {t: i for i, t in enumerate(types)}
+        type_of = [type_index[s["selection_type"]] for s in selections]
+        log_prob = [math.log(s["prob_base"]) if s["prob_base"] > 0 else -math.inf for s in selections]
+        lift = [[0.0] * len(types) for _ in types]
+        for (a, b), value in correlations.items():
+            if a in type_index and b in type_index:
+                lift[type_index[a]][type_index[b]] = value
+                lift[type_index[b]][type_index[a]] = value
+
+        if np is not None:
+            self.type_of = np.array(type_of, dtype=np.intp)
+            self.log_prob = np.array(log_prob, dtype=np.float64)
+            self.lift = np.array(lift, dtype=np.float64).reshape(len(types), len(types))
+        else:
+            self.type_of = type_of
+            self.log_prob = log_prob
+            self.lift = lift
+
+    def positions(self, selection_ids):
+        try:
+            return [self.position[selection_id] for selection_id in selection_ids]
+        except KeyError:
+            raise ValidationError("Uma ou mais seleções são inválidas para este evento.")
+
+    def log_probability(self, positions):
+        """log P conjunta de uma cartela (posições em self.ids)"""
+        if np is not None:
+            return float(self._log_probabilities(np.array([positions], dtype=np.intp))[0])
+        total = sum(self.log_prob[p] for p in positions)
+        for i, j in itertools.combinations(positions, 2):
+            total += self.lift[self.type_of[i]][self.type_of[j]]
+        return min(total, min(self.log_prob[p] for p in positions))
+
+    def _log_probabilities(self, combos):
+        """log P de cada linha de `combos` (array m x k de posições), vetorizado"""
+        log_probs = self.log_prob[combos]
+        total = log_probs.sum(axis=1)
+        if combos.shape[1] > 1:
+            types = self.type_of[combos]
+            i, j = np.triu_indices(combos.shape[1], 1)
+            total += self.lift[types[:, i], types[:, j]].sum(axis=1)
+        return np.minimum(total, log_probs.min(axis=1))
+
+    def price(self, selection_ids, margin):
+        log_prob = self.log_probability(self.positions(selection_ids))
+        if log_prob == -math.inf:
+            raise ValidationError("Cartela com probabilidade zero não pode ser cotada.")
+        return _to_odds(log_prob, margin)
+
+    def price_many(self, selection_sets, margins):
+        """
+        Odds de várias cartelas (listas de ids), cada uma com a sua margem;
+        None para cartela com probabilidade zero. Com NumPy, as cartelas do
+        mesmo tamanho são calculadas numa única operação.
+        """
+        position_sets = [self.positions(selection_ids) for selection_ids in selection_sets]
+        if np is not None:
+            log_probs = [None] * len(position_sets)
+            by_size = defaultdict(list)
+            for index, positions in enumerate(position_sets):
+                by_size[len(positions)].append(index)
+            for size, indexes in by_size.items():
+                matrix = np.array([position_sets[i] for i in indexes], dtype=np.intp).reshape(len(indexes), size)
+                for index, log_prob in zip(indexes, self._log_probabilities(matrix).tolist()):
+                    log_probs[index] = log_prob
+        else:
+            log_probs = [self.log_probability(positions) for positions in position_sets]
+        return [
+            None if log_prob == -math.inf else _to_odds(log_prob, margin)
+            for log_prob, margin in zip(log_probs, margins)
+        ]
+
+    def price_combinations(self, selection_ids, size, margin):
+        """
+        Preço de todas as combinações de `size` seleções entre selection_ids.
+        Retorna [(ids da combinação, odd), ...] na ordem de itertools.combinations.
+        """
+        positions = self.positions(selection_ids)
+        if size < 1 or size > len(positions):
+            return []
+        if math.comb(len(positions), size) > settings.PRICING_MAX_COMBINATIONS:
+            raise ValidationError("Combinações demais para precificar de uma vez.")
+
+        combos = list(itertools.combinations(positions, size))
+        if np is not None:
+            matrix = np.array(combos, dtype=np.intp).reshape(len(combos), size)
+            odds = np.exp(np.minimum(-self._log_probabilities(matrix), MAX_LOG_ODD)) / (1.0 + margin)
+            odds = np.maximum(odds, MIN_ODD).tolist()
+        else:
+            odds = [_to_odds(self.log_probability(combo), margin) for combo in combos]
+        return [
+            (tuple(self.ids[p] for p in combo), odd)
+            for combo, odd in zip(combos, odds)
+        ]
+
+
+_lock = threading.Lock()
+_pricings = OrderedDict()
+
+
+def event_pricing(event_id, data):
+    """EventPricing das odds em `data` (odds_cache.get_event_odds), em cache por versão"""
+    version = odds_cache.get_version(CORRELATIONS_VERSION_KEY)
+    key = (event_id, data["snapshot_hash"], version)
+    with _lock:
+        pricing = _pricings.get(key)
+        if pricing is not None:
+            _pricings.move_to_end(key)
+            return pricing
+
+    correlations = _load_correlations(data["event"]["sport"], version)
+    pricing = EventPricing(data["selections"], correlations)
+    with _lock:
+        _pricings[key] = pricing
+        while len(_pricings) > MAX_CACHED_EVENTS:
+            _pricings.popitem(last=False)
+    return pricing
+
+
+def price_quote(event_id, data, template, selection_ids, extra_margin=0.0):
+    """
+    Odd final da cartela com as seleções `selection_ids` do evento.
+    `extra_margin` soma à margem do template (ajuste do motor de risco).
+    """
+    margin = template_margin(template) + extra_margin
+    return event_pricing(event_id, data).price(selection_ids, margin)
+
+
+def clear():
+    with _lock:
+        _pricings.clear()
@@ -0,0 +1,201 @@
+"""
+Motor de risco em memória, consultado em toda cotação.
+
+Cada processo guarda o passivo (soma dos prêmios potenciais) em três escopos:
+
+- por evento e por influenciador: mesma semântica de RiskExposureMetrics
+  (cotações em aberto e apostas confirmadas, descontadas as expiradas). É
+  somado quando a cotação é commitada e descontado na expiração;
+- por seleção: prêmios das apostas confirmadas que contêm a seleção,
+  somados no commit de confirm_bet (no banco, SelectionLiability; ver
+  liability.py).
+
+A cotação consulta só esses dicionários, em O(seleções) e sem query. O motor
+devolve o prêmio máximo que ainda cabe nos limites (RISK_LIMITS), que vira o
+stake máximo da cartela, e um acréscimo de margem que cresce com a utilização
+do limite mais apertado.
+
+O estado é recarregado do banco (warm) numa thread de fundo: na primeira
+consulta e a cada RISK_ENGINE_RESYNC_SECONDS, só para eventos em aberto. A
+recarga incorpora o que outros workers e comandos (expiração, liquidação)
+gravaram. Entre recargas, cada worker vê só os próprios incrementos. Os
+limites são, portanto, aproximados entre workers, por no máximo um intervalo
+de recarga. Com RISK_ENGINE_BACKGROUND desligado (setup/settings_test.py),
+warm() é chamado explicitamente.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+from decimal import Decimal, ROUND_DOWN
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+from .models import RiskExposureMetrics, SelectionLiability
+
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0")
+
+OPEN_EVENT_STATUSES = ("SCHEDULED", "LIVE")
+
+RiskAssessment = namedtuple("RiskAssessment", ["max_payout", "utilization", "adjusted_margin"])
+
+
+def margin_adjustment(utilization):
+    """Acréscimo de margem: zero até o limiar, linear até o máximo em 100% do limite"""
+    threshold = settings.RISK_MARGIN_THRESHOLD
+    if utilization <= threshold:
+        return 0.0
+    ratio = min(1.0, (utilization - threshold) / (1.0 - threshold))
+    return round(ratio * settings.RISK_MAX_MARGIN_ADJUSTMENT, 4)
+
+
+def _utilization(liability, limit):
+    """Fração do limite em uso; limite zero (ou negativo) é "sem capacidade": 100%"""
+    if limit <= 0:
+        return 1.0
+    return float(liability) / limit
+
+
+def max_stake(assessment, odd):
+    """Stake máximo (centavos, para baixo) para o prêmio máximo com esta odd"""
+    return (assessment.max_payout / Decimal(str(odd))).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+
+
+class RiskEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = defaultdict(Decimal)
+        self._influencers = defaultdict(Decimal)
+        # Parcela de cada evento no passivo de cada influenciador (para release_event)
+        self._event_influencers = defaultdict(lambda: defaultdict(Decimal))
+        self._selections = defaultdict(lambda: defaultdict(Decimal))
+        self._warmer = None
+        self.warmed_at = None
+
+    # Leitura (caminho da cotação) -----------------------------------------
+
+    def assess(self, event_id, influencer_id, selection_ids):
+        """Prêmio máximo que cabe nos limites, utilização e acréscimo de margem"""
+        self._ensure_warmer()
+        limits = settings.RISK_LIMITS
+        with self._lock:
+            used = [(self._events.get(event_id, ZERO), limits["EVENT"])]
+            if influencer_id is not None:
+                used.append((self._influencers.get(influencer_id, ZERO), limits["INFLUENCER"]))
+            selections = self._selections.get(event_id, {})
+            used.extend((selections.get(s, ZERO), limits["SELECTION"]) for s in selection_ids)
+
+        headroom = min(Decimal(limit) - liability for liability, limit in used)
+        max_payout = max(ZERO, min(headroom, Decimal(limits["PAYOUT_PER_BET"])))
+        utilization = max(_utilization(liability, limit) for liability, limit in used)
+        return RiskAssessment(
+            max_payout=max_payout,
+            utilization=utilization,
+            adjusted_margin=margin_adjustment(utilization),
+        )
+
+    def liability(self, event_id=None, influencer_id=None, selection_id=None):
+        with self._lock:
+            if selection_id is not None:
+                return self._selections.get(event_id, {}).get(selection_id, ZERO)
+            if influencer_id is not None:
+                return self._influencers.get(influencer_id, ZERO)
+            return self._events.get(event_id, ZERO)
+
+    # Atualização incremental ----------------------------------------------
+
+    def record_quote(self, event_id, influencer_id, potential_return):
+        """Cotação commitada (positivo) ou expirada (negativo)"""
+        with self._lock:
+            if potential_return < 0 and event_id not in self._events:
+                return  # evento já liberado (liquidado): não desconta duas vezes
+            self._events[event_id] += potential_return
+            if influencer_id is not None:
+                self._influencers[influencer_id] += potential_return
+                self._event_influencers[event_id][influencer_id] += potential_return
+
+    def record_bet(self, event_id, selection_ids, potential_return):
+        """Aposta confirmada: o prêmio passa a pesar em cada seleção da cartela"""
+        with self._lock:
+            selections = self._selections[event_id]
+            for selection_id in selection_ids:
+                selections[selection_id] += potential_return
+
+    def release_event(self, event_id):
+        """Evento liquidado: o passivo dele deixa de contar, inclusive nos influenciadores"""
+        with self._lock:
+            self._events.pop(event_id, None)
+            self._selections.pop(event_id, None)
+            for influencer_id, liability in self._event_influencers.pop(event_id, {}).items():
+                self._influencers[influencer_id] -= liability
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._influencers.clear()
+            self._event_influencers.clear()
+            self._selections.clear()
+            self.warmed_at = None
+
+    # Recarga do banco -----------------------------------------------------
+
+    def warm(self):
+        """Recarrega o estado dos eventos em aberto (duas queries agregadas)"""
+        exposure = (
+            RiskExposureMetrics.objects
+            .filter(event__status__in=OPEN_EVENT_STATUSES)
+            .values("event_id", "influencer_id")
+            .annotate(payout=Sum("payout_maximo"))
+            .order_by()
+        )
+        events = defaultdict(Decimal)
+        influencers = defaultdict(Decimal)
+        event_influencers = defaultdict(lambda: defaultdict(Decimal))
+        for row in exposure:
+            events[row["event_id"]] += row["payout"] or ZERO
+            if row["influencer_id"] is not None:
+                influencers[row["influencer_id"]] += row["payout"] or ZERO
+                event_influencers[row["event_id"]][row["influencer_id"]] += row["payout"] or ZERO
+
+        selections = defaultdict(lambda: defaultdict(Decimal))
+        confirmed = (
+            SelectionLiability.objects
+            .filter(event__status__in=OPEN_EVENT_STATUSES, liability__gt=0)
+            .values_list("event_id", "market_selection_id", "liability")
+        )
+        for event_id, selection_id, liability in confirmed.iterator(chunk_size=5000):
+            selections[event_id][selection_id] = liability
+
+        with self._lock:
+            self._events = events
+            self._influencers = influencers
+            self._event_influencers = event_influencers
+            self._selections = selections
+            self.warmed_at = time.monotonic()
+
+    def _ensure_warmer(self):
+        if not settings.RISK_ENGINE_BACKGROUND:
+            return
+        if self._warmer is not None and self._warmer.is_alive():
+            return
+        with self._lock:
+            if self._warmer is not None and self._warmer.is_alive():
+                return
+            self._warmer = threading.Thread(target=self._warm_loop, name="risk-warmer", daemon=True)
+            self._warmer.start()
+
+    def _warm_loop(self):
+        while True:
+            try:
+                self.warm()
+            except Exception:
+                logger.exception("Falha ao recarregar o motor de risco")
+            finally:
+                connections.close_all()
+            time.sleep(settings.RISK_ENGINE_RESYNC_SECONDS)
+
+
+engine = RiskEngine()
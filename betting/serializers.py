@@ -1,12 +1,13 @@
 from rest_framework import serializers
 from django.conf import settings
+from app_cartela.instrumentacao import SerializacaoMedidaMixin
 from .models import (
     Event, MarketSelection, CartelaTemplate,
-    CartelaInstance, CartelaInstanceItem, Bet,
+    CartelaInstance, CartelaInstanceItem, Bet, SelectionLiability,
 )
 
 
-class CartelaTemplateSerializer(serializers.ModelSerializer):
+class CartelaTemplateSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     class Meta:
         model = CartelaTemplate
         fields = [
@@ -18,7 +19,7 @@ class CartelaTemplateSerializer(serializers.ModelSerializer):
         ]
 
 
-class MarketSelectionSerializer(serializers.ModelSerializer):
+class MarketSelectionSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     class Meta:
         model = MarketSelection
         fields = [
@@ -32,6 +33,19 @@ class MarketSelectionSerializer(serializers.ModelSerializer):
         ]
 
 
+class SelectionLiabilitySerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
+    selection = MarketSelectionSerializer(source="market_selection", read_only=True)
+    
+    class Meta:
+        model = SelectionLiability
+        fields = [
+            "selection",
+            "liability",
+            "bets",
+            "updated_at",
+        ]
+
+
 class CartelaQuoteRequestSerializer(serializers.Serializer):
     event_id = serializers.IntegerField()
     cartela_template_id = serializers.IntegerField()
@@ -42,7 +56,7 @@ class CartelaQuoteRequestSerializer(serializers.Serializer):
     stake = serializers.DecimalField(max_digits=18, decimal_places=2)
 
 
-class CartelaQuoteResponseSerializer(serializers.Serializer):
+class CartelaQuoteResponseSerializer(SerializacaoMedidaMixin, serializers.Serializer):
     cartela_id = serializers.IntegerField()
     odd_final = serializers.FloatField()
     premio_maximo = serializers.DecimalField(max_digits=18, decimal_places=2)
@@ -50,11 +64,52 @@ class CartelaQuoteResponseSerializer(serializers.Serializer):
     risk_flags = serializers.DictField()
 
 
+class CartelaBatchQuoteRequestSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField()
+    cartela_template_id = serializers.IntegerField()
+    selection_sets = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(), allow_empty=False),
+        allow_empty=False,
+        max_length=settings.QUOTE_BATCH_MAX_SIZE,
+    )
+    stake = serializers.DecimalField(max_digits=18, decimal_places=2)
+    persist = serializers.BooleanField(default=False)
+
+
+class CartelaBatchQuoteItemSerializer(serializers.Serializer):
+    selection_ids = serializers.ListField(child=serializers.IntegerField())
+    cartela_id = serializers.IntegerField(allow_null=True)
+    odd_final = serializers.FloatField(required=False)
+    premio_maximo = serializers.DecimalField(max_digits=18, decimal_places=2, required=False)
+    risk_flags = serializers.DictField(required=False)
+    error = serializers.CharField(allow_null=True)
+
+
+class CartelaBatchQuoteResponseSerializer(SerializacaoMedidaMixin, serializers.Serializer):
+    event_id = serializers.IntegerField()
+    valid_until = serializers.DateTimeField(allow_null=True)
+    quotes = CartelaBatchQuoteItemSerializer(many=True)
+
+
+class MysteryCartelaRequestSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField()
+    cartela_template_id = serializers.IntegerField()
+    min_odd = serializers.FloatField(min_value=1.01)
+    max_odd = serializers.FloatField(min_value=1.01)
+    count = serializers.IntegerField(min_value=1, max_value=settings.MISTERIOSA_MAX_RESULTS, default=5)
+    
+    def validate(self, attrs):
+        if attrs["max_odd"] < attrs["min_odd"]:
+            raise serializers.ValidationError("max_odd deve ser maior ou igual a min_odd.")
+        return attrs
+
+
 class BetConfirmRequestSerializer(serializers.Serializer):
     cartela_id = serializers.IntegerField()
+    categoria = serializers.ChoiceField(choices=Bet.CATEGORIA_CHOICES, default="FUNDOS")
 
 
-class BetSerializer(serializers.ModelSerializer):
+class BetSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     cartela = serializers.PrimaryKeyRelatedField(read_only=True)
     event = serializers.SerializerMethodField()
     cartela_tipo = serializers.SerializerMethodField()
@@ -67,6 +122,7 @@ class BetSerializer(serializers.ModelSerializer):
             "event",
             "cartela_tipo",
             "stake",
+            "categoria",
             "odd_final",
             "potential_return",
             "is_won",
@@ -88,7 +144,7 @@ class BetSerializer(serializers.ModelSerializer):
         return obj.cartela.cartela_template.tipo
 
 
-class CartelaInstanceItemSerializer(serializers.ModelSerializer):
+class CartelaInstanceItemSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     selection = serializers.SerializerMethodField()
     
     class Meta:
@@ -105,9 +161,10 @@ class CartelaInstanceItemSerializer(serializers.ModelSerializer):
         }
 
 
-class CartelaInstanceDetailSerializer(serializers.ModelSerializer):
+class CartelaInstanceDetailSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     items = CartelaInstanceItemSerializer(many=True, read_only=True)
     event = serializers.SerializerMethodField()
+    snapshot_data = serializers.SerializerMethodField()
     cartela_template_nome = serializers.CharField(
         source="cartela_template.nome",
         read_only=True
@@ -125,11 +182,23 @@ class CartelaInstanceDetailSerializer(serializers.ModelSerializer):
             "premio_maximo",
             "stake",
             "snapshot_data",
+            "odds_snapshot",
             "created_at",
             "items",
         ]
         read_only_fields = ["user"]
     
+    def get_snapshot_data(self, obj):
+        # Cartelas novas não duplicam ids/odds em snapshot_data (as odds ficam
+        # em odds_snapshot); o formato antigo sai dos itens, já em prefetch.
+        if obj.snapshot_data:
+            return obj.snapshot_data
+        return {
+            "selection_ids": [item.market_selection_id for item in obj.items.all()],
+            "odd_final_raw": obj.odd_final,
+            "stake": str(obj.stake),
+        }
+    
     def get_event(self, obj):
         e = obj.event
         return {
@@ -1,143 +1,310 @@
+import random
 from datetime import timedelta
 from decimal import Decimal
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from . import liability, odds_cache, pricing, risk, template_rules
 from .models import (
-    Event, MarketSelection, CartelaTemplate, CartelaInstance,
+    CartelaInstance,
     CartelaInstanceItem, Bet, RiskExposureMetrics,
 )
 
 
-def _calculate_odd_final_basic(selections):
-    """
-    Versão simplificada: multiplica as odd_publicada de cada seleção.
-    
-    Aqui depois você pluga:
-    - odd_justa
-    - fator de correlação
-    - margem dinâmica
-    - ajustes do Risk Engine externo
-    """
-    odd = 1.0
-    for s in selections:
-        odd *= float(s.odd_publicada)
-    return odd
+# Validade da cotação: depois disso a cartela não pode mais ser confirmada
+# e é expirada pelo comando expirar_cartelas (ver expiry.py).
+QUOTE_TTL = timedelta(minutes=5)
+
+
+def _risk_exposure_shards():
+    return max(1, getattr(settings, "RISK_EXPOSURE_SHARDS", 1))
 
 
 def _update_risk_exposure(event, cartela_template, influencer, stake, potential_return):
     """
     Atualiza métricas de exposição de risco básicas.
-    Versão bem simples; depois você pode evoluir com mais lógica.
+    Um único INSERT ... ON CONFLICT DO UPDATE: cria a linha na primeira cotação
+    e incrementa no próprio banco nas seguintes (sem lost update).
+    
+    Com RISK_EXPOSURE_SHARDS > 1 cada incremento cai em um shard aleatório,
+    espalhando o lock de linha de eventos muito disputados; a leitura soma
+    os shards (ver get_risk_exposure).
     """
-    metrics, _ = RiskExposureMetrics.objects.get_or_create(
-        event=event,
-        cartela_template=cartela_template,
-        influencer=influencer,
-        defaults={
-            'volume_total': Decimal('0'),
-            'payout_maximo': Decimal('0'),
-        }
-    )
-    metrics.volume_total += Decimal(str(stake))
-    metrics.payout_maximo += Decimal(str(potential_return))
-    # margem_media pode ser calculada a partir das odds, por enquanto deixa 0 ou fixa
-    metrics.save(update_fields=["volume_total", "payout_maximo", "updated_at"])
+    qn = connection.ops.quote_name
+    table = qn(RiskExposureMetrics._meta.db_table)
+    sql = f"""
+        INSERT INTO {table} (
+            {qn('event_id')}, {qn('cartela_template_id')}, {qn('influencer_id')}, {qn('shard')},
+            {qn('volume_total')}, {qn('payout_maximo')}, {qn('margem_media')}, {qn('updated_at')}
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, 0, %s)
+        ON CONFLICT (
+            {qn('event_id')}, {qn('cartela_template_id')}, COALESCE({qn('influencer_id')}, 0), {qn('shard')}
+        )
+        DO UPDATE SET
+            {qn('volume_total')} = {table}.{qn('volume_total')} + EXCLUDED.{qn('volume_total')},
+            {qn('payout_maximo')} = {table}.{qn('payout_maximo')} + EXCLUDED.{qn('payout_maximo')},
+            {qn('updated_at')} = EXCLUDED.{qn('updated_at')}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            _pk(event),
+            _pk(cartela_template),
+            _pk(influencer),
+            random.randrange(_risk_exposure_shards()),
+            Decimal(str(stake)),
+            Decimal(str(potential_return)),
+            timezone.now(),
+        ])
 
 
-@transaction.atomic
-def generate_cartela_quote(user, event_id, cartela_template_id, selection_ids, stake):
+def get_risk_exposure(**filters):
     """
-    Cria CartelaInstance em estado APOSTA_PENDENTE e retorna odd_final + prêmio + validade.
+    Exposição consolidada por (evento, template, influenciador), somando os shards.
+    Aceita os mesmos filtros de RiskExposureMetrics (ex.: event_id=..., cartela_template=...).
     """
-    try:
-        event = Event.objects.get(id=event_id)
-    except Event.DoesNotExist:
-        raise ValidationError("Evento não encontrado.")
-    
-    try:
-        template = CartelaTemplate.objects.get(id=cartela_template_id, ativo=True)
-    except CartelaTemplate.DoesNotExist:
-        raise ValidationError("Template de cartela não encontrado ou inativo.")
-    
-    selections = list(
-        MarketSelection.objects.filter(
-            id__in=selection_ids,
-            event=event,
+    return (
+        RiskExposureMetrics.objects
+        .filter(**filters)
+        .values("event_id", "cartela_template_id", "influencer_id")
+        .annotate(
+            volume=Sum("volume_total"),
+            payout=Sum("payout_maximo"),
         )
+        .order_by()
     )
+
+
+def _pk(obj):
+    """Aceita instância ou id (ou None)"""
+    return getattr(obj, 'pk', obj)
+
+
+def _resolve_template_and_odds(event_id, cartela_template_id):
+    """Template e regras compiladas (template_rules) + odds do evento, ambos em cache"""
+    compiled = template_rules.load(cartela_template_id)
+    if compiled is None or not compiled[0].ativo:
+        raise ValidationError("Template de cartela não encontrado ou inativo.")
+    template, rules = compiled
+    
+    data = odds_cache.get_event_odds(event_id)
+    if data is None:
+        raise ValidationError("Evento não encontrado.")
+    return template, rules, data
+
+
+def _resolve_quote(event_id, cartela_template_id, selection_ids):
+    """
+    Etapa de leitura da cotação com orçamento fixo de queries: template
+    ativo com as regras compiladas + seleções do evento, lidas do cache de
+    odds (zero queries com os caches quentes).
+    """
+    template, rules, data = _resolve_template_and_odds(event_id, cartela_template_id)
     
+    selections = odds_cache.selections_from(event_id, data, selection_ids)
     if len(selections) != len(selection_ids):
         raise ValidationError("Uma ou mais seleções são inválidas para este evento.")
     
-    if "min_items" in template.config:
-        if len(selections) < template.config["min_items"]:
-            raise ValidationError("Cartela abaixo do mínimo de seleções.")
+    return template, rules, selections, data
+
+
+@transaction.atomic
+def generate_cartela_quote(user, event_id, cartela_template_id, selection_ids, stake):
+    """
+    Cria CartelaInstance em estado APOSTA_PENDENTE e retorna odd_final + prêmio + validade.
     
-    if "max_items" in template.config:
-        if len(selections) > template.config["max_items"]:
-            raise ValidationError("Cartela acima do máximo de seleções.")
+    Pipeline com número fixo de queries, independente do tamanho da cartela:
+    leitura do template (seleções vêm do cache de odds), 1 INSERT da cartela,
+    1 bulk_create dos itens e 1 upsert da exposição. As odds usadas ficam no
+    EventOddsSnapshot do evento (1 INSERT só na primeira cotação de cada
+    versão de odds). A odd final vem de pricing.py (prob_base + correlações
+    do esporte, estas lidas do banco só com o cache frio).
+    """
+    template, rules, selections, odds_data = _resolve_quote(event_id, cartela_template_id, selection_ids)
+    rules.validate(selections)
     
-    odd_final = _calculate_odd_final_basic(selections)
+    # Motor de risco em memória: sem query, O(seleções)
+    assessment = risk.engine.assess(event_id, template.influencer_id, selection_ids)
+    odd_final = pricing.price_quote(
+        event_id, odds_data, template, selection_ids, extra_margin=assessment.adjusted_margin,
+    )
     stake_dec = Decimal(str(stake))
-    potential_return = stake_dec * Decimal(str(odd_final))
+    max_stake = risk.max_stake(assessment, odd_final)
+    if stake_dec > max_stake:
+        raise ValidationError(f"Valor acima do limite de risco para esta cartela (máximo {max_stake}).")
+    potential_return = (stake_dec * Decimal(str(odd_final))).quantize(Decimal("0.01"))
     
-    # TODO: chamar Risk Engine para validar limites, ajustar margem, etc.
-    # Exemplo simplificado: sem travas de risco.
-    
-    valid_until = timezone.now() + timedelta(minutes=5)
+    valid_until = timezone.now() + QUOTE_TTL
     
     cartela = CartelaInstance.objects.create(
         user=user,
-        event=event,
+        event_id=event_id,
         cartela_template=template,
         status="APOSTA_PENDENTE",
         odd_final=odd_final,
         premio_maximo=potential_return,
         stake=stake_dec,
-        snapshot_data={
-            "selection_ids": selection_ids,
-            "odd_final_raw": odd_final,
-            "stake": str(stake),
-        },
+        odds_snapshot_id=odds_cache.store_snapshot(event_id, odds_data),
     )
     
-    for s in selections:
-        CartelaInstanceItem.objects.create(
+    CartelaInstanceItem.objects.bulk_create([
+        CartelaInstanceItem(
             cartela_instance=cartela,
             market_selection=s,
             odd_usada=float(s.odd_publicada),
         )
+        for s in selections
+    ])
     
     # Atualiza exposição básica
     _update_risk_exposure(
-        event=event,
+        event=event_id,
         cartela_template=template,
-        influencer=template.influencer,
+        influencer=template.influencer_id,
         stake=stake_dec,
         potential_return=potential_return,
     )
     
-    risk_flags = {
-        "limited": False,
-        "adjusted_margin": 0.0,  # depois você troca pelo valor real vindo do Risk Engine
+    transaction.on_commit(
+        lambda: risk.engine.record_quote(event_id, template.influencer_id, potential_return)
+    )
+    
+    return cartela, odd_final, potential_return, valid_until, _risk_flags(assessment, max_stake)
+
+
+def _risk_flags(assessment, max_stake):
+    # Limitada: margem ajustada ou algum limite abaixo do prêmio máximo por cartela
+    limited = (
+        assessment.adjusted_margin > 0
+        or assessment.max_payout < Decimal(settings.RISK_LIMITS["PAYOUT_PER_BET"])
+    )
+    return {
+        "limited": limited,
+        "adjusted_margin": assessment.adjusted_margin,
+        "max_stake": str(max_stake),
+        "utilization": round(assessment.utilization, 4),
     }
+
+
+def generate_cartela_quotes(user, event_id, cartela_template_id, selection_sets, stake, persist=False):
+    """
+    Cotação em lote: várias cartelas (listas de seleções) do mesmo evento e
+    template, com o mesmo stake.
+    
+    Template e odds do evento são lidos uma vez; a validação, o risco e o
+    preço de cada cartela rodam em memória (pricing.EventPricing.price_many).
+    Sem `persist` nada é gravado. Com `persist`, as cartelas válidas viram
+    CartelaInstances APOSTA_PENDENTE numa transação, com um bulk_create das
+    cartelas, um dos itens e um upsert da exposição para o lote inteiro.
     
-    return cartela, odd_final, potential_return, valid_until, risk_flags
+    Cartelas inválidas não abortam o lote: voltam com `error`. Retorna
+    (quotes, valid_until), com um dict por cartela na ordem de selection_sets;
+    valid_until é None quando nada foi persistido.
+    """
+    template, rules, odds_data = _resolve_template_and_odds(event_id, cartela_template_id)
+    by_id = {s["id"]: s for s in odds_data["selections"]}
+    stake_dec = Decimal(str(stake))
+    
+    quotes = []
+    valid = []
+    for selection_ids in selection_sets:
+        quote = {"selection_ids": list(selection_ids), "cartela_id": None, "error": None}
+        quotes.append(quote)
+        try:
+            if len(set(selection_ids)) != len(selection_ids) or any(i not in by_id for i in selection_ids):
+                raise ValidationError("Uma ou mais seleções são inválidas para este evento.")
+            rules.validate([by_id[i] for i in selection_ids])
+        except ValidationError as e:
+            quote["error"] = e.messages[0]
+            continue
+        quote["assessment"] = risk.engine.assess(event_id, template.influencer_id, selection_ids)
+        valid.append(quote)
+    
+    margin = pricing.template_margin(template)
+    odds = pricing.event_pricing(event_id, odds_data).price_many(
+        [q["selection_ids"] for q in valid],
+        [margin + q["assessment"].adjusted_margin for q in valid],
+    )
+    priced = []
+    for quote, odd_final in zip(valid, odds):
+        assessment = quote.pop("assessment")
+        if odd_final is None:
+            quote["error"] = "Cartela com probabilidade zero não pode ser cotada."
+            continue
+        max_stake = risk.max_stake(assessment, odd_final)
+        quote["odd_final"] = odd_final
+        quote["premio_maximo"] = (stake_dec * Decimal(str(odd_final))).quantize(Decimal("0.01"))
+        quote["risk_flags"] = _risk_flags(assessment, max_stake)
+        if stake_dec > max_stake:
+            quote["error"] = f"Valor acima do limite de risco para esta cartela (máximo {max_stake})."
+            continue
+        priced.append(quote)
+    
+    if not persist or not priced:
+        return quotes, None
+    
+    valid_until = timezone.now() + QUOTE_TTL
+    with transaction.atomic():
+        snapshot_id = odds_cache.store_snapshot(event_id, odds_data)
+        cartelas = CartelaInstance.objects.bulk_create([
+            CartelaInstance(
+                user=user,
+                event_id=event_id,
+                cartela_template=template,
+                status="APOSTA_PENDENTE",
+                odd_final=quote["odd_final"],
+                premio_maximo=quote["premio_maximo"],
+                stake=stake_dec,
+                odds_snapshot_id=snapshot_id,
+            )
+            for quote in priced
+        ])
+        CartelaInstanceItem.objects.bulk_create([
+            CartelaInstanceItem(
+                cartela_instance=cartela,
+                market_selection_id=selection_id,
+                odd_usada=float(by_id[selection_id]["odd_publicada"]),
+            )
+            for cartela, quote in zip(cartelas, priced)
+            for selection_id in quote["selection_ids"]
+        ])
+        
+        potential_return = sum((q["premio_maximo"] for q in priced), Decimal("0"))
+        _update_risk_exposure(
+            event=event_id,
+            cartela_template=template,
+            influencer=template.influencer_id,
+            stake=stake_dec * len(priced),
+            potential_return=potential_return,
+        )
+        transaction.on_commit(
+            lambda: risk.engine.record_quote(event_id, template.influencer_id, potential_return)
+        )
+    
+    for cartela, quote in zip(cartelas, priced):
+        quote["cartela_id"] = cartela.id
+    return quotes, valid_until
 
 
 @transaction.atomic
-def confirm_bet(user, cartela_id):
+def confirm_bet(user, cartela_id, categoria="FUNDOS"):
     """
     Confirma a aposta (Bet) ligada a uma CartelaInstance.
     - valida que a cartela pertence ao usuário
     - valida que ainda está em APOSTA_PENDENTE e não expirou
-    - TODO: chama serviço de carteira para debitar
+    - debita o stake da carteira (fundos ou pontos) com uma Transacao APOSTA,
+      na mesma transação do insert da Bet
     """
+    from app_cartela.services import debitar
+
     try:
-        cartela = CartelaInstance.objects.select_for_update().get(
-            id=cartela_id,
-            user=user
+        cartela = (
+            CartelaInstance.objects
+            .select_for_update(of=("self",))
+            .select_related("user__carteira", "event", "cartela_template")
+            .get(id=cartela_id, user=user)
         )
     except CartelaInstance.DoesNotExist:
         raise ValidationError("Cartela não encontrada para este usuário.")
@@ -146,21 +313,33 @@ def confirm_bet(user, cartela_id):
         raise ValidationError("Esta cartela não está em estado de aposta pendente.")
     
     # Validade simples baseada no created_at (ou usar valid_until no snapshot_data)
-    created_plus_5 = cartela.created_at + timedelta(minutes=5)
-    if timezone.now() > created_plus_5:
+    if timezone.now() > cartela.created_at + QUOTE_TTL:
         raise ValidationError("Cotação expirada. Gere uma nova cartela.")
     
     if cartela.stake <= 0:
         raise ValidationError("Valor da aposta (stake) inválido.")
     
-    # TODO: integrar com Wallet Service para:
-    # - verificar saldo
-    # - debitar saldo do usuário
-    # - registrar transação financeira
+    try:
+        carteira_id = cartela.user.carteira.id
+    except ObjectDoesNotExist:
+        raise ValidationError("Carteira não encontrada para este usuário.")
+    
+    # Débito condicional (saldo não fica negativo) + Transacao APOSTA
+    try:
+        debitar(
+            carteira_id,
+            categoria,
+            cartela.stake,
+            tipo="APOSTA",
+            descricao=f"Aposta da cartela #{cartela.id}",
+        )
+    except ValueError as e:
+        raise ValidationError(str(e))
     
     bet = Bet.objects.create(
         cartela=cartela,
         stake=cartela.stake,
+        categoria=categoria,
         odd_final=cartela.odd_final,
         potential_return=cartela.premio_maximo,
     )
@@ -169,5 +348,11 @@ def confirm_bet(user, cartela_id):
     cartela.locked_at = timezone.now()
     cartela.save(update_fields=["status", "locked_at"])
     
+    # Passivo por seleção: índice no banco e motor de risco
+    selection_ids = list(cartela.items.values_list("market_selection_id", flat=True))
+    liability.record_bet(cartela.event_id, selection_ids, bet.potential_return)
+    transaction.on_commit(
+        lambda: risk.engine.record_bet(cartela.event_id, selection_ids, bet.potential_return)
+    )
+    
     return bet
-
@@ -0,0 +1,144 @@
+import time
+from collections import namedtuple
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from . import liability, risk
+from .models import Event, CartelaInstance, CartelaInstanceItem, Bet
+
+
+SettlementResult = namedtuple(
+    "SettlementResult",
+    ["won", "lost", "paid_out", "failures", "duration"],
+)
+
+
+def _open_bets(event_id):
+    """Apostas confirmadas e ainda não liquidadas do evento"""
+    return Bet.objects.filter(
+        cartela__event_id=event_id,
+        cartela__status="APOSTA_CONFIRMADA",
+        is_won__isnull=True,
+    )
+
+
+def _is_lost(winning_selection_ids):
+    """
+    A cartela perde se qualquer quadrinho não estiver entre as seleções
+    vencedoras: todos os itens do evento são avaliados em uma única subquery.
+    Cartela sem itens também perde (não há o que acertar).
+    """
+    items = CartelaInstanceItem.objects.filter(cartela_instance_id=OuterRef("cartela_id"))
+    return Exists(items.exclude(market_selection_id__in=winning_selection_ids)) | ~Exists(items)
+
+
+def _settle_losers(event_id, winning_selection_ids, now):
+    """Perdedoras não mexem em carteira: dois UPDATEs set-based e pronto"""
+    with transaction.atomic():
+        lost = _open_bets(event_id).filter(
+            _is_lost(winning_selection_ids),
+        ).update(is_won=False, settled_at=now)
+        CartelaInstance.objects.filter(
+            event_id=event_id,
+            status="APOSTA_CONFIRMADA",
+            bet__is_won=False,
+            bet__settled_at=now,
+        ).update(status="SETTLED")
+    return lost
+
+
+def _settle_winners_chunk(event_id, winning_selection_ids, now, chunk_size, categoria, skip_ids):
+    """
+    Liquida até chunk_size apostas vencedoras em uma transação: credita os
+    GANHOs em lote e marca como ganhas só as apostas cujo crédito foi
+    aplicado. As demais seguem em aberto (is_won nulo) para a próxima
+    execução e entram em `skip_ids` para não voltarem nesta.
+    Retorna (apostas liquidadas, valor pago, falhas [(bet_id, erro)]).
+    """
+    from app_cartela.services import aplicar_creditos
+
+    with transaction.atomic():
+        chunk = list(
+            _open_bets(event_id)
+            .exclude(_is_lost(winning_selection_ids))
+            .exclude(id__in=skip_ids)
+            .select_for_update(of=("self",))
+            .order_by("id")
+            .values_list("id", "cartela_id", "cartela__user_id", "categoria", "potential_return")[:chunk_size]
+        )
+        if not chunk:
+            return 0, Decimal("0"), []
+
+        pagas = [c for c in chunk if c[4] > 0]
+        creditos = [
+            (user_id, categoria or bet_categoria, potential_return, "GANHO", f"Ganho da aposta #{bet_id}")
+            for bet_id, _, user_id, bet_categoria, potential_return in pagas
+        ]
+        _, failures = aplicar_creditos(creditos)
+        # aplicar_creditos indexa as falhas a partir de 1 na lista de créditos
+        failures = [(pagas[linha - 1][0], erro) for linha, erro in failures]
+        failed_ids = {bet_id for bet_id, _ in failures}
+        settled = [c for c in chunk if c[0] not in failed_ids]
+        skip_ids.update(failed_ids)
+
+        Bet.objects.filter(id__in=[c[0] for c in settled]).update(is_won=True, settled_at=now)
+        CartelaInstance.objects.filter(id__in=[c[1] for c in settled]).update(status="SETTLED")
+        paid = sum((c[4] for c in pagas if c[0] not in failed_ids), Decimal("0"))
+    return len(settled), paid, failures
+
+
+def settle_event(event_id, winning_selection_ids, chunk_size=2000, categoria=None):
+    """
+    Liquida todas as apostas confirmadas de um evento.
+
+    `winning_selection_ids` são as seleções (quadrinhos) que bateram; qualquer
+    outra seleção do evento é considerada perdida. A cartela ganha só se todos
+    os seus itens estão entre as vencedoras (cartela sem itens perde).
+
+    Perdedoras são liquidadas com UPDATEs únicos; vencedoras em chunks, cada
+    um com UPDATE das apostas/cartelas e crédito GANHO em lote na carteira.
+    O ganho volta para a categoria debitada na aposta (Bet.categoria), a
+    menos que `categoria` force FUNDOS ou PONTOS para todas. Vencedoras cujo
+    crédito falhou (ex.: carteira inexistente) não são liquidadas e voltam
+    em `failures` como (bet_id, erro); nesse caso o evento não é finalizado
+    e o passivo dele continua contando até uma execução sem falhas.
+    Reexecutar é seguro: só apostas com is_won nulo são processadas, então
+    uma nova execução tenta de novo as que falharam.
+    """
+    start = time.monotonic()
+    if not Event.objects.filter(id=event_id).exists():
+        raise ValidationError("Evento não encontrado.")
+
+    winning_selection_ids = list(winning_selection_ids)
+    now = timezone.now()
+
+    lost = _settle_losers(event_id, winning_selection_ids, now)
+
+    won = 0
+    paid_out = Decimal("0")
+    failures = []
+    skip_ids = set()
+    while True:
+        settled, paid, chunk_failures = _settle_winners_chunk(
+            event_id, winning_selection_ids, now, chunk_size, categoria, skip_ids,
+        )
+        if not settled and not chunk_failures:
+            break
+        won += settled
+        paid_out += paid
+        failures.extend(chunk_failures)
+
+    if not failures:
+        Event.objects.filter(id=event_id).exclude(status="FINISHED").update(status="FINISHED")
+        liability.release_event(event_id)
+        risk.engine.release_event(event_id)
+
+    return SettlementResult(
+        won=won,
+        lost=lost,
+        paid_out=paid_out,
+        failures=failures,
+        duration=time.monotonic() - start,
+    )
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import CartelaTemplate, CartelaTemplateItem, MarketSelection, SelectionCorrelation
+from .odds_cache import bump_event_version
+from . import live, pricing, template_rules
+
+
+@receiver(post_save, sender=MarketSelection)
+@receiver(post_delete, sender=MarketSelection)
+def invalidar_odds_do_evento(sender, instance, **kwargs):
+    """Invalida o cache de odds do evento e publica o delta no stream, depois do commit"""
+    event_id = instance.event_id
+    delta = live.selection_delta(instance, removed=kwargs["signal"] is post_delete)
+
+    def depois_do_commit():
+        bump_event_version(event_id)
+        live.publish(event_id, [delta])
+
+    transaction.on_commit(depois_do_commit)
+
+
+@receiver(post_save, sender=SelectionCorrelation)
+@receiver(post_delete, sender=SelectionCorrelation)
+def invalidar_correlacoes(sender, instance, **kwargs):
+    """Recarrega as correlações no próximo preço, depois do commit"""
+    transaction.on_commit(pricing.bump_correlations_version)
+
+
+@receiver(post_save, sender=CartelaTemplate)
+@receiver(post_delete, sender=CartelaTemplate)
+@receiver(post_save, sender=CartelaTemplateItem)
+@receiver(post_delete, sender=CartelaTemplateItem)
+def invalidar_regras_do_template(sender, instance, **kwargs):
+    """Recompila as regras do template na próxima cotação/listagem, depois do commit"""
+    template_id = instance.pk if sender is CartelaTemplate else instance.cartela_template_id
+    transaction.on_commit(lambda: template_rules.bump_template_version(template_id))
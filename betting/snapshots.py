@@ -0,0 +1,70 @@
+"""
+Snapshots de odds deduplicados por conteúdo (EventOddsSnapshot).
+
+O vetor de odds de um evento (todas as seleções, em ordem de id) é empacotado
+em arrays binários: int64 para os ids e float64 para odd_publicada e prob_base.
+O sha256 desses bytes, junto com o id do evento, é a chave do snapshot. Ele é
+calculado quando o cache de odds carrega o evento (odds_cache.py), uma vez por
+versão de odds. Por isso cotar não custa CPU extra.
+
+Na cotação, o snapshot é gravado só se ainda não foi visto, com um INSERT que
+ignora conflito (odds_cache.store_snapshot). A marca de "já gravado" fica no
+mesmo cache de odds. Milhares de cartelas de um jogo geram um snapshot por
+mudança de odds, não um por cartela.
+"""
+import hashlib
+import sys
+from array import array
+from .models import EventOddsSnapshot
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, data):
+    packed = array(typecode)
+    packed.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed
+
+
+def pack_selections(selections):
+    """(selection_ids, odds, probs) empacotados; `selections` são dicts de odds_cache"""
+    ordered = sorted(selections, key=lambda s: s["id"])
+    return (
+        _pack("q", [s["id"] for s in ordered]),
+        _pack("d", [s["odd_publicada"] for s in ordered]),
+        _pack("d", [s["prob_base"] for s in ordered]),
+    )
+
+
+def snapshot_hash(event_id, packed):
+    digest = hashlib.sha256(str(event_id).encode())
+    for part in packed:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def build_snapshot(event_id, selections):
+    packed = pack_selections(selections)
+    selection_ids, odds, probs = packed
+    return EventOddsSnapshot(
+        hash=snapshot_hash(event_id, packed),
+        event_id=event_id,
+        selection_ids=selection_ids,
+        odds=odds,
+        probs=probs,
+    )
+
+
+def unpack(snapshot):
+    """{selection_id: (odd_publicada, prob_base)} de um EventOddsSnapshot"""
+    ids = _unpack("q", snapshot.selection_ids)
+    odds = _unpack("d", snapshot.odds)
+    probs = _unpack("d", snapshot.probs)
+    return {selection_id: (odd, prob) for selection_id, odd, prob in zip(ids, odds, probs)}
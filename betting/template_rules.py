@@ -0,0 +1,199 @@
+"""
+Regras de template (CartelaTemplate.config + CartelaTemplateItem) compiladas.
+
+O template e os seus itens viram um TemplateRules, que serve a cotação
+(validate) e a listagem de seleções (allows/filter_selections, sobre os dicts
+do cache de odds; q para filtrar um QuerySet de MarketSelection).
+
+Regras de template.config:
+
+- min_items / max_items: tamanho da cartela;
+- live_only: só seleções ao vivo (padrão: ligado para LIVE e TURBO);
+- min_odd / max_odd: faixa de odd_publicada de cada seleção;
+- max_per_type: máximo de seleções do mesmo selection_type.
+
+Sem itens, qualquer selection_type é aceito. Com itens, só os tipos listados
+(allowed_selection_type), cada um com as restrições do seu `constraints`:
+min_odd, max_odd e live_only (por seleção, somadas às do template), params
+({"line": 2.5} ou {"line": [1.5, 2.5]}: valor exato ou um dos valores) e
+min_items / max_items (quantas seleções do tipo a cartela deve ter).
+
+A compilação lê o template e os itens do banco uma vez por versão do template
+(contador no cache de odds, incrementado pelos signals de CartelaTemplate e
+CartelaTemplateItem) e fica em memória no processo, como em pricing.py.
+"""
+import threading
+from collections import Counter, OrderedDict
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from . import odds_cache
+from .models import CartelaTemplate
+
+
+LIVE_TIPOS = ("LIVE", "TURBO")
+
+# Templates compilados mantidos em memória por processo
+MAX_CACHED_TEMPLATES = 512
+
+
+def _field(selection, name):
+    """Lê um campo de um dict do cache de odds ou de uma MarketSelection"""
+    return selection[name] if isinstance(selection, dict) else getattr(selection, name)
+
+
+class _SelectionRule:
+    """Restrições por seleção: faixa de odd, ao vivo e params"""
+
+    def __init__(self, constraints):
+        self.min_odd = _optional(constraints, "min_odd", float)
+        self.max_odd = _optional(constraints, "max_odd", float)
+        self.live_only = bool(constraints.get("live_only", False))
+        self.params = {
+            key: tuple(value) if isinstance(value, list) else (value,)
+            for key, value in (constraints.get("params") or {}).items()
+        }
+
+    def allows(self, selection):
+        odd = _field(selection, "odd_publicada")
+        if self.min_odd is not None and odd < self.min_odd:
+            return False
+        if self.max_odd is not None and odd > self.max_odd:
+            return False
+        if self.live_only and not _field(selection, "is_live"):
+            return False
+        if self.params:
+            params = _field(selection, "params") or {}
+            return all(params.get(key) in values for key, values in self.params.items())
+        return True
+
+    def q(self):
+        q = Q()
+        if self.min_odd is not None:
+            q &= Q(odd_publicada__gte=self.min_odd)
+        if self.max_odd is not None:
+            q &= Q(odd_publicada__lte=self.max_odd)
+        if self.live_only:
+            q &= Q(is_live=True)
+        for key, values in self.params.items():
+            q &= Q(**{f"params__{key}__in": values}) if len(values) > 1 else Q(**{f"params__{key}": values[0]})
+        return q
+
+
+def _optional(mapping, key, cast):
+    value = mapping.get(key)
+    return None if value is None else cast(value)
+
+
+class TemplateRules:
+    """Validador e filtro de seleções de um template, compilado de config + itens"""
+
+    def __init__(self, template, items):
+        config = template.config or {}
+        self.min_items = _optional(config, "min_items", int)
+        self.max_items = _optional(config, "max_items", int)
+        self.max_per_type = _optional(config, "max_per_type", int)
+        self.base = _SelectionRule({
+            "min_odd": config.get("min_odd"),
+            "max_odd": config.get("max_odd"),
+            "live_only": config.get("live_only", template.tipo in LIVE_TIPOS),
+        })
+        # None: todos os tipos; senão {tipo: (regra, min_items, max_items)}
+        self.types = None
+        if items:
+            self.types = {
+                item.allowed_selection_type: (
+                    _SelectionRule(item.constraints or {}),
+                    _optional(item.constraints or {}, "min_items", int),
+                    _optional(item.constraints or {}, "max_items", int),
+                )
+                for item in items
+            }
+
+    def allows(self, selection):
+        if not self.base.allows(selection):
+            return False
+        if self.types is None:
+            return True
+        rule = self.types.get(_field(selection, "selection_type"))
+        return rule is not None and rule[0].allows(selection)
+
+    def filter_selections(self, selections):
+        return [s for s in selections if self.allows(s)]
+
+    @property
+    def q(self):
+        """Q equivalente a allows() para MarketSelection.objects.filter"""
+        q = self.base.q()
+        if self.types is not None:
+            allowed = Q(pk__in=[])
+            for selection_type, (rule, _, _) in self.types.items():
+                allowed |= Q(selection_type=selection_type) & rule.q()
+            q &= allowed
+        return q
+
+    def validate(self, selections):
+        """ValidationError se a cartela com estas seleções viola alguma regra"""
+        if self.min_items is not None and len(selections) < self.min_items:
+            raise ValidationError("Cartela abaixo do mínimo de seleções.")
+        if self.max_items is not None and len(selections) > self.max_items:
+            raise ValidationError("Cartela acima do máximo de seleções.")
+
+        for selection in selections:
+            if not self.allows(selection):
+                raise ValidationError(
+                    f"Seleção {_field(selection, 'id')} não é permitida neste template."
+                )
+
+        per_type = Counter(_field(s, "selection_type") for s in selections)
+        if self.max_per_type is not None:
+            for selection_type, count in per_type.items():
+                if count > self.max_per_type:
+                    raise ValidationError(f"Máximo de {self.max_per_type} seleções do tipo {selection_type}.")
+        if self.types is not None:
+            for selection_type, (_, min_items, max_items) in self.types.items():
+                count = per_type.get(selection_type, 0)
+                if min_items is not None and count < min_items:
+                    raise ValidationError(f"Mínimo de {min_items} seleções do tipo {selection_type}.")
+                if max_items is not None and count > max_items:
+                    raise ValidationError(f"Máximo de {max_items} seleções do tipo {selection_type}.")
+
+
+def _version_key(template_id):
+    return f"template_rules:{template_id}:version"
+
+
+def bump_template_version(template_id):
+    odds_cache.bump_version(_version_key(template_id))
+
+
+_lock = threading.Lock()
+_compiled = OrderedDict()
+
+
+def load(template_id):
+    """
+    (template, TemplateRules) em cache por versão, ou None se o template não
+    existe. Template e itens são lidos só na compilação: com o cache quente,
+    nenhuma query.
+    """
+    key = (template_id, odds_cache.get_version(_version_key(template_id)))
+    with _lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+
+    template = CartelaTemplate.objects.filter(id=template_id).first()
+    if template is None:
+        return None
+    compiled = (template, TemplateRules(template, list(template.items.all())))
+    with _lock:
+        _compiled[key] = compiled
+        while len(_compiled) > MAX_CACHED_TEMPLATES:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def clear():
+    with _lock:
+        _compiled.clear()
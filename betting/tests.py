@@ -1,3 +1,950 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import json
+import math
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from app_cartela.models import Carteira, Transacao
+from .models import (
+    Event, Influencer, MarketSelection, CartelaTemplate, CartelaTemplateItem, CartelaInstance, CartelaInstanceItem,
+    RiskExposureMetrics, Bet, EventOddsSnapshot, SelectionCorrelation, SelectionLiability,
+)
+from . import benchmark, liability, live, misteriosa, odds_cache, pricing, risk, snapshots, template_rules
+from .archive import archive_cartelas
+from .expiry import expire_stale_quotes
+from .ingestion import ingest_odds
+from .services import QUOTE_TTL, confirm_bet, generate_cartela_quote, get_risk_exposure
+from .settlement import settle_event
 
-# Create your tests here.
+
+class GenerateCartelaQuoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        cls.template = CartelaTemplate.objects.create(
+            nome="Cartela do Jogo",
+            tipo="PRE_MATCH",
+            config={"min_items": 1, "max_items": 20},
+        )
+        cls.selections = MarketSelection.objects.bulk_create([
+            MarketSelection(
+                event=cls.event,
+                selection_type="TOTAL_GOALS_OVER",
+                params={"line": i + 0.5},
+                prob_base=0.5,
+                odd_justa=2.0,
+                odd_publicada=1.9,
+            )
+            for i in range(12)
+        ])
+
+    def setUp(self):
+        odds_cache.clear()
+
+    def _quote(self, n_selections):
+        return generate_cartela_quote(
+            user=self.user,
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=[s.id for s in self.selections[:n_selections]],
+            stake=Decimal("10.00"),
+        )
+
+    def test_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as small:
+            self._quote(2)
+        odds_cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self._quote(12)
+        self.assertEqual(len(small), len(large))
+        # savepoint + template + itens do template + evento + seleções
+        # + correlações + snapshot + cartela + itens + exposição + release
+        self.assertLessEqual(len(large), 11)
+
+    def test_warm_odds_cache_skips_selection_queries(self):
+        with CaptureQueriesContext(connection) as cold, self.captureOnCommitCallbacks(execute=True):
+            self._quote(3)
+        with CaptureQueriesContext(connection) as warm:
+            self._quote(3)
+        # template + itens do template + evento + seleções + correlações
+        # + snapshot de odds só na primeira cotação
+        self.assertEqual(len(warm), len(cold) - 6)
+
+    def test_selection_save_invalidates_cached_odds(self):
+        self._quote(2)
+        selection = self.selections[0]
+        selection.prob_base = 0.25
+        with self.captureOnCommitCallbacks(execute=True):
+            selection.save()
+
+        _, odd_final, _, _, _ = self._quote(1)
+        self.assertAlmostEqual(odd_final, 4.0 / (1 + pricing.template_margin(self.template)))
+
+    def test_quotes_share_one_snapshot_per_odds_version(self):
+        first = self._quote(2)[0]
+        second = self._quote(5)[0]
+        selection = self.selections[0]
+        selection.odd_publicada = 2.5
+        with self.captureOnCommitCallbacks(execute=True):
+            selection.save()
+        third = self._quote(2)[0]
+
+        self.assertEqual(first.odds_snapshot_id, second.odds_snapshot_id)
+        self.assertNotEqual(first.odds_snapshot_id, third.odds_snapshot_id)
+        self.assertEqual(EventOddsSnapshot.objects.count(), 2)
+        odds = snapshots.unpack(third.odds_snapshot)
+        self.assertEqual(len(odds), 12)
+        self.assertEqual(odds[selection.id], (2.5, 0.5))
+
+    def test_rolled_back_quote_does_not_mark_snapshot_as_stored(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self._quote(2)
+                raise RuntimeError("rollback")
+        self.assertFalse(EventOddsSnapshot.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cartela = self._quote(2)[0]
+        self.assertTrue(EventOddsSnapshot.objects.filter(hash=cartela.odds_snapshot_id).exists())
+
+    def test_correlated_selections_are_priced_together(self):
+        SelectionCorrelation.objects.create(
+            sport="SOCCER",
+            selection_type_a="TOTAL_GOALS_OVER",
+            selection_type_b="TOTAL_GOALS_OVER",
+            factor=1.5,
+        )
+        margin = pricing.template_margin(self.template)
+
+        _, odd_final, _, _, _ = self._quote(2)
+
+        self.assertAlmostEqual(odd_final, 1 / (0.25 * 1.5 * (1 + margin)))
+        data = odds_cache.get_event_odds(self.event.id)
+        engine = pricing.event_pricing(self.event.id, data)
+        combos = engine.price_combinations([s.id for s in self.selections[:4]], 3, margin)
+        self.assertEqual(len(combos), 4)
+        for ids, odd in combos:
+            self.assertAlmostEqual(odd, engine.price(ids, margin))
+        self.assertAlmostEqual(combos[0][1], 1 / (0.5 ** 3 * 1.5 ** 3 * (1 + margin)))
+
+    def test_quote_creates_items_and_accumulates_exposure(self):
+        cartela, odd_final, potential_return, _, _ = self._quote(3)
+        self._quote(2)
+
+        self.assertEqual(CartelaInstanceItem.objects.filter(cartela_instance=cartela).count(), 3)
+        self.assertAlmostEqual(odd_final, 1 / (0.5 ** 3 * (1 + pricing.template_margin(self.template))))
+        metrics = RiskExposureMetrics.objects.get(event=self.event, cartela_template=self.template)
+        self.assertEqual(metrics.volume_total, Decimal("20.00"))
+
+    def test_batch_quote_prices_in_memory_and_persists_on_request(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = [s.id for s in self.selections]
+        payload = {
+            "event_id": self.event.id,
+            "cartela_template_id": self.template.id,
+            "selection_sets": [ids[:2], ids[2:5], ids[:1] + [0]],
+            "stake": "10.00",
+        }
+        url = reverse("betting:cartela-quote-batch")
+
+        with CaptureQueriesContext(connection) as priced:
+            response = client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(q["sql"].startswith(("INSERT", "UPDATE")) for q in priced))
+        quotes = response.json()["quotes"]
+        margin = pricing.template_margin(self.template)
+        self.assertAlmostEqual(quotes[0]["odd_final"], 1 / (0.25 * (1 + margin)))
+        self.assertAlmostEqual(quotes[1]["odd_final"], 1 / (0.125 * (1 + margin)))
+        self.assertIn("inválidas", quotes[2]["error"])
+        self.assertFalse(CartelaInstance.objects.exists())
+
+        response = client.post(url, {**payload, "persist": True}, format="json")
+        self.assertEqual(response.status_code, 201)
+        cartela_ids = [q["cartela_id"] for q in response.json()["quotes"]]
+        self.assertIsNone(cartela_ids[2])
+        self.assertEqual(CartelaInstanceItem.objects.filter(cartela_instance_id__in=cartela_ids[:2]).count(), 5)
+        metrics = RiskExposureMetrics.objects.get(event=self.event, cartela_template=self.template)
+        self.assertEqual(metrics.volume_total, Decimal("20.00"))
+
+    def test_expiry_releases_exposure_of_stale_quotes(self):
+        stale = [self._quote(2)[0] for _ in range(3)]
+        fresh, _, _, _, _ = self._quote(2)
+        CartelaInstance.objects.filter(id__in=[c.id for c in stale]).update(
+            created_at=timezone.now() - QUOTE_TTL - timedelta(seconds=1),
+        )
+
+        result = expire_stale_quotes(batch_size=2)
+
+        self.assertEqual((result.expired, result.batches), (3, 2))
+        self.assertEqual(
+            set(CartelaInstance.objects.filter(status="EXPIRADA").values_list("id", flat=True)),
+            {c.id for c in stale},
+        )
+        (exposure,) = get_risk_exposure(event=self.event)
+        self.assertEqual(exposure["volume"], fresh.stake)
+        self.assertEqual(exposure["payout"], fresh.premio_maximo)
+
+    @override_settings(RISK_EXPOSURE_SHARDS=4)
+    def test_sharded_exposure_is_summed_on_read(self):
+        for _ in range(10):
+            self._quote(2)
+
+        self.assertLessEqual(RiskExposureMetrics.objects.filter(event=self.event).count(), 4)
+        (exposure,) = get_risk_exposure(event=self.event)
+        self.assertEqual(exposure["volume"], Decimal("100.00"))
+
+
+class EventPricingTests(TestCase):
+    selections = [
+        {"id": 1, "selection_type": "TOTAL_GOALS_OVER", "prob_base": 0.5},
+        {"id": 2, "selection_type": "TOTAL_GOALS_OVER", "prob_base": 0.4},
+        {"id": 3, "selection_type": "BOTH_TEAMS_TO_SCORE", "prob_base": 0.6},
+        {"id": 4, "selection_type": "MATCH_RESULT", "prob_base": 0.25},
+        {"id": 5, "selection_type": "MATCH_RESULT", "prob_base": 0.0},
+    ]
+    correlations = {
+        ("TOTAL_GOALS_OVER", "BOTH_TEAMS_TO_SCORE"): math.log(1.3),
+        ("MATCH_RESULT", "MATCH_RESULT"): -math.inf,
+    }
+
+    def _prices(self):
+        engine = pricing.EventPricing(self.selections, self.correlations)
+        return (
+            [engine.price(ids, 0.1) for ids in ([1, 3], [1, 2, 3], [3, 4])],
+            engine.price_many([[1, 3], [4, 5], [1, 2, 3, 4]], [0.1, 0.1, 0.2]),
+            engine.price_combinations([1, 2, 3, 4], 3, 0.1),
+        )
+
+    def test_numpy_and_pure_python_paths_agree(self):
+        self.assertIsNotNone(pricing.np)
+        vectorized = self._prices()
+        with mock.patch.object(pricing, "np", None):
+            fallback = self._prices()
+
+        self.assertAlmostEqual(vectorized[0][0], 1 / (0.5 * 0.6 * 1.3 * 1.1))
+        self.assertEqual(vectorized[1][1], None)  # probabilidade zero
+        self.assertEqual(fallback[1][1], None)
+        self.assertEqual([ids for ids, _ in vectorized[2]], [ids for ids, _ in fallback[2]])
+        for got, expected in zip(
+            vectorized[0] + [vectorized[1][0], vectorized[1][2]] + [odd for _, odd in vectorized[2]],
+            fallback[0] + [fallback[1][0], fallback[1][2]] + [odd for _, odd in fallback[2]],
+        ):
+            self.assertAlmostEqual(got, expected)
+
+
+class ConfirmBetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.user.carteira.adicionar_fundos(Decimal("25.00"))
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        cls.template = CartelaTemplate.objects.create(
+            nome="Cartela do Jogo",
+            tipo="PRE_MATCH",
+            config={"min_items": 1, "max_items": 5},
+        )
+        cls.selection = MarketSelection.objects.create(
+            event=cls.event,
+            selection_type="TOTAL_GOALS_OVER",
+            params={"line": 2.5},
+            prob_base=0.5,
+            odd_justa=2.0,
+            odd_publicada=1.9,
+        )
+
+    def setUp(self):
+        odds_cache.clear()
+        risk.engine.reset()
+
+    def _quote(self, stake="10.00"):
+        cartela, _, _, _, _ = generate_cartela_quote(
+            user=self.user,
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=[self.selection.id],
+            stake=Decimal(stake),
+        )
+        return cartela
+
+    def test_confirm_debits_wallet_with_aposta_transaction(self):
+        cartela = self._quote()
+        bet = confirm_bet(self.user, cartela.id)
+
+        self.user.carteira.refresh_from_db()
+        self.assertEqual(self.user.carteira.fundos, Decimal("15.00"))
+        self.assertEqual(bet.categoria, "FUNDOS")
+        transacao = Transacao.objects.get(carteira=self.user.carteira, tipo="APOSTA")
+        self.assertEqual(transacao.valor, Decimal("-10.00"))
+
+    @override_settings(RISK_LIMITS={"EVENT": 10000, "SELECTION": 30, "INFLUENCER": 10000, "PAYOUT_PER_BET": 1000})
+    def test_selection_liability_limits_next_quotes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bet = confirm_bet(self.user, self._quote(stake="10.00").id)
+        self.assertEqual(risk.engine.liability(self.event.id, selection_id=self.selection.id), Decimal("19.05"))
+
+        # Restam 30 - 19.05 de passivo na seleção: stake máximo 10.95 / odd
+        with self.assertRaisesMessage(ValidationError, "limite de risco"):
+            self._quote(stake="6.00")
+        _, _, _, _, risk_flags = generate_cartela_quote(
+            user=self.user,
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=[self.selection.id],
+            stake=Decimal("5.00"),
+        )
+        self.assertEqual((risk_flags["limited"], risk_flags["max_stake"]), (True, "5.74"))
+
+        risk.engine.reset()
+        risk.engine.warm()
+        self.assertEqual(risk.engine.liability(self.event.id, selection_id=self.selection.id), bet.potential_return)
+
+    @override_settings(RISK_LIMITS={"EVENT": 10000, "SELECTION": 0, "INFLUENCER": 10000, "PAYOUT_PER_BET": 1000})
+    def test_zero_limit_means_no_capacity(self):
+        assessment = risk.engine.assess(self.event.id, None, [self.selection.id])
+
+        self.assertEqual((assessment.max_payout, assessment.utilization), (Decimal("0"), 1.0))
+        with self.assertRaisesMessage(ValidationError, "limite de risco"):
+            self._quote(stake="1.00")
+
+    def test_liability_index_is_incremented_and_released(self):
+        bets = [confirm_bet(self.user, self._quote(stake="5.00").id) for _ in range(2)]
+        row = SelectionLiability.objects.get(market_selection=self.selection)
+        self.assertEqual((row.liability, row.bets), (sum(b.potential_return for b in bets), 2))
+
+        staff = User.objects.create_user("trader", "trader@cartela.bet", "senha-segura", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        response = client.get(reverse("betting:event-liability", args=[self.event.id]), {"limit": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["selections"][0]["selection"]["id"], self.selection.id)
+
+        SelectionLiability.objects.all().delete()
+        self.assertEqual(liability.rebuild(self.event.id), 1)
+        self.assertEqual(SelectionLiability.objects.get(market_selection=self.selection).liability, row.liability)
+
+        settle_event(self.event.id, [])
+        self.assertFalse(SelectionLiability.objects.filter(event=self.event).exists())
+
+    def test_insufficient_funds_creates_no_bet(self):
+        cartela = self._quote(stake="30.00")
+        with self.assertRaisesMessage(ValidationError, "Fundos insuficientes"):
+            confirm_bet(self.user, cartela.id)
+
+        self.assertFalse(Bet.objects.filter(cartela=cartela).exists())
+        cartela.refresh_from_db()
+        self.assertEqual(cartela.status, "APOSTA_PENDENTE")
+
+    def test_idempotent_retry_returns_stored_response(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cartela = self._quote()
+        url = reverse("betting:bet-confirm")
+
+        first = client.post(url, {"cartela_id": cartela.id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        with CaptureQueriesContext(connection) as retry_queries:
+            retry = client.post(url, {"cartela_id": cartela.id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(any("FOR UPDATE" in q["sql"] for q in retry_queries))
+        self.assertEqual(Transacao.objects.filter(tipo="APOSTA").count(), 1)
+
+    def test_archived_bets_are_still_listed(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        old = confirm_bet(self.user, self._quote(stake="5.00").id)
+        recent = confirm_bet(self.user, self._quote(stake="5.00").id)
+        CartelaInstance.objects.filter(id=old.cartela_id).update(
+            status="SETTLED", created_at=timezone.now() - timedelta(days=400),
+        )
+
+        result = archive_cartelas(older_than_days=180)
+
+        self.assertEqual(result.movidas, 1)
+        self.assertFalse(Bet.objects.filter(id=old.id).exists())
+        bets = client.get(reverse("betting:bets-my")).json()["results"]
+        self.assertEqual([b["id"] for b in bets], [recent.id, old.id])
+        detail = client.get(reverse("betting:cartela-detail", args=[old.cartela_id]))
+        self.assertEqual(len(detail.json()["items"]), 1)
+
+    def test_idempotency_key_is_not_stored_when_confirm_fails_transiently(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cartela = self._quote()
+        url = reverse("betting:bet-confirm")
+
+        with mock.patch("betting.views.confirm_bet", side_effect=OperationalError("deadlock detected")):
+            with self.assertRaises(OperationalError):
+                client.post(url, {"cartela_id": cartela.id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        retry = client.post(url, {"cartela_id": cartela.id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertFalse(retry.has_header("Idempotent-Replayed"))
+        self.assertEqual(Bet.objects.filter(cartela=cartela).count(), 1)
+
+    def test_idempotency_key_reused_with_other_payload(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("betting:bet-confirm")
+
+        client.post(url, {"cartela_id": self._quote().id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        response = client.post(url, {"cartela_id": self._quote().id}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+
+        self.assertEqual(response.status_code, 422)
+
+
+class SettlementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        cls.template = CartelaTemplate.objects.create(
+            nome="Cartela do Jogo",
+            tipo="PRE_MATCH",
+            config={"min_items": 1, "max_items": 5},
+        )
+        cls.home, cls.away = [
+            MarketSelection.objects.create(
+                event=cls.event,
+                selection_type="TEAM_TO_SCORE",
+                params={"team": team},
+                prob_base=0.5,
+                odd_justa=2.0,
+                odd_publicada=1.9,
+            )
+            for team in ("home", "away")
+        ]
+
+    def setUp(self):
+        odds_cache.clear()
+        template_rules.clear()
+        risk.engine.reset()
+
+    def _bet(self, username, selection):
+        user = User.objects.create_user(username, f"{username}@cartela.bet", "senha-segura")
+        user.carteira.adicionar_fundos(Decimal("10.00"))
+        cartela, _, _, _, _ = generate_cartela_quote(
+            user=user,
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=[selection.id],
+            stake=Decimal("10.00"),
+        )
+        return user, confirm_bet(user, cartela.id)
+
+    def test_winners_are_paid_and_losers_settled(self):
+        winner, won_bet = self._bet("vencedor", self.home)
+        _, lost_bet = self._bet("perdedor", self.away)
+
+        result = settle_event(self.event.id, [self.home.id])
+
+        self.assertEqual((result.won, result.lost, result.failures), (1, 1, []))
+        self.assertEqual(result.paid_out, won_bet.potential_return)
+        won_bet.refresh_from_db()
+        lost_bet.refresh_from_db()
+        self.assertEqual((won_bet.is_won, lost_bet.is_won), (True, False))
+        self.assertEqual(CartelaInstance.objects.filter(status="SETTLED").count(), 2)
+        winner.carteira.refresh_from_db()
+        self.assertEqual(winner.carteira.fundos, won_bet.potential_return)
+        self.assertTrue(Transacao.objects.filter(carteira=winner.carteira, tipo="GANHO").exists())
+
+        rerun = settle_event(self.event.id, [self.home.id])
+        self.assertEqual((rerun.won, rerun.lost, rerun.paid_out), (0, 0, Decimal("0")))
+        self.assertEqual(Transacao.objects.filter(tipo="GANHO").count(), 1)
+
+    def test_failed_credit_leaves_bet_open_for_rerun(self):
+        _, paid_bet = self._bet("vencedor", self.home)
+        orphan, orphan_bet = self._bet("sem-carteira", self.home)
+        orphan.carteira.delete()
+
+        result = settle_event(self.event.id, [self.home.id], chunk_size=1)
+
+        self.assertEqual(result.won, 1)
+        self.assertEqual(result.paid_out, paid_bet.potential_return)
+        self.assertEqual([bet_id for bet_id, _ in result.failures], [orphan_bet.id])
+        orphan_bet.refresh_from_db()
+        self.assertIsNone(orphan_bet.is_won)
+        self.assertEqual(orphan_bet.cartela.status, "APOSTA_CONFIRMADA")
+        # Com falhas o evento segue aberto e o passivo continua contando
+        self.event.refresh_from_db()
+        self.assertNotEqual(self.event.status, "FINISHED")
+        self.assertTrue(SelectionLiability.objects.filter(event=self.event).exists())
+
+        Carteira.objects.create(usuario=orphan)
+        rerun = settle_event(self.event.id, [self.home.id])
+        self.assertEqual((rerun.won, rerun.failures), (1, []))
+        self.assertEqual(rerun.paid_out, orphan_bet.potential_return)
+        orphan_bet.refresh_from_db()
+        self.assertTrue(orphan_bet.is_won)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.status, "FINISHED")
+        self.assertFalse(SelectionLiability.objects.filter(event=self.event).exists())
+
+    def test_cartela_without_items_loses(self):
+        user, bet = self._bet("vazia", self.home)
+        CartelaInstanceItem.objects.filter(cartela_instance_id=bet.cartela_id).delete()
+
+        result = settle_event(self.event.id, [self.home.id])
+
+        self.assertEqual((result.won, result.lost, result.paid_out), (0, 1, Decimal("0")))
+        bet.refresh_from_db()
+        self.assertIs(bet.is_won, False)
+        self.assertFalse(Transacao.objects.filter(carteira=user.carteira, tipo="GANHO").exists())
+
+    def test_settlement_releases_influencer_exposure(self):
+        owner = User.objects.create_user("influencer", "influencer@cartela.bet", "senha-segura")
+        influencer = Influencer.objects.create(user=owner, display_name="Influencer")
+        self.template.influencer = influencer
+        self.template.save()
+        other_event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Santos",
+            team_away="Corinthians",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        other = MarketSelection.objects.create(
+            event=other_event,
+            selection_type="TEAM_TO_SCORE",
+            params={"team": "home"},
+            prob_base=0.5,
+            odd_justa=2.0,
+            odd_publicada=1.9,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            _, bet = self._bet("vencedor", self.home)
+            user = User.objects.create_user("outro", "outro@cartela.bet", "senha-segura")
+            _, _, other_return, _, _ = generate_cartela_quote(
+                user=user,
+                event_id=other_event.id,
+                cartela_template_id=self.template.id,
+                selection_ids=[other.id],
+                stake=Decimal("10.00"),
+            )
+        self.assertEqual(
+            risk.engine.liability(influencer_id=influencer.id),
+            bet.potential_return + other_return,
+        )
+
+        settle_event(self.event.id, [self.home.id])
+
+        self.assertEqual(risk.engine.liability(influencer_id=influencer.id), other_return)
+        # Expiração tardia de uma cotação do evento liquidado não desconta de novo
+        risk.engine.record_quote(self.event.id, influencer.id, -bet.potential_return)
+        self.assertEqual(risk.engine.liability(influencer_id=influencer.id), other_return)
+        self.assertEqual(risk.engine.liability(self.event.id), Decimal("0"))
+
+
+class OddsStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now(),
+            status="LIVE",
+        )
+        cls.selection = MarketSelection.objects.create(
+            event=cls.event,
+            selection_type="TOTAL_GOALS_OVER",
+            params={"line": 2.5},
+            prob_base=0.5,
+            odd_justa=2.0,
+            odd_publicada=1.9,
+            is_live=True,
+        )
+
+    def setUp(self):
+        odds_cache.clear()
+
+    def test_selection_save_publishes_delta_after_commit(self):
+        self.selection.odd_publicada = 2.4
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.selection.save()
+
+        async def listen():
+            with live.hub.subscribe(self.event.id) as subscription:
+                for callback in callbacks:
+                    callback()
+                return await subscription.receive(timeout=1)
+
+        (delta,) = asyncio.run(listen())
+        self.assertEqual((delta["id"], delta["odd_publicada"]), (self.selection.id, 2.4))
+        self.assertEqual(live.hub.subscriber_count(), 0)
+
+    async def test_stream_sends_snapshot_then_deltas(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("betting:cartela-selections-stream", args=[self.event.id])
+        response = await self.async_client.get(url)
+        chunks = aiter(response.streaming_content)
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        await anext(chunks)  # retry
+        snapshot = (await anext(chunks)).decode()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+
+        delta = dict(live.selection_delta(self.selection), odd_publicada=3.1)
+        live.publish(self.event.id, [delta])
+        event, data = (await anext(chunks)).decode().split("\n")[:2]
+        await chunks.aclose()
+
+        self.assertEqual(event, "event: odds")
+        self.assertEqual(json.loads(data.removeprefix("data: "))["selections"], [delta])
+
+
+    async def test_stream_accepts_api_token(self):
+        token = await Token.objects.acreate(user=self.user)
+        url = reverse("betting:cartela-selections-stream", args=[self.event.id])
+
+        denied = await self.async_client.get(url, headers={"Authorization": "Token invalido"})
+        response = await self.async_client.get(url, headers={"Authorization": f"Token {token.key}"})
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)  # retry
+        snapshot = (await anext(chunks)).decode()
+        await chunks.aclose()
+
+        self.assertEqual(denied.status_code, 403)
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+
+    @override_settings(ODDS_STREAM_BROKER="127.0.0.1:9")
+    def test_publish_does_not_wait_for_broker(self):
+        broker_down = threading.Event()
+
+        def connect(*args, **kwargs):
+            broker_down.wait(5)
+            raise ConnectionRefusedError
+
+        delta = live.selection_delta(self.selection)
+        with mock.patch.object(live.socket, "create_connection", side_effect=connect), \
+                mock.patch.object(live.hub, "publish_local") as publish_local:
+            live.publish(self.event.id, [delta])
+            publish_local.assert_not_called()  # a requisição não esperou o broker
+            broker_down.set()
+            live._publisher._queue.join()
+
+        publish_local.assert_called_once_with(self.event.id, [delta])
+
+
+class OddsIngestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("empresa", "empresa@cartela.bet", "senha-segura", is_staff=True)
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            external_id="feed-123",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now(),
+        )
+        cls.selection = MarketSelection.objects.create(
+            event=cls.event,
+            selection_type="TOTAL_GOALS_OVER",
+            params={"line": 2.5, "period": "FT"},
+            prob_base=0.5,
+            odd_justa=2.0,
+            odd_publicada=1.9,
+        )
+
+    def setUp(self):
+        odds_cache.clear()
+
+    def _row(self, **overrides):
+        row = {
+            "event_external_id": "feed-123",
+            "selection_type": "TOTAL_GOALS_OVER",
+            "params": {"period": "FT", "line": 2.5},
+            "prob_base": 0.5,
+            "odd_justa": 2.0,
+            "odd_publicada": 1.9,
+            "is_live": False,
+        }
+        row.update(overrides)
+        return row
+
+    def test_only_changed_rows_are_written(self):
+        odds_cache.get_event_odds(self.event.id)
+        rows = [
+            self._row(),
+            self._row(params={"line": 3.5, "period": "FT"}, odd_publicada=2.6),
+            self._row(event_external_id="desconhecido"),
+            self._row(odd_publicada=0.5),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ingest_odds(rows)
+        self.assertEqual((result.created, result.updated, result.unchanged, result.rejected), (1, 0, 1, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ingest_odds([self._row(odd_publicada=2.2, is_live=True)])
+        self.assertEqual(result.updated, 1)
+        self.selection.refresh_from_db()
+        self.assertEqual((self.selection.odd_publicada, self.selection.is_live), (2.2, True))
+        cached = {s["id"]: s for s in odds_cache.get_event_odds(self.event.id)["selections"]}
+        self.assertEqual(len(cached), 2)
+        self.assertEqual(cached[self.selection.id]["odd_publicada"], 2.2)
+
+    def test_ingest_api_accepts_csv(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        body = (
+            "event_external_id,selection_type,params,prob_base,odd_justa,odd_publicada,is_live\n"
+            'feed-123,TOTAL_GOALS_OVER,"{""line"": 2.5, ""period"": ""FT""}",0.45,2.2,2.05,true\n'
+        )
+
+        response = client.post(reverse("betting:odds-ingest"), body, content_type="text/csv")
+
+        self.assertEqual(response.json()["updated"], 1)
+        self.selection.refresh_from_db()
+        self.assertEqual(self.selection.odd_publicada, 2.05)
+
+
+class TemplateRulesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura")
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        cls.template = CartelaTemplate.objects.create(
+            nome="Gols e escanteios",
+            tipo="PRE_MATCH",
+            config={"min_items": 1, "max_items": 5, "max_odd": 3.0},
+        )
+        CartelaTemplateItem.objects.create(
+            cartela_template=cls.template,
+            allowed_selection_type="TOTAL_GOALS_OVER",
+            constraints={"params": {"line": [1.5, 2.5]}, "max_items": 1},
+        )
+        CartelaTemplateItem.objects.create(cartela_template=cls.template, allowed_selection_type="NEXT_CORNER")
+        cls.over_15, cls.over_25, cls.over_35, cls.corner, cls.long_shot, cls.other = [
+            MarketSelection.objects.create(
+                event=cls.event, selection_type=selection_type, params=params,
+                prob_base=0.5, odd_justa=2.0, odd_publicada=odd,
+            )
+            for selection_type, params, odd in [
+                ("TOTAL_GOALS_OVER", {"line": 1.5}, 1.9),
+                ("TOTAL_GOALS_OVER", {"line": 2.5}, 1.9),
+                ("TOTAL_GOALS_OVER", {"line": 3.5}, 1.9),
+                ("NEXT_CORNER", {"team": "home"}, 1.9),
+                ("NEXT_CORNER", {"team": "away"}, 4.0),
+                ("TEAM_TO_SCORE", {"team": "home"}, 1.9),
+            ]
+        ]
+
+    def setUp(self):
+        odds_cache.clear()
+        template_rules.clear()
+
+    def _quote(self, selections):
+        return generate_cartela_quote(
+            user=self.user,
+            event_id=self.event.id,
+            cartela_template_id=self.template.id,
+            selection_ids=[s.id for s in selections],
+            stake=Decimal("1.00"),
+        )
+
+    def test_listing_and_queryset_apply_the_same_rules(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("betting:cartela-selections-by-event-template", args=[self.event.id])
+        client.get(url, {"template_id": self.template.id})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, {"template_id": self.template.id})
+
+        allowed = {self.over_15.id, self.over_25.id, self.corner.id}
+        self.assertEqual({s["id"] for s in response.json()["results"]}, allowed)
+        self.assertEqual(len(queries), 0)
+        _, rules = template_rules.load(self.template.id)
+        self.assertEqual(set(MarketSelection.objects.filter(rules.q).values_list("id", flat=True)), allowed)
+
+    def test_quote_enforces_item_constraints(self):
+        self._quote([self.over_15, self.corner])
+        for selections, message in [
+            ([self.other], "não é permitida"),
+            ([self.over_35], "não é permitida"),
+            ([self.long_shot], "não é permitida"),
+            ([self.over_15, self.over_25], "Máximo de 1 seleções do tipo TOTAL_GOALS_OVER"),
+        ]:
+            with self.assertRaisesMessage(ValidationError, message):
+                self._quote(selections)
+
+    def test_template_item_change_recompiles_rules(self):
+        self.assertFalse(template_rules.load(self.template.id)[1].allows(self.other))
+        with self.captureOnCommitCallbacks(execute=True):
+            CartelaTemplateItem.objects.create(cartela_template=self.template, allowed_selection_type="TEAM_TO_SCORE")
+        self.assertTrue(template_rules.load(self.template.id)[1].allows(self.other))
+
+
+class MysteryCartelaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            sport="SOCCER",
+            team_home="Flamengo",
+            team_away="Palmeiras",
+            start_time=timezone.now() + timedelta(hours=2),
+        )
+        cls.template = CartelaTemplate.objects.create(
+            nome="Misteriosa",
+            tipo="MISTERIOSA",
+            config={"min_items": 2, "max_items": 4},
+        )
+        types = ["TOTAL_GOALS_OVER", "NEXT_CORNER", "TEAM_TO_SCORE", "BOTH_TEAMS_SCORE"]
+        cls.selections = MarketSelection.objects.bulk_create([
+            MarketSelection(
+                event=cls.event,
+                selection_type=types[i % 4],
+                params={"n": i},
+                prob_base=0.2 + 0.05 * i,
+                odd_justa=1 / (0.2 + 0.05 * i),
+                odd_publicada=1 / (0.2 + 0.05 * i),
+            )
+            for i in range(12)
+        ])
+        SelectionCorrelation.objects.create(
+            sport="SOCCER", selection_type_a="NEXT_CORNER", selection_type_b="TEAM_TO_SCORE", factor=0,
+        )
+        SelectionCorrelation.objects.create(
+            sport="SOCCER", selection_type_a="TOTAL_GOALS_OVER", selection_type_b="BOTH_TEAMS_SCORE", factor=1.4,
+        )
+
+    def setUp(self):
+        odds_cache.clear()
+        template_rules.clear()
+
+    def test_search_matches_exhaustive_enumeration(self):
+        result = misteriosa.generate_mystery_cartelas(self.event.id, self.template.id, 4.0, 12.0, k=5)
+
+        margin = pricing.template_margin(self.template)
+        engine = pricing.event_pricing(self.event.id, odds_cache.get_event_odds(self.event.id))
+        center = math.sqrt(4.0 * 12.0)
+        expected = []
+        for size in range(2, 5):
+            for combo in itertools.combinations(self.selections, size):
+                types = [s.selection_type for s in combo]
+                if len(set(types)) < size or {"NEXT_CORNER", "TEAM_TO_SCORE"} <= set(types):
+                    continue
+                odd = engine.price([s.id for s in combo], margin)
+                if 4.0 <= odd <= 12.0:
+                    expected.append(abs(math.log(odd / center)))
+        expected.sort()
+
+        self.assertTrue(result.complete)
+        self.assertGreater(len(expected), 5)
+        self.assertEqual(len(result.cartelas), 5)
+        for (selection_ids, odd), distance in zip(result.cartelas, expected):
+            self.assertAlmostEqual(abs(math.log(odd / center)), distance)
+            self.assertAlmostEqual(odd, engine.price(selection_ids, margin))
+
+    def _add_markets(self, count):
+        MarketSelection.objects.bulk_create([
+            MarketSelection(
+                event=self.event,
+                selection_type=f"MERCADO_{i % 40}",
+                params={"n": i},
+                prob_base=0.05 + (i * 37 % 90) / 100,
+                odd_justa=2.0,
+                odd_publicada=2.0,
+            )
+            for i in range(count)
+        ])
+
+    def test_api_returns_cartelas_within_odds_range(self):
+        self._add_markets(400)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("jogador", "jogador@cartela.bet", "senha-segura"))
+
+        response = client.post(reverse("betting:cartela-misteriosa"), {
+            "event_id": self.event.id,
+            "cartela_template_id": self.template.id,
+            "min_odd": 20.0,
+            "max_odd": 25.0,
+            "count": 10,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("complete", response.json())
+        self.assertLessEqual(len(response.json()["cartelas"]), 10)
+        for cartela in response.json()["cartelas"]:
+            self.assertTrue(20.0 <= cartela["odd"] <= 25.0)
+
+    def test_search_stops_at_time_budget(self):
+        self._add_markets(400)
+        misteriosa.generate_mystery_cartelas(self.event.id, self.template.id, 20.0, 25.0, time_budget_ms=0)
+        # Relógio falso: cada consulta avança 1 ms
+        ticks = itertools.count()
+        with mock.patch.object(misteriosa.time, "monotonic", side_effect=lambda: next(ticks) / 1000) as clock:
+            result = misteriosa.generate_mystery_cartelas(
+                self.event.id, self.template.id, 20.0, 25.0, k=10, time_budget_ms=5,
+            )
+
+        self.assertFalse(result.complete)
+        self.assertGreater(result.explored, 0)
+        # início + consultas a cada CLOCK_EVERY candidatos até passar do prazo + duração
+        self.assertEqual(clock.call_count, 8)
+
+
+class BenchmarkFixtureTests(TestCase):
+    def test_fixture_credits_wallets_through_the_ledger(self):
+        fixture = benchmark.Fixture(selecoes=3, itens=2, usuarios=2)
+
+        for user in fixture.usuarios:
+            carteira = Carteira.objects.get(usuario=user)
+            self.assertEqual(carteira.fundos, benchmark.SALDO_INICIAL)
+            self.assertEqual(carteira.pontos, benchmark.SALDO_INICIAL)
+            for categoria, saldo in (("FUNDOS", carteira.fundos), ("PONTOS", carteira.pontos)):
+                total = Transacao.objects.filter(
+                    carteira=carteira, categoria=categoria,
+                ).aggregate(total=Sum("valor"))["total"]
+                self.assertEqual(total, saldo)
+
+        # Segunda execução só completa o que falta
+        fixture.usuario(0).carteira.debitar_fundos(Decimal("10.00"), "Benchmark")
+        benchmark.Fixture(selecoes=3, itens=2, usuarios=2)
+        self.assertEqual(Carteira.objects.get(usuario=fixture.usuario(0)).fundos, benchmark.SALDO_INICIAL)
+
+    @override_settings(BENCHMARK_DATABASE="")
+    def test_refuses_non_test_database(self):
+        with mock.patch.dict(connection.settings_dict, {"NAME": "railway"}):
+            with self.assertRaises(ImproperlyConfigured):
+                benchmark.verificar_banco()
+
+    @override_settings(BENCHMARK_DATABASE="cartela_bench")
+    def test_allows_dedicated_database(self):
+        with mock.patch.dict(connection.settings_dict, {"NAME": "cartela_bench"}):
+            benchmark.verificar_banco()
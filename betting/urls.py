@@ -3,9 +3,14 @@ from .views import (
     CartelaTemplatesByEventAPIView,
     MarketSelectionsByEventTemplateAPIView,
     CartelaQuoteAPIView,
+    CartelaBatchQuoteAPIView,
+    MysteryCartelaAPIView,
     BetConfirmAPIView,
     MyBetsListAPIView,
     CartelaDetailAPIView,
+    OddsIngestAPIView,
+    EventLiabilityAPIView,
+    odds_stream_view,
 )
 
 app_name = "betting"
@@ -22,16 +27,43 @@ urlpatterns = [
         MarketSelectionsByEventTemplateAPIView.as_view(),
         name="cartela-selections-by-event-template",
     ),
+    path(
+        "cartelas/event/<int:event_id>/selections/stream/",
+        odds_stream_view,
+        name="cartela-selections-stream",
+    ),
     path(
         "cartelas/quote/",
         CartelaQuoteAPIView.as_view(),
         name="cartela-quote",
     ),
+    path(
+        "cartelas/quote/batch/",
+        CartelaBatchQuoteAPIView.as_view(),
+        name="cartela-quote-batch",
+    ),
+    path(
+        "cartelas/misteriosa/",
+        MysteryCartelaAPIView.as_view(),
+        name="cartela-misteriosa",
+    ),
     path(
         "cartelas/<int:cartela_id>/",
         CartelaDetailAPIView.as_view(),
         name="cartela-detail",
     ),
+    # Odds
+    path(
+        "odds/ingest/",
+        OddsIngestAPIView.as_view(),
+        name="odds-ingest",
+    ),
+    # Risco
+    path(
+        "risk/event/<int:event_id>/liability/",
+        EventLiabilityAPIView.as_view(),
+        name="event-liability",
+    ),
     # Bets
     path(
         "bets/confirm/",
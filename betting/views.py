@@ -1,20 +1,45 @@
-from rest_framework import generics, permissions, status
+from rest_framework import exceptions, generics, permissions, status
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
+import asyncio
+import io
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from . import liability, live, odds_cache, template_rules
 from .models import (
     Event, MarketSelection, CartelaTemplate, CartelaInstance, Bet,
+    CartelaInstanceArchive, BetArchive,
 )
+from .ingestion import MAX_ERRORS, ingest_odds, read_feed
+from .idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, run_idempotent
+from .pagination import CreatedAtCursorPagination
 from .serializers import (
     CartelaTemplateSerializer,
     MarketSelectionSerializer,
     CartelaQuoteRequestSerializer,
     CartelaQuoteResponseSerializer,
+    CartelaBatchQuoteRequestSerializer,
+    CartelaBatchQuoteResponseSerializer,
+    MysteryCartelaRequestSerializer,
     BetConfirmRequestSerializer,
     BetSerializer,
     CartelaInstanceDetailSerializer,
+    SelectionLiabilitySerializer,
 )
-from .services import generate_cartela_quote, confirm_bet
+from .misteriosa import generate_mystery_cartelas
+from .services import generate_cartela_quote, generate_cartela_quotes, confirm_bet
+
+
+LIABILITY_DEFAULT_LIMIT = 10
+LIABILITY_MAX_LIMIT = 200
 
 
 class CartelaTemplatesByEventAPIView(generics.ListAPIView):
@@ -36,6 +61,9 @@ class MarketSelectionsByEventTemplateAPIView(generics.ListAPIView):
     """
     GET /api/v1/cartelas/event/<event_id>/selections/?template_id=...
     Retorna as seleções (quadrinhos) válidas para montar a cartela.
+    
+    As seleções vêm já serializadas do cache de odds do evento e, com
+    template_id, passam pelas mesmas regras do template usadas na cotação.
     """
     serializer_class = MarketSelectionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -44,17 +72,26 @@ class MarketSelectionsByEventTemplateAPIView(generics.ListAPIView):
         event_id = self.kwargs["event_id"]
         template_id = self.request.query_params.get("template_id")
         
-        event = get_object_or_404(Event, id=event_id)
-        qs = MarketSelection.objects.filter(event=event)
+        data = odds_cache.get_event_odds(event_id)
+        if data is None:
+            raise Http404("Evento não encontrado.")
+        selections = data["selections"]
         
-        # Aqui você pode restringir conforme regras do template (tipo, live, etc.)
+        # Regras do template (tipos, odds, ao vivo, params) compiladas em memória
         if template_id:
-            # Exemplo bem simples: se template for turbo, filtra apenas is_live=True
-            template = get_object_or_404(CartelaTemplate, id=template_id)
-            if template.tipo in ("LIVE", "TURBO"):
-                qs = qs.filter(is_live=True)
+            compiled = template_rules.load(int(template_id)) if template_id.isdigit() else None
+            if compiled is None:
+                raise Http404("Template não encontrado.")
+            selections = compiled[1].filter_selections(selections)
         
-        return qs
+        return selections
+    
+    def list(self, request, *args, **kwargs):
+        selections = self.get_queryset()
+        page = self.paginate_queryset(selections)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(selections)
 
 
 class CartelaQuoteAPIView(APIView):
@@ -98,37 +135,144 @@ class CartelaQuoteAPIView(APIView):
             )
 
 
+class CartelaBatchQuoteAPIView(APIView):
+    """
+    POST /api/v1/cartelas/quote/batch/
+    Cota várias cartelas do mesmo evento e template de uma vez (cartelas
+    sugeridas, MISTERIOSA). Com "persist": false (padrão) só precifica, sem
+    gravar nada; com "persist": true cria as cartelas válidas como na cotação
+    individual. Cartelas inválidas voltam com "error" sem derrubar o lote.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        serializer = CartelaBatchQuoteRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        try:
+            quotes, valid_until = generate_cartela_quotes(
+                user=request.user,
+                event_id=data["event_id"],
+                cartela_template_id=data["cartela_template_id"],
+                selection_sets=data["selection_sets"],
+                stake=data["stake"],
+                persist=data["persist"],
+            )
+        except ValidationError as e:
+            return Response(
+                {"error": e.messages[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resp = CartelaBatchQuoteResponseSerializer({
+            "event_id": data["event_id"],
+            "valid_until": valid_until,
+            "quotes": quotes,
+        })
+        return Response(
+            resp.data,
+            status=status.HTTP_201_CREATED if valid_until is not None else status.HTTP_200_OK
+        )
+
+
+class MysteryCartelaAPIView(APIView):
+    """
+    POST /api/v1/cartelas/misteriosa/
+    Sugere cartelas de um template MISTERIOSA com odd entre min_odd e max_odd
+    (busca com orçamento de tempo, ver misteriosa.py). Só sugere: para cotar,
+    envie as selection_ids em /cartelas/quote/ ou /cartelas/quote/batch/.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        serializer = MysteryCartelaRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        try:
+            result = generate_mystery_cartelas(
+                data["event_id"],
+                data["cartela_template_id"],
+                data["min_odd"],
+                data["max_odd"],
+                k=data["count"],
+            )
+        except ValidationError as e:
+            return Response(
+                {"error": e.messages[0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            "event_id": data["event_id"],
+            "cartelas": [
+                {"selection_ids": selection_ids, "odd": odd}
+                for selection_ids, odd in result.cartelas
+            ],
+            "complete": result.complete,
+            "duration_ms": round(result.duration * 1000, 1),
+        })
+
+
 class BetConfirmAPIView(APIView):
     """
     POST /api/v1/bets/confirm/
-    Confirma a aposta ligada a uma cartela.
+    Confirma a aposta ligada a uma cartela e debita o stake da carteira.
+    
+    Com o header Idempotency-Key, retries com a mesma chave devolvem a
+    resposta da primeira requisição (header Idempotent-Replayed: true).
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    def _confirm(self, request, cartela_id, categoria):
+        # Só erros de validação viram resposta (e ficam guardados na chave);
+        # falhas de banco (deadlock, serialização) propagam e desfazem a
+        # chave, para que o retry execute de novo
+        try:
+            bet = confirm_bet(user=request.user, cartela_id=cartela_id, categoria=categoria)
+        except ValidationError as e:
+            return status.HTTP_400_BAD_REQUEST, {"error": e.messages[0]}
+        return status.HTTP_201_CREATED, BetSerializer(bet).data
+    
     def post(self, request, *args, **kwargs):
         serializer = BetConfirmRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         cartela_id = serializer.validated_data["cartela_id"]
+        categoria = serializer.validated_data["categoria"]
         
-        try:
-            bet = confirm_bet(user=request.user, cartela_id=cartela_id)
-            resp = BetSerializer(bet)
-            return Response(resp.data, status=status.HTTP_201_CREATED)
-        except Exception as e:
+        def handler():
+            return self._confirm(request, cartela_id, categoria)
+        
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            status_code, body = handler()
+            return Response(body, status=status_code)
+        if len(key) > MAX_KEY_LENGTH:
             return Response(
-                {"error": str(e)},
+                {"error": f"{IDEMPOTENCY_HEADER} deve ter no máximo {MAX_KEY_LENGTH} caracteres."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        status_code, body, replayed = run_idempotent(
+            request.user, "bet-confirm", key, serializer.validated_data, handler,
+        )
+        response = Response(body, status=status_code)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
 
 
 class MyBetsListAPIView(generics.ListAPIView):
     """
-    GET /api/v1/bets/my/
-    Lista as apostas do usuário logado.
+    GET /api/v1/bets/my/?cursor=...
+    Lista as apostas do usuário logado (paginação por cursor), incluindo
+    as apostas já arquivadas.
     """
     serializer_class = BetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         return Bet.objects.filter(
@@ -137,7 +281,16 @@ class MyBetsListAPIView(generics.ListAPIView):
             "cartela",
             "cartela__event",
             "cartela__cartela_template"
-        ).order_by("-created_at")
+        )
+    
+    def get_archive_queryset(self):
+        return BetArchive.objects.filter(
+            cartela__user=self.request.user
+        ).select_related(
+            "cartela",
+            "cartela__event",
+            "cartela__cartela_template"
+        )
 
 
 class CartelaDetailAPIView(generics.RetrieveAPIView):
@@ -159,3 +312,150 @@ class CartelaDetailAPIView(generics.RetrieveAPIView):
             "items",
             "items__market_selection"
         )
+    
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Cartelas antigas podem já estar no arquivo
+            return get_object_or_404(
+                CartelaInstanceArchive.objects.filter(
+                    user=self.request.user
+                ).select_related(
+                    "event",
+                    "cartela_template"
+                ).prefetch_related(
+                    "items",
+                    "items__market_selection"
+                ),
+                id=self.kwargs[self.lookup_url_kwarg],
+            )
+
+
+class OddsIngestAPIView(APIView):
+    """
+    POST /api/v1/odds/ingest/
+    Ingestão em lote das odds do feed (staff). Aceita uma lista JSON de linhas,
+    {"rows": [...]} ou CSV (Content-Type: text/csv) com os campos de
+    ingestion.FEED_FIELDS. Só as seleções com odds alteradas são gravadas.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def post(self, request, *args, **kwargs):
+        if request.content_type.startswith("text/csv"):
+            rows = read_feed(io.StringIO(request.body.decode("utf-8")), "csv")
+        else:
+            rows = request.data.get("rows") if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list):
+                return Response(
+                    {"error": "Envie uma lista de linhas ou {\"rows\": [...]}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        result = ingest_odds(rows)
+        return Response({
+            "received": result.received,
+            "created": result.created,
+            "updated": result.updated,
+            "unchanged": result.unchanged,
+            "rejected": result.rejected,
+            "errors": [{"row": n, "error": e} for n, e in result.errors[:MAX_ERRORS]],
+            "duration_ms": round(result.duration * 1000, 1),
+        })
+
+
+class EventLiabilityAPIView(APIView):
+    """
+    GET /api/v1/risk/event/<event_id>/liability/?limit=10
+    Seleções de maior passivo do evento (staff): quanto pagamos se cada uma
+    bater, somando as apostas confirmadas em aberto. Lê o índice
+    SelectionLiability, sem join de itens com apostas.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request, event_id, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get("limit", LIABILITY_DEFAULT_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "limit deve ser um número inteiro."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, LIABILITY_MAX_LIMIT))
+        
+        rows = liability.top_selections(event_id, limit)
+        return Response({
+            "event_id": event_id,
+            "selections": SelectionLiabilitySerializer(rows, many=True).data,
+        })
+
+
+def _api_user(request):
+    """Usuário pelas autenticações da API (DEFAULT_AUTHENTICATION_CLASSES), ou None"""
+    api_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return api_request.user
+    except exceptions.APIException:
+        return None
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n".encode()
+
+
+async def _odds_stream(event_id, continuous):
+    # Assina antes de ler o snapshot: nenhum delta fica entre os dois
+    with live.hub.subscribe(event_id) as subscription:
+        yield f"retry: {settings.ODDS_STREAM_RETRY_MS}\n\n".encode()
+        data = await sync_to_async(odds_cache.get_event_odds)(event_id)
+        if data is None:
+            return
+        yield _sse("snapshot", data)
+        if not continuous:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ODDS_STREAM_MAX_DURATION
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                selections = await subscription.receive(
+                    timeout=min(settings.ODDS_STREAM_HEARTBEAT, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if selections is live.RESYNC:
+                data = await sync_to_async(odds_cache.get_event_odds)(event_id)
+                if data is None:
+                    return
+                yield _sse("snapshot", data)
+            else:
+                yield _sse("odds", {"event_id": event_id, "selections": selections})
+
+
+async def odds_stream_view(request, event_id):
+    """
+    GET /api/v1/cartelas/event/<event_id>/selections/stream/
+    Server-Sent Events com as odds do evento: um evento `snapshot` com a mesma
+    lista do endpoint de seleções e depois eventos `odds` só com as seleções
+    alteradas (seleções apagadas vêm com "removed": true). Substitui o polling
+    durante eventos LIVE.
+
+    A conexão fecha depois de ODDS_STREAM_MAX_DURATION e o EventSource
+    reconecta sozinho. O deploy roda em ASGI (gunicorn com worker uvicorn,
+    setup/asgi.py); servido por WSGI, o stream manda só o snapshot e fecha.
+    Aceita as mesmas autenticações da API (sessão e token).
+    """
+    user = await sync_to_async(_api_user)(request)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({"detail": "As credenciais de autenticação não foram fornecidas."}, status=403)
+    if not await Event.objects.filter(id=event_id).aexists():
+        return JsonResponse({"detail": "Evento não encontrado."}, status=404)
+
+    response = StreamingHttpResponse(
+        _odds_stream(event_id, continuous=isinstance(request, ASGIRequest)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
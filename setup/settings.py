@@ -96,6 +96,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app_cartela.instrumentacao.InstrumentacaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -224,6 +225,113 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Cache
+# 'odds' guarda as seleções por evento (betting/odds_cache.py). LocMemCache é
+# por processo e descarta as entradas menos usadas ao passar de MAX_ENTRIES;
+# com vários workers o TIMEOUT curto limita odds desatualizadas. Com um backend
+# compartilhado (Redis/Memcached) o contador de versão invalida todos os workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'odds': {
+        'BACKEND': config('ODDS_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('ODDS_CACHE_LOCATION', default='odds'),
+        'TIMEOUT': config('ODDS_CACHE_TIMEOUT', default=5, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('ODDS_CACHE_MAX_ENTRIES', default=2000, cast=int),
+        },
+    },
+}
+
+# Odds ao vivo (betting/live.py)
+# Endpoint SSE .../selections/stream/; contínuo só quando servido por ASGI.
+# ODDS_STREAM_BROKER (host:porta do comando broker_odds) distribui os deltas
+# entre vários workers; vazio = entrega só dentro do processo.
+ODDS_STREAM_BROKER = config('ODDS_STREAM_BROKER', default='')
+ODDS_STREAM_QUEUE_SIZE = config('ODDS_STREAM_QUEUE_SIZE', default=256, cast=int)
+ODDS_STREAM_HEARTBEAT = config('ODDS_STREAM_HEARTBEAT', default=15, cast=int)
+ODDS_STREAM_MAX_DURATION = config('ODDS_STREAM_MAX_DURATION', default=300, cast=int)
+ODDS_STREAM_RETRY_MS = config('ODDS_STREAM_RETRY_MS', default=2000, cast=int)
+
+# Preço das cartelas (betting/pricing.py)
+# Margem da casa por CartelaTemplate.tipo; template.config["margin"] tem
+# prioridade. A odd final é 1 / (probabilidade conjunta * (1 + margem)).
+PRICING_MARGINS = {
+    'PRE_MATCH': 0.05,
+    'LIVE': 0.08,
+    'TURBO': 0.10,
+    'MISTERIOSA': 0.12,
+    'INFLUENCER': 0.07,
+}
+PRICING_DEFAULT_MARGIN = config('PRICING_DEFAULT_MARGIN', default=0.05, cast=float)
+# Limite de combinações por chamada de price_combinations
+PRICING_MAX_COMBINATIONS = config('PRICING_MAX_COMBINATIONS', default=200000, cast=int)
+
+# Cartelas por requisição em POST /api/v1/cartelas/quote/batch/
+QUOTE_BATCH_MAX_SIZE = config('QUOTE_BATCH_MAX_SIZE', default=100, cast=int)
+
+# Gerador de cartelas MISTERIOSA (betting/misteriosa.py)
+# Tempo máximo de busca por requisição, cartelas devolvidas e seleções por cartela
+MISTERIOSA_TIME_BUDGET_MS = config('MISTERIOSA_TIME_BUDGET_MS', default=50, cast=int)
+MISTERIOSA_MAX_RESULTS = config('MISTERIOSA_MAX_RESULTS', default=20, cast=int)
+MISTERIOSA_MAX_ITEMS = config('MISTERIOSA_MAX_ITEMS', default=6, cast=int)
+
+# Motor de risco (betting/risk.py)
+# Passivo máximo (soma dos prêmios potenciais) por escopo e prêmio máximo por
+# cartela. Acima de RISK_MARGIN_THRESHOLD do limite mais apertado, a margem
+# cresce linearmente até RISK_MAX_MARGIN_ADJUSTMENT.
+RISK_LIMITS = {
+    'EVENT': config('RISK_LIMIT_EVENT', default=2000000, cast=int),
+    'SELECTION': config('RISK_LIMIT_SELECTION', default=500000, cast=int),
+    'INFLUENCER': config('RISK_LIMIT_INFLUENCER', default=1000000, cast=int),
+    'PAYOUT_PER_BET': config('RISK_LIMIT_PAYOUT_PER_BET', default=100000, cast=int),
+}
+RISK_MARGIN_THRESHOLD = config('RISK_MARGIN_THRESHOLD', default=0.7, cast=float)
+RISK_MAX_MARGIN_ADJUSTMENT = config('RISK_MAX_MARGIN_ADJUSTMENT', default=0.05, cast=float)
+# Recarga periódica do banco numa thread de fundo (desligada em setup/settings_test.py)
+RISK_ENGINE_BACKGROUND = config('RISK_ENGINE_BACKGROUND', default=True, cast=bool)
+RISK_ENGINE_RESYNC_SECONDS = config('RISK_ENGINE_RESYNC_SECONDS', default=30, cast=int)
+# Número de sub-linhas por (evento, template, influenciador) em RiskExposureMetrics.
+# Aumente para eventos muito disputados; a leitura sempre soma os shards.
+RISK_EXPOSURE_SHARDS = config('RISK_EXPOSURE_SHARDS', default=1, cast=int)
+
+# Arquivamento (app_cartela/arquivamento.py)
+# Transações e cartelas encerradas mais antigas que isso saem das tabelas
+# quentes no comando arquivar_dados.
+ARQUIVAMENTO_IDADE_DIAS = config('ARQUIVAMENTO_IDADE_DIAS', default=180, cast=int)
+
+# Dashboard administrativo (app_cartela/dashboard.py)
+# Idade máxima, em segundos, do snapshot de totais antes de a view recalcular.
+# O worker do Procfile (atualizar_metricas_dashboard --intervalo) o mantém
+# bem abaixo disso.
+DASHBOARD_METRICAS_MAX_IDADE = config('DASHBOARD_METRICAS_MAX_IDADE', default=300, cast=int)
+
+# Instrumentação (app_cartela/instrumentacao.py)
+# Máximo de queries por view (nome da URL). Acima disso: warning no log, ou
+# exceção se QUERY_BUDGETS_RAISE (ligado em setup/settings_test.py).
+QUERY_BUDGETS = {
+    'app_cartela:dashboard': 8,
+    'app_cartela:carteira': 6,
+    'app_cartela:admin_dashboard': 14,
+    'betting:cartela-templates-by-event': 5,
+    'betting:cartela-selections-by-event-template': 5,
+    'betting:cartela-quote': 11,
+    'betting:cartela-quote-batch': 11,
+    'betting:cartela-misteriosa': 5,
+    'betting:bet-confirm': 10,
+    'betting:bets-my': 5,
+    'betting:cartela-detail': 6,
+    'betting:event-liability': 4,
+}
+QUERY_BUDGETS_RAISE = config('QUERY_BUDGETS_RAISE', default=False, cast=bool)
+INSTRUMENTACAO_JANELA = config('INSTRUMENTACAO_JANELA', default=500, cast=int)
+
+# Benchmark (betting/benchmark.py)
+# Nome do banco dedicado em que benchmark_apostas pode criar dados; vazio = só
+# o banco de teste. Nunca aponte para o banco de produção.
+BENCHMARK_DATABASE = config('BENCHMARK_DATABASE', default='')
+
 # Email Configuration (para recuperação de senha)
 # Em desenvolvimento, emails são exibidos no console
 # Em produção, configure SMTP real
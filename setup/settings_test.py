@@ -0,0 +1,13 @@
+"""
+Configuração dos testes: herda setup.settings e fixa o que a suíte espera,
+independente do runner (`manage.py test` escolhe este módulo sozinho; em
+outros runners use DJANGO_SETTINGS_MODULE=setup.settings_test).
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# Estourar o orçamento de queries de uma view falha o teste
+QUERY_BUDGETS_RAISE = True
+
+# O motor de risco é recarregado explicitamente (risk.engine.warm()) nos testes
+RISK_ENGINE_BACKGROUND = False